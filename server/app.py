@@ -1,7 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 import os
 import json
 import asyncio
@@ -11,12 +11,23 @@ import uuid
 
 from fastapi import UploadFile, File, Body
 from datetime import datetime
-from typing import Any, Literal
+from typing import TYPE_CHECKING, Any, Literal
 from src.agent_events import AgentEvent
-from src.multi_modal_agent import MultiModalMapAgent
 from src.run_store import run_store
 from src.utils.coord_transform import gcj02_to_wgs84
 from src.utils.agent_utils import AgentState
+from src.utils import fingerprints, json_codec, metrics, profiling
+from src.utils.checkpointing import checkpointing_enabled, get_checkpointer, thread_config
+from src.utils.artifact_writer import artifact_writer
+from src.utils.image_preprocess import image_buffers
+from src.utils.upload_store import UploadTooLarge, store_upload
+from src.utils.warmup import warmup
+
+# LangChain, LangGraph, the LLM clients and the node modules are imported on
+# first use (and by the startup warm-up) so a worker starts accepting requests
+# without paying for them; see src/import_budget.py.
+if TYPE_CHECKING:
+    from src.multi_modal_agent import MultiModalMapAgent
 
 try:
     from dotenv import load_dotenv
@@ -24,7 +35,14 @@ try:
 except Exception:
     pass
 
-app = FastAPI()
+class FastJSONResponse(JSONResponse):
+    """Default response class backed by the shared fast JSON codec."""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps(content, pretty=False)
+
+
+app = FastAPI(default_response_class=FastJSONResponse)
 
 origins = [
     "http://localhost:3000",
@@ -49,11 +67,14 @@ class CreateRunRequest(BaseModel):
     message: str
     imageFilename: str = ""
     geojsonFilename: str | None = None
+    profile: str | None = None
 
 
 class RerunDownstreamRequest(BaseModel):
     node_id: str
     payload: dict
+    force: bool = False
+    profile: str | None = None
 
 
 class NavigationRouteRequest(BaseModel):
@@ -145,8 +166,7 @@ def _load_latest_session_json(session_dir: str, subdir: str) -> dict | None:
     )
     if not files:
         return None
-    with open(os.path.join(target, files[-1]), "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json_codec.load_file(os.path.join(target, files[-1]))
 
 
 def _convert_coordinates(coords):
@@ -217,7 +237,7 @@ def process_geojson_for_frontend(geojson_data, style_code=None):
         return geojson_data
 
     mapbox_token = _get_mapbox_token()
-    processed = json.loads(json.dumps(geojson_data))  # 深拷贝
+    processed = json_codec.deep_copy(geojson_data)  # 深拷贝
 
     # 从 style_code 中提取 Route 配置，构建 visual_id -> style 映射
     route_style_map = {}
@@ -319,8 +339,7 @@ async def save_geojson_file(name: str, content: dict = Body(...)):
     if not os.path.isfile(geojson_path):
         return JSONResponse(status_code=404, content={"error": "文件不存在"})
     try:
-        with open(geojson_path, 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False, indent=4)
+        await artifact_writer.write_json(geojson_path, content)
         return {"success": True, "message": "保存成功"}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -338,27 +357,21 @@ async def get_file(name: str):
     # geojson
     if os.path.isfile(geojson_path):
         try:
-            with open(geojson_path, 'r', encoding='utf-8') as fh:
-                data = json.load(fh)
-            return data
+            return json_codec.load_file(geojson_path)
         except Exception:
             return JSONResponse(status_code=500, content={"error": "cannot read file"})
     
     # mapbox spec (多模态输出)
     if os.path.isfile(mapbox_spec_path):
         try:
-            with open(mapbox_spec_path, 'r', encoding='utf-8') as fh:
-                data = json.load(fh)
-            return data
+            return json_codec.load_file(mapbox_spec_path)
         except Exception:
             return JSONResponse(status_code=500, content={"error": "cannot read file"})
 
     # stylejson
     if os.path.isfile(stylejson_path):
         try:
-            with open(stylejson_path, 'r', encoding='utf-8') as fh:
-                data = json.load(fh)
-            return data
+            return json_codec.load_file(stylejson_path)
         except Exception:
             return JSONResponse(status_code=500, content={"error": "cannot read file"})
 
@@ -375,21 +388,15 @@ async def get_file(name: str):
 async def upload_image(file: UploadFile = File(...)):
     try:
         output_dir = os.path.join(os.path.dirname(__file__), 'images')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = os.path.splitext(file.filename)[1]
-        filename = f"image_{timestamp}{file_extension}"
-        filepath = os.path.join(output_dir, filename)
-        
-        # 保存文件
-        content = await file.read()
-        with open(filepath, 'wb') as f:
-            f.write(content)
-        
+        stored = await store_upload(file, output_dir)
         return {
-            "filepath": filename
+            "filepath": stored.filename,
+            "sha256": stored.sha256,
+            "size": stored.size,
+            "deduplicated": stored.deduplicated,
         }
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(
             status_code=500, 
@@ -397,9 +404,24 @@ async def upload_image(file: UploadFile = File(...)):
         )
 
 
+def _create_agent(output_dir: str) -> "MultiModalMapAgent":
+    from src.multi_modal_agent import MultiModalMapAgent
+
+    return MultiModalMapAgent(output_dir)
+
+
+def _profile_mode(*values: str | None) -> str | None:
+    """First non-empty profile flag among body field and ``X-Run-Profile`` header."""
+    return profiling.parse_profile_mode(next((value for value in values if value), None))
+
+
 @app.post("/api/multimodal/runs")
-async def create_multimodal_run(request: CreateRunRequest):
+async def create_multimodal_run(request: CreateRunRequest, x_run_profile: str | None = Header(None)):
     """Create an observable multi-modal Agent run and stream progress via SSE."""
+    try:
+        profile_mode = _profile_mode(request.profile, x_run_profile)
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
     image_path = None
     if request.imageFilename:
         image_path = os.path.join(os.path.dirname(__file__), 'images', request.imageFilename)
@@ -407,7 +429,99 @@ async def create_multimodal_run(request: CreateRunRequest):
             return JSONResponse(status_code=404, content={"error": f"图片文件不存在：{image_path}"})
 
     run_id = f"run_{uuid.uuid4().hex[:12]}"
-    record = run_store.create(run_id)
+    started_payload = {
+        "input": {
+            "user_text": request.message,
+            "message": request.message,
+            "image_filename": request.imageFilename,
+            "imageFilename": request.imageFilename,
+        },
+        "user_text": request.message,
+        "message": request.message,
+        "image_filename": request.imageFilename,
+        "imageFilename": request.imageFilename,
+        "geojsonFilename": request.geojsonFilename,
+    }
+
+    def run_multimodal_agent(emit_event):
+        output_dir = os.path.join(os.path.dirname(__file__), 'output')
+        agent = _create_agent(output_dir)
+        return agent.run(
+            user_text=request.message,
+            image_path=image_path,
+            session_id=run_id,
+            emit_event=emit_event,
+        )
+
+    await _start_observable_run(run_id, run_id, started_payload, run_multimodal_agent, profile_mode)
+    return {"run_id": run_id, "session_id": run_id}
+
+
+@app.post("/api/multimodal/runs/{run_id}/resume")
+async def resume_multimodal_run(run_id: str, x_run_profile: str | None = Header(None)):
+    """Continue an interrupted run from its last checkpoint as a new observable run."""
+    try:
+        profile_mode = _profile_mode(x_run_profile)
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+    if not checkpointing_enabled():
+        return JSONResponse(status_code=501, content={"error": "未启用运行检查点（需要安装 langgraph-checkpoint-sqlite）"})
+    if run_id in _active_sessions:
+        return JSONResponse(status_code=409, content={"error": "该 run 仍在执行中"})
+    checkpointer = get_checkpointer()
+    checkpoint = await asyncio.to_thread(checkpointer.get_tuple, thread_config(run_id))
+    if checkpoint is None:
+        return JSONResponse(status_code=404, content={"error": "没有可恢复的检查点（run 不存在或已完成）"})
+
+    resume_run_id = f"run_{uuid.uuid4().hex[:12]}"
+
+    def resume_multimodal_agent(emit_event):
+        output_dir = os.path.join(os.path.dirname(__file__), 'output')
+        agent = _create_agent(output_dir)
+        return agent.resume(run_id, emit_event=emit_event)
+
+    await _start_observable_run(
+        resume_run_id,
+        run_id,
+        {"resumed_from": run_id},
+        resume_multimodal_agent,
+        profile_mode,
+    )
+    return {"run_id": resume_run_id, "session_id": run_id, "resumed_from": run_id}
+
+
+# Sessions with an agent thread running in this process; guards against
+# resuming a run that is still executing.
+_active_sessions: set[str] = set()
+
+
+def _with_profile(execute, profile_mode: str | None, name: str):
+    """Wrap ``execute`` so the run is profiled and the profile lands in its session directory."""
+    if profile_mode is None:
+        return execute
+
+    def profiled(emit_event):
+        with profiling.profile_run(profile_mode, name) as capture:
+            result = execute(emit_event)
+        profile_path = profiling.write_profile(capture, result.get("session_dir"))
+        if profile_path:
+            result["profile_path"] = profile_path
+        return result
+
+    return profiled
+
+
+async def _start_observable_run(
+    run_id: str,
+    session_id: str,
+    started_payload: dict,
+    execute,
+    profile_mode: str | None = None,
+) -> None:
+    """Run ``execute(emit_event)`` in a worker thread and publish its events to ``run_store``."""
+    execute = _with_profile(execute, profile_mode, run_id)
+    record = await run_store.create(run_id)
+    _active_sessions.add(session_id)
     loop = asyncio.get_running_loop()
 
     def enqueue_event(event_type: str, event_data: dict | None = None) -> None:
@@ -422,7 +536,7 @@ async def create_multimodal_run(request: CreateRunRequest):
             payload=event_data.get("payload") or {},
         )
         event = event_model.model_dump() if hasattr(event_model, "model_dump") else event_model.dict()
-        record.queue.put_nowait(event)
+        record.publish(event)
 
     def enqueue_from_worker(event_type: str, event_data: dict | None = None) -> None:
         loop.call_soon_threadsafe(enqueue_event, event_type, event_data)
@@ -431,45 +545,23 @@ async def create_multimodal_run(request: CreateRunRequest):
         enqueue_event(
             "workflow_started",
             {
-                "session_id": run_id,
+                "session_id": session_id,
                 "node_id": "input",
                 "label": "Input",
                 "status": "running",
-                "payload": {
-                    "input": {
-                        "user_text": request.message,
-                        "message": request.message,
-                        "image_filename": request.imageFilename,
-                        "imageFilename": request.imageFilename,
-                    },
-                    "user_text": request.message,
-                    "message": request.message,
-                    "image_filename": request.imageFilename,
-                    "imageFilename": request.imageFilename,
-                    "geojsonFilename": request.geojsonFilename,
-                },
+                "payload": started_payload,
             },
         )
 
-        def run_multimodal_agent():
-            output_dir = os.path.join(os.path.dirname(__file__), 'output')
-            agent = MultiModalMapAgent(output_dir)
-            return agent.run(
-                user_text=request.message,
-                image_path=image_path,
-                session_id=run_id,
-                emit_event=enqueue_from_worker,
-            )
-
         try:
-            result = await asyncio.to_thread(run_multimodal_agent)
+            result = await asyncio.to_thread(execute, enqueue_from_worker)
             record.result = result
             if result.get("error"):
                 record.error = result["error"]
                 enqueue_event(
                     "workflow_error",
                     {
-                        "session_id": result.get("session_id", run_id),
+                        "session_id": result.get("session_id", session_id),
                         "status": "error",
                         "payload": {"error": result["error"], "result": result},
                     },
@@ -478,7 +570,7 @@ async def create_multimodal_run(request: CreateRunRequest):
                 enqueue_event(
                     "workflow_completed",
                     {
-                        "session_id": result.get("session_id", run_id),
+                        "session_id": result.get("session_id", session_id),
                         "status": "completed",
                         "payload": result,
                     },
@@ -488,46 +580,208 @@ async def create_multimodal_run(request: CreateRunRequest):
             enqueue_event(
                 "workflow_error",
                 {
-                    "session_id": run_id,
+                    "session_id": session_id,
                     "status": "error",
                     "payload": {"error": str(exc)},
                 },
             )
         finally:
-            record.done = True
-            record.queue.put_nowait(None)
+            _active_sessions.discard(session_id)
+            await run_store.finish(record)
 
     asyncio.create_task(run_agent_worker())
-    return {"run_id": run_id, "session_id": run_id}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+SSE_HEARTBEAT_SECONDS = _env_float("SSE_HEARTBEAT_SECONDS", 15.0)
+SSE_COALESCE_SECONDS = _env_float("SSE_COALESCE_MS", 25.0) / 1000
+
+
+def _parse_event_id(value: str | None) -> int:
+    try:
+        return max(0, int(str(value or "").strip()))
+    except ValueError:
+        return 0
 
 
 @app.get("/api/multimodal/runs/{run_id}/events")
-async def stream_multimodal_run_events(run_id: str):
-    record = run_store.get(run_id)
-    if not record:
+async def stream_multimodal_run_events(
+    run_id: str,
+    request: Request,
+    last_event_id: str | None = Header(None),
+):
+    """SSE stream of run events; honors Last-Event-ID (header or query) for replay."""
+    if not await run_store.exists(run_id):
         return JSONResponse(status_code=404, content={"error": "run 不存在"})
 
+    cursor = _parse_event_id(last_event_id or request.query_params.get("last_event_id"))
+
     async def event_generator():
-        while True:
-            event = await record.queue.get()
-            if event is None:
-                break
-            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        nonlocal cursor
+        yield "retry: 2000\n\n"
+        metrics.SSE_STREAMS.inc()
+        try:
+            while True:
+                frames, done = await run_store.frames_after(run_id, cursor)
+                if frames:
+                    if SSE_COALESCE_SECONDS and not done:
+                        # Let a burst of node events land so they go out in one write.
+                        await asyncio.sleep(SSE_COALESCE_SECONDS)
+                        frames, done = await run_store.frames_after(run_id, cursor)
+                    cursor = frames[-1][0]
+                    yield "".join(frame for _, frame in frames)
+                    continue
+                if done:
+                    break
+                if await request.is_disconnected():
+                    break
+                if not await run_store.wait_for_change(run_id, cursor, SSE_HEARTBEAT_SECONDS or None):
+                    yield ": heartbeat\n\n"
+        finally:
+            metrics.SSE_STREAMS.dec()
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/multimodal/runs/{run_id}/artifacts/{artifact_id}")
+async def get_multimodal_run_artifact(
+    run_id: str,
+    artifact_id: str,
+    if_none_match: str | None = Header(None),
+):
+    """Serve a large event payload referenced by ``$ref``; content-addressed and immutable."""
+    artifact = await run_store.get_artifact(run_id, artifact_id)
+    if not artifact:
+        return JSONResponse(status_code=404, content={"error": "artifact 不存在"})
+    headers = {
+        "ETag": artifact.etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if if_none_match and artifact.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=artifact.content, media_type="application/json", headers=headers)
 
 
 @app.get("/api/multimodal/runs/{run_id}")
 async def get_multimodal_run(run_id: str):
-    record = run_store.get(run_id)
-    if not record:
+    snapshot = await run_store.load(run_id)
+    if not snapshot:
         return JSONResponse(status_code=404, content={"error": "run 不存在"})
-    return {
-        "run_id": record.run_id,
-        "done": record.done,
-        "result": record.result,
-        "error": record.error,
-    }
+    return snapshot
+
+
+@app.get("/api/multimodal/run-store/stats")
+async def get_run_store_stats():
+    """Report RunStore size, buffered bytes and eviction counters."""
+    return run_store.stats()
+
+
+def _runtime_metrics_collector():
+    """Snapshot loop-owned state (RunStore, active runs) on the event loop for a scrape.
+
+    The returned collector renders the snapshot plus the thread-safe artifact
+    writer and image cache gauges, so it can run on a worker thread.
+    """
+    stats = run_store.stats()
+    active_runs = len(_active_sessions)
+    return lambda: _collect_runtime_metrics(stats, active_runs)
+
+
+def _collect_runtime_metrics(stats: dict, active_runs: int):
+    """Scrape-time gauges for the RunStore, artifact writer and image cache."""
+    yield (
+        "maplayout_run_store_runs",
+        "gauge",
+        "Runs held by the RunStore, by state.",
+        [({"state": "active"}, stats["active_runs"]), ({"state": "finished"}, stats["finished_runs"])],
+    )
+    yield (
+        "maplayout_run_store_bytes",
+        "gauge",
+        "Bytes buffered (memory backend) or stored (sqlite backend) by the RunStore.",
+        [({"backend": stats["backend"]}, stats.get("buffered_bytes", stats.get("stored_bytes", 0)))],
+    )
+    yield (
+        "maplayout_run_store_evictions_total",
+        "counter",
+        "RunStore evictions, by reason.",
+        [({"reason": reason}, count) for reason, count in stats["evictions"].items()],
+    )
+    yield (
+        "maplayout_agent_runs_active",
+        "gauge",
+        "Agent runs executing in this process.",
+        [({}, active_runs)],
+    )
+    yield (
+        "maplayout_artifact_writes_pending",
+        "gauge",
+        "Artifact writes in flight or queued on the I/O executor.",
+        [({}, artifact_writer.pending())],
+    )
+    buffers = image_buffers.stats()
+    yield (
+        "maplayout_image_buffers",
+        "gauge",
+        "Normalized reference image buffers, by state.",
+        [({"state": "pinned"}, buffers["pinned"]), ({"state": "cached"}, buffers["buffers"] - buffers["pinned"])],
+    )
+    yield (
+        "maplayout_image_buffer_bytes",
+        "gauge",
+        "Resident normalized image data URL bytes.",
+        [({}, buffers["resident_bytes"])],
+    )
+
+
+METRICS_LOOP_LAG_INTERVAL = _env_float("METRICS_LOOP_LAG_INTERVAL_MS", 500.0) / 1000
+_loop_lag_task: asyncio.Task | None = None
+
+
+async def _monitor_event_loop_lag() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(METRICS_LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - start - METRICS_LOOP_LAG_INTERVAL)
+        metrics.EVENT_LOOP_LAG.observe(lag)
+        metrics.EVENT_LOOP_LAG_LAST.set(lag)
+
+
+@app.on_event("startup")
+async def _start_event_loop_lag_monitor():
+    global _loop_lag_task
+    if METRICS_LOOP_LAG_INTERVAL and _loop_lag_task is None:
+        _loop_lag_task = asyncio.create_task(_monitor_event_loop_lag())
+
+
+@app.on_event("startup")
+async def _start_warmup():
+    warmup.start()
+
+
+@app.get("/ready")
+async def get_readiness():
+    """Readiness probe: 200 once the background warm-up imported the agent stack, 503 before."""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of pipeline, cache and provider metrics."""
+    body = await asyncio.to_thread(metrics.registry.render, [_runtime_metrics_collector()])
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post('/api/multimodal/agent')
@@ -560,7 +814,7 @@ async def multimodal_agent(request: MapAgentRequest):
     
     def run_multimodal_agent():
         output_dir = os.path.join(os.path.dirname(__file__), 'output')
-        agent = MultiModalMapAgent(output_dir)
+        agent = _create_agent(output_dir)
         result = agent.run(user_text=user_input, image_path=image_path)
         return result
     
@@ -583,8 +837,7 @@ async def multimodal_agent(request: MapAgentRequest):
             os.makedirs(geojson_dir, exist_ok=True)
             geojson_path = os.path.join(geojson_dir, geojson_filename)
             
-            with open(geojson_path, "w", encoding="utf-8") as f:
-                json.dump(geojson_data, f, ensure_ascii=False, indent=2)
+            await artifact_writer.write_json(geojson_path, geojson_data)
             geojson_basename = geojson_filename
         
         if "style_code" in result:
@@ -596,8 +849,7 @@ async def multimodal_agent(request: MapAgentRequest):
             os.makedirs(style_dir, exist_ok=True)
             style_path = os.path.join(style_dir, style_filename)
             
-            with open(style_path, "w", encoding="utf-8") as f:
-                json.dump(style_data, f, ensure_ascii=False, indent=2)
+            await artifact_writer.write_json(style_path, style_data)
             style_basename = style_filename
         
         print("=" * 60)
@@ -665,6 +917,27 @@ async def get_multimodal_session_icon(session_id: str, filename: str):
     )
 
 
+@app.get("/api/multimodal/session/{session_id}/profile")
+async def get_multimodal_session_profile(session_id: str):
+    """Download the most recent profile captured for a session (pstats or speedscope JSON)."""
+    base = _resolve_multimodal_session_dir(session_id)
+    if not base:
+        return JSONResponse(status_code=404, content={"error": "会话不存在"})
+
+    candidates = [os.path.join(base, name) for name in profiling.PROFILE_FILES]
+    candidates = [path for path in candidates if os.path.exists(path)]
+    if not candidates:
+        return JSONResponse(status_code=404, content={"error": "该会话没有性能分析文件"})
+    profile_path = max(candidates, key=os.path.getmtime)
+    media_type = "application/json" if profile_path.endswith(".json") else "application/octet-stream"
+    return FileResponse(
+        profile_path,
+        media_type=media_type,
+        filename=f"{session_id}_{os.path.basename(profile_path)}",
+        headers={"Cache-Control": "no-store, max-age=0"},
+    )
+
+
 @app.get("/api/multimodal/session/{session_id}")
 async def get_multimodal_session(session_id: str):
     """获取指定会话的完整历史"""
@@ -685,15 +958,14 @@ async def get_multimodal_session(session_id: str):
                 continue
             filepath = os.path.join(node3_path, f)
             try:
-                with open(filepath, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-                    entry = {"filename": f, "data": data}
-                    if 'groundtruth' in f.lower():
-                        groundtruth_files.append(entry)
-                    elif 'layout' in f.lower():
-                        layout_files.append(entry)
-                    else:
-                        origin_files.append(entry)
+                data = json_codec.load_file(filepath)
+                entry = {"filename": f, "data": data}
+                if 'groundtruth' in f.lower():
+                    groundtruth_files.append(entry)
+                elif 'layout' in f.lower():
+                    layout_files.append(entry)
+                else:
+                    origin_files.append(entry)
             except Exception as e:
                 print(f"⚠️ 读取文件失败: {filepath}, 错误: {e}")
 
@@ -704,8 +976,7 @@ async def get_multimodal_session(session_id: str):
     session_manifest = None
     if os.path.exists(manifest_path):
         try:
-            with open(manifest_path, "r", encoding="utf-8") as f:
-                session_manifest = json.load(f)
+            session_manifest = json_codec.load_file(manifest_path)
         except Exception as e:
             print(f"⚠️ 读取 session_manifest 失败: {e}")
 
@@ -757,18 +1028,42 @@ async def get_multimodal_session(session_id: str):
 
 
 @app.post("/api/multimodal/session/{session_id}/rerun-downstream")
-async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamRequest):
+async def rerun_multimodal_downstream(
+    session_id: str,
+    request: RerunDownstreamRequest,
+    x_run_profile: str | None = Header(None),
+):
     """Rerun downstream nodes from an edited agent artifact payload."""
     base = _resolve_multimodal_session_dir(session_id)
     if not base:
         return JSONResponse(status_code=404, content={"error": "会话不存在"})
+    try:
+        profile_mode = _profile_mode(request.profile, x_run_profile)
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+
+    # The rerun executes synchronously on this thread, so only this thread is profiled.
+    with profiling.profile_run(profile_mode, session_id) as capture:
+        response = _rerun_downstream(base, session_id, request)
+    profile_path = profiling.write_profile(capture, base)
+    if profile_path and isinstance(response, dict):
+        response["profile_path"] = profile_path
+    return response
+
+
+def _rerun_downstream(base: str, session_id: str, request: RerunDownstreamRequest):
+    """Body of ``rerun-downstream``; returns the response dict or a ``JSONResponse`` error."""
+    from src.multi_modal_agent import SessionManager, configured_llm_model
+    from src.nodes.geojson_generation import GeoJSONGenerationNode
+    from src.nodes.icon_generation import IconGenerationNode
+    from src.nodes.style_code_generation import StyleCodeGenerationNode
+    from src.nodes.validation_node import ValidationNode
 
     try:
         manifest = None
         manifest_path = os.path.join(base, "session_manifest.json")
         if os.path.exists(manifest_path):
-            with open(manifest_path, "r", encoding="utf-8") as f:
-                manifest = json.load(f)
+            manifest = json_codec.load_file(manifest_path)
 
         intent_artifact = _load_latest_session_json(base, "node1") or {}
         visual_structure = _load_latest_session_json(base, "node2")
@@ -798,7 +1093,7 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
             return bool(state.error and "验证节点" not in state.error)
 
         def save_artifact(content, filename: str, subdir: str, event_node_id: str, label: str, extra: dict | None = None):
-            path = agent.session_manager.save_file(content, filename, subdir)
+            path = session_manager.save_file(content, filename, subdir)
             event_payload = {"path": path, "subdir": subdir}
             if extra:
                 event_payload.update(extra)
@@ -809,6 +1104,55 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
         intent_enriched = intent_artifact.get("intent_enriched") or user_text
         global_title = intent_artifact.get("global_title") or (manifest or {}).get("global_title")
         global_description = intent_artifact.get("global_description") or (manifest or {}).get("global_description")
+        image_path = (manifest or {}).get("input", {}).get("image_path")
+        previous_style_code = style_code
+        previous_timings = (manifest or {}).get("workflow", {}).get("node_timings_ms") or {}
+        llm_model = configured_llm_model()
+
+        def geojson_fingerprint() -> str:
+            return fingerprints.geojson_inputs(
+                intent_enriched,
+                user_text,
+                global_title,
+                global_description,
+                GeoJSONGenerationNode.configured_prompt_version(),
+                llm_model,
+            )
+
+        def validation_fingerprint(data) -> str:
+            return fingerprints.validation_inputs(
+                user_text,
+                data,
+                ValidationNode.PROMPT_VERSION,
+                ValidationNode.configured_mode(),
+                llm_model,
+            )
+
+        # Sessions created before fingerprints were recorded: assume the latest
+        # artifacts were computed from each other; validation is always rerun.
+        node_fingerprints = fingerprints.load_fingerprints(base) or {
+            "node3": {"inputs": geojson_fingerprint()},
+            "node4": {
+                "inputs": fingerprints.style_inputs(
+                    visual_structure, geojson_data, image_path, StyleCodeGenerationNode.PROMPT_VERSION
+                )
+            },
+        }
+        if request.force:
+            node_fingerprints = {}
+        skipped_nodes = []
+        recomputed_nodes = []
+
+        def skip_node(event_node_id: str, label: str, saved_ms: float, extra: dict | None = None):
+            saved_ms = round(float(saved_ms or 0), 2)
+            skipped_nodes.append({"node_id": event_node_id, "estimated_saved_ms": saved_ms, **(extra or {})})
+            append_event(
+                "node_skipped",
+                event_node_id,
+                label,
+                "skipped",
+                {"reason": "inputs_unchanged", "estimated_saved_ms": saved_ms, **(extra or {})},
+            )
 
         if node_id == "intent":
             next_intent = payload.get("intent_enriched") or payload.get("intent") or payload.get("user_text")
@@ -851,14 +1195,24 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
             return JSONResponse(status_code=400, content={"error": "缺少 style_code"})
 
         output_dir = os.path.join(os.path.dirname(__file__), 'output')
-        agent = MultiModalMapAgent(output_dir)
-        agent.session_manager.current_session_dir = base
+        session_manager = SessionManager(output_dir)
+        session_manager.current_session_dir = base
+        agent = None
+
+        def get_agent() -> "MultiModalMapAgent":
+            # Building the agent sets up LLM clients; only pay for it when a
+            # node actually has to be recomputed.
+            nonlocal agent
+            if agent is None:
+                agent = _create_agent(output_dir)
+                agent.session_manager = session_manager
+            return agent
 
         user_text = (manifest or {}).get("input", {}).get("user_text") or ""
         state = AgentState(
             session_id=session_id,
             user_text=user_text,
-            image_path=(manifest or {}).get("input", {}).get("image_path"),
+            image_path=image_path,
             intent_enriched=intent_enriched,
             global_title=global_title,
             global_description=global_description,
@@ -870,6 +1224,8 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
 
         def run_geojson_and_validation():
             nonlocal state, geojson_data
+            recomputed_nodes.append("geojson")
+            node_fingerprints["node3"] = {"inputs": geojson_fingerprint()}
             for attempt in range(3):
                 append_event(
                     "node_started",
@@ -878,7 +1234,7 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
                     "running",
                     {"validation_retry_count": state.validation_retry_count},
                 )
-                state = agent.geojson_node.execute(state)
+                state = get_agent().geojson_node.execute(state)
                 if state.error:
                     return
                 geojson_data = state.geojson_data
@@ -918,9 +1274,24 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
                 )
         def run_validation():
             nonlocal state
+            inputs = validation_fingerprint(state.geojson_data)
+            previous = node_fingerprints.get("validation") or {}
+            if previous.get("inputs") == inputs and "is_valid" in previous:
+                state.is_valid = previous["is_valid"]
+                state.failed_node = previous.get("failed_node") or "none"
+                state.validation_feedback = previous.get("validation_feedback") or ""
+                skip_node("validation", "Validation", previous_timings.get("node5_validate"))
+                return
             state.failed_node = "none"
             append_event("node_started", "validation", "Validation", "running")
-            state = agent.validation_node.execute(state)
+            state = get_agent().validation_node.execute(state)
+            recomputed_nodes.append("validation")
+            node_fingerprints["validation"] = {
+                "inputs": validation_fingerprint(state.geojson_data),
+                "is_valid": state.is_valid,
+                "failed_node": state.failed_node,
+                "validation_feedback": state.validation_feedback,
+            }
             append_event(
                 "node_validation",
                 "validation",
@@ -936,7 +1307,15 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
 
         if node_id == "intent":
             save_artifact(intent_artifact, f"intent_rerun_{timestamp}.json", "node1", "intent", "Intent artifact saved")
-            run_geojson_and_validation()
+            geojson_unchanged = (
+                geojson_data
+                and (node_fingerprints.get("node3") or {}).get("inputs") == geojson_fingerprint()
+            )
+            if geojson_unchanged:
+                skip_node("geojson", "GeoJSON generation", previous_timings.get("node3_geojson"))
+                run_validation()
+            else:
+                run_geojson_and_validation()
             if has_hard_error():
                 return JSONResponse(status_code=500, content={"error": state.error, "events": events})
         elif node_id == "visual":
@@ -970,19 +1349,39 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
                     return JSONResponse(status_code=500, content={"error": state.error, "events": events})
 
         if node_id in {"intent", "visual", "geojson", "workflow_completed"}:
-            append_event("node_started", "style", "Style generation", "running")
-            state = agent.style_node.execute(state)
-            if has_hard_error():
-                return JSONResponse(status_code=500, content={"error": state.error, "events": events})
-            style_code = state.style_code
+            style_fingerprint = fingerprints.style_inputs(
+                state.visual_structure, state.geojson_data, state.image_path, StyleCodeGenerationNode.PROMPT_VERSION
+            )
+            if style_code and (node_fingerprints.get("node4") or {}).get("inputs") == style_fingerprint:
+                skip_node("style", "Style generation", previous_timings.get("node4_style"))
+            else:
+                append_event("node_started", "style", "Style generation", "running")
+                state = get_agent().style_node.execute(state)
+                if has_hard_error():
+                    return JSONResponse(status_code=500, content={"error": state.error, "events": events})
+                style_code = state.style_code
+                recomputed_nodes.append("style")
+                node_fingerprints["node4"] = {"inputs": style_fingerprint}
         elif node_id in {"style", "icon_generation"}:
             append_event("node_started", "style", "Style generation", "running")
 
-        state = agent.icon_node.execute(state, base)
+        icon_node = agent.icon_node if agent else IconGenerationNode()
+        state = icon_node.execute(state, base, previous_style_code=None if request.force else previous_style_code)
         if has_hard_error():
             return JSONResponse(status_code=500, content={"error": state.error, "events": events})
         style_code = state.style_code
         icon_meta = state.style_code.get("_icon_generation", {}) if isinstance(state.style_code, dict) else {}
+        if icon_meta.get("reused_count"):
+            previous_icon_meta = (previous_style_code or {}).get("_icon_generation") or {}
+            per_icon_ms = (previous_timings.get("node4_icon_tool") or 0) / max(1, previous_icon_meta.get("generated_count") or 0)
+            skip_node(
+                "icon_generation",
+                "Icon generation",
+                per_icon_ms * icon_meta["reused_count"],
+                {"reused_icons": icon_meta["reused_count"], "generated_icons": icon_meta.get("generated_count", 0)},
+            )
+        if icon_meta.get("generated_count"):
+            recomputed_nodes.append("icon_generation")
         style_sections = sorted([k for k in state.style_code.keys() if not k.startswith("_")]) if isinstance(state.style_code, dict) else []
         append_event(
             "node_completed",
@@ -1000,6 +1399,7 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
             "Style artifact saved",
             {"style_sections": sorted([k for k in state.style_code.keys() if not k.startswith("_")]) if isinstance(state.style_code, dict) else [], "icon_generation": icon_meta},
         )
+        fingerprints.save_fingerprints(base, node_fingerprints)
 
         return {
             "success": True,
@@ -1009,6 +1409,11 @@ async def rerun_multimodal_downstream(session_id: str, request: RerunDownstreamR
             "style_code": state.style_code,
             "style_path": style_path,
             "events": events,
+            "incremental": {
+                "recomputed": recomputed_nodes,
+                "skipped": skipped_nodes,
+                "estimated_saved_ms": round(sum(item["estimated_saved_ms"] for item in skipped_nodes), 2),
+            },
         }
     except Exception as e:
         print(f"❌ downstream rerun 失败: {e}")
@@ -1084,8 +1489,7 @@ async def optimize_label_layout(session_id: str, request: LabelOptimizationReque
             },
         }
         artifact_path = os.path.join(target_dir, f"label_optimization_{timestamp}.json")
-        with open(artifact_path, "w", encoding="utf-8") as f:
-            json.dump(artifact, f, ensure_ascii=False, indent=2)
+        await artifact_writer.write_json(artifact_path, artifact)
         result["artifact_path"] = os.path.relpath(artifact_path, base)
         return result
     except Exception as e:
@@ -1163,8 +1567,7 @@ async def vlm_review_revision(session_id: str, request: VLMRevisionRequest):
             "output": result,
         }
         artifact_path = os.path.join(target_dir, f"vlm_review_{timestamp}.json")
-        with open(artifact_path, "w", encoding="utf-8") as f:
-            json.dump(artifact, f, ensure_ascii=False, indent=2)
+        await artifact_writer.write_json(artifact_path, artifact)
         result["artifactPath"] = artifact_path
         return result
     except Exception as e:
@@ -1220,8 +1623,7 @@ async def save_session_geojson(session_id: str, request: dict):
             prefix = prefix_map.get(category, 'geojson')
             filepath = os.path.join(node3_path, f"{prefix}_{timestamp}.json")
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(geojson_data, f, ensure_ascii=False, indent=2)
+        await artifact_writer.write_json(filepath, geojson_data)
 
         return {"success": True, "session_id": session_id, "filepath": filepath}
     except Exception as e:
@@ -1242,8 +1644,7 @@ async def save_session_mapinfo(session_id: str, request: dict):
             return JSONResponse(status_code=400, content={"error": "缺少 mapInfo 数据"})
 
         filepath = os.path.join(base, 'mapInfo.json')
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(mapinfo_data, f, ensure_ascii=False, indent=2)
+        await artifact_writer.write_json(filepath, mapinfo_data)
 
         return {"success": True, "session_id": session_id, "filepath": filepath}
     except Exception as e:
@@ -1263,7 +1664,7 @@ async def multimodal_retry(request: MapAgentRequest):
     
     def run_with_retry():
         output_dir = os.path.join(os.path.dirname(__file__), 'output')
-        agent = MultiModalMapAgent(output_dir)
+        agent = _create_agent(output_dir)
         
         state = agent.intent_node.execute(
             type('AgentState', (), {
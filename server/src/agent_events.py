@@ -14,9 +14,12 @@ AgentEventType = Literal[
     "node_completed",
     "node_validation",
     "node_retry",
+    "node_skipped",
+    "feature_ready",
     "artifact_saved",
     "workflow_completed",
     "workflow_error",
+    "stream_reset",
 ]
 
 AgentNodeId = Literal[
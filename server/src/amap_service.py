@@ -6,6 +6,8 @@ import requests
 from typing import Tuple, Optional, Any
 from dotenv import load_dotenv
 from .utils.coord_transform import is_out_of_china
+from .utils.metrics import GEOCODE_LOOKUPS, GEOCODE_PROVIDER_REQUESTS
+from .utils.tracing import span
 
 CHINA_CITY_MARKERS = {
     "中国", "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "成都", "西安",
@@ -127,6 +129,20 @@ class AMapService:
         provider_hint: Optional[str] = None,
     ) -> Optional[dict[str, Any]]:
         """Search a POI and return coordinates plus provenance metadata."""
+        with span("geocode", keyword=str(keyword or "").strip(), city=city or None) as geocode_span:
+            result = self._geocode_poi(keyword, city, location, search_name_en, provider_hint)
+            geocode_span.set(provider=result.get("provider") if result else "none")
+        GEOCODE_LOOKUPS.inc(source=result.get("source", "unknown") if result else "none")
+        return result
+
+    def _geocode_poi(
+        self,
+        keyword: str,
+        city: str = "",
+        location: Optional[str] = None,
+        search_name_en: Optional[str] = None,
+        provider_hint: Optional[str] = None,
+    ) -> Optional[dict[str, Any]]:
         keyword = str(keyword or "").strip()
         city = str(city or "").strip()
         provider_hint = str(provider_hint or "").strip().lower()
@@ -255,7 +271,8 @@ class AMapService:
             params["city"] = city
             
         try:
-            response = requests.get(self.base_url_place, params=params, timeout=10)
+            with span("http.amap.place_text"):
+                response = requests.get(self.base_url_place, params=params, timeout=10)
             data = response.json()
             
             # 高德 API 成功状态码为 "1" 检查是否有返回 pois 数据
@@ -268,10 +285,14 @@ class AMapService:
                     location = poi.get("location")
                     if location:
                         lon, lat = map(float, location.split(","))
+                        GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_place_text", outcome="hit")
                         return lon, lat
         except Exception as e:
+            GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_place_text", outcome="error")
             print(f"一级检索异常 (v5/place/text): {e}")
-            
+            return None
+
+        GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_place_text", outcome="miss")
         return None
     
     def _search_poi_fallback(self, keyword: str, city: str = "", location: Optional[str] = None) -> Optional[Tuple[float, float]]:
@@ -290,7 +311,8 @@ class AMapService:
             params["location"] = location
             
         try:
-            response = requests.get(self.base_url_tips, params=params, timeout=10)
+            with span("http.amap.inputtips"):
+                response = requests.get(self.base_url_tips, params=params, timeout=10)
             data = response.json()
             
             # 状态码为 "1" 表示成功，tips 包含建议列表
@@ -304,12 +326,16 @@ class AMapService:
                     if location_str:
                         try:
                             lon, lat = map(float, location_str.split(","))
-                            return lon, lat
                         except (ValueError, AttributeError):
                             continue
+                        GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_inputtips", outcome="hit")
+                        return lon, lat
         except Exception as e:
+            GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_inputtips", outcome="error")
             print(f"二级检索异常 (v3/assistant/inputtips): {e}")
-            
+            return None
+
+        GEOCODE_PROVIDER_REQUESTS.inc(provider="amap_inputtips", outcome="miss")
         return None
 
     def _search_mapbox(self, keyword: str, city: str = "") -> Optional[Tuple[float, float]]:
@@ -318,15 +344,16 @@ class AMapService:
             return None
         query = f"{keyword}, {city}" if city else keyword
         try:
-            response = requests.get(
-                f"{self.base_url_mapbox}/{requests.utils.quote(query)}.json",
-                params={
-                    "access_token": self.mapbox_token,
-                    "limit": 1,
-                    "language": "en",
-                },
-                timeout=10,
-            )
+            with span("http.mapbox.geocoding"):
+                response = requests.get(
+                    f"{self.base_url_mapbox}/{requests.utils.quote(query)}.json",
+                    params={
+                        "access_token": self.mapbox_token,
+                        "limit": 1,
+                        "language": "en",
+                    },
+                    timeout=10,
+                )
             data = response.json()
             features = data.get("features") or []
             if features:
@@ -334,9 +361,13 @@ class AMapService:
                 if len(center) >= 2:
                     lon, lat = float(center[0]), float(center[1])
                     if is_out_of_china(lon, lat) or not city:
+                        GEOCODE_PROVIDER_REQUESTS.inc(provider="mapbox_geocoding", outcome="hit")
                         return lon, lat
         except Exception as e:
+            GEOCODE_PROVIDER_REQUESTS.inc(provider="mapbox_geocoding", outcome="error")
             print(f"Mapbox 国外 POI 检索异常: {e}")
+            return None
+        GEOCODE_PROVIDER_REQUESTS.inc(provider="mapbox_geocoding", outcome="miss")
         return None
 
     def _english_city_name(self, city: str = "") -> str:
@@ -0,0 +1,165 @@
+"""
+Memory check for reference image handles.
+
+Writes a synthetic camera-sized JPEG, then simulates agent runs the way the
+graph drives them: the run pins the image, the Intent/Visual/GeoJSON/Style
+steps each take a structural copy of ``AgentState`` and the image-reading
+steps resolve the data URL through ``image_data_url``; every state stays
+alive as LangGraph channels would keep it. ``tracemalloc`` measures the
+traced Python memory of each phase.
+
+Checks that ``normalize_image`` runs once per image, that every resolve in
+every concurrent run returns the same data URL object, that the cache holds
+exactly one resident buffer while runs are pinned, that the node steps after
+the first resolve add well under one buffer's worth of memory, and that
+releasing the last pin (with no idle capacity) frees the buffer. The legacy
+layout (inline base64 on the state, deep copy per step) is measured for
+comparison.
+
+    python -m src.image_buffer_benchmark
+    python -m src.image_buffer_benchmark --width 6000 --height 4000 --runs 4
+"""
+
+import argparse
+import base64
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from typing import Any, Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import image_preprocess
+from src.utils.agent_utils import AgentState
+from src.utils.image_preprocess import image_buffers, image_data_url, pin_state_image
+
+
+# (step, reads the image) in graph order; the GeoJSON step runs twice to stand in for a QA retry.
+STEPS = [("intent", False), ("visual", True), ("geojson", False), ("geojson_retry", False), ("style", True)]
+
+
+class LegacyAgentState(AgentState):
+    image_base64: Optional[str] = None
+
+
+def write_photo(directory: str, width: int, height: int, seed: int) -> str:
+    """A noisy JPEG, so it compresses about as badly as a real photo."""
+    from PIL import Image
+
+    noise = Image.frombytes("L", (width // 4, height // 4), os.urandom((width // 4) * (height // 4)))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise.resize((width, height)), gradient, gradient.rotate(90)))
+    path = os.path.join(directory, f"reference_{seed}.jpg")
+    image.save(path, format="JPEG", quality=95)
+    return path
+
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, int, int]:
+    """``(result, retained_bytes, peak_bytes)`` of traced memory relative to before ``func``."""
+    gc.collect()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    result = func()
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    return result, after - before, peak - before
+
+
+def simulate_run(state: AgentState, resolve: bool) -> Tuple[List[AgentState], List[str]]:
+    """Structural copy per step; image steps resolve the handle."""
+    states, urls = [state], []
+    for step, reads_image in STEPS:
+        copy = states[-1].model_copy()
+        copy.global_title = step
+        if resolve and reads_image:
+            urls.append(image_data_url(copy))
+        states.append(copy)
+    return states, urls
+
+
+def simulate_legacy_run(image_path: str) -> List[AgentState]:
+    """The layout before image handles: raw base64 on the state and a deep copy per step."""
+    with open(image_path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    states = [LegacyAgentState(session_id="legacy", user_text="", image_path=image_path, image_base64=f"data:image/jpeg;base64,{encoded}")]
+    for step, _ in STEPS:
+        copy = states[-1].model_copy(deep=True)
+        copy.global_title = step
+        states.append(copy)
+    return states
+
+
+def mib(value: int) -> str:
+    return f"{value / 1024 / 1024:.2f} MiB"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="检查参考图句柄在整个 run 中只保留一份归一化缓冲。")
+    parser.add_argument("--width", type=int, default=4032, help="合成参考图宽度。")
+    parser.add_argument("--height", type=int, default=3024, help="合成参考图高度。")
+    parser.add_argument("--runs", type=int, default=3, help="同时固定同一张图的 run 数量。")
+    parser.add_argument("--seed", type=int, default=7, help="文件名种子。")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    normalize_calls = []
+    original_normalize = image_preprocess.normalize_image
+
+    def counting_normalize(path):
+        normalize_calls.append(path)
+        return original_normalize(path)
+
+    image_preprocess.normalize_image = counting_normalize
+    image_buffers.idle_capacity = 0
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="image-buffer-") as directory:
+            image_path = write_photo(directory, args.width, args.height, args.seed)
+            print(f"🖼️ 参考图 {args.width}x{args.height}，{mib(os.path.getsize(image_path))}，{args.runs} 个 run 同时固定")
+
+            legacy_states, legacy_retained, legacy_peak = measure(lambda: simulate_legacy_run(image_path))
+            del legacy_states
+
+            states = [AgentState(session_id=f"run-{i}", user_text="", image_path=image_path) for i in range(args.runs)]
+            handles = [pin_state_image(state) for state in states]
+
+            # First resolve pays for normalization; everything after must reuse that buffer.
+            (first_states, first_urls), first_retained, first_peak = measure(lambda: simulate_run(states[0], True))
+            buffer_bytes = len(first_urls[0])
+            later, steady_retained, steady_peak = measure(lambda: [simulate_run(state, True) for state in states[1:]])
+            urls = first_urls + [url for _, run_urls in later for url in run_urls]
+            stats_pinned = image_buffers.stats()
+
+            del first_states, later, urls[1:]
+            for handle in handles:
+                image_buffers.release(handle)
+            stats_released = image_buffers.stats()
+    finally:
+        tracemalloc.stop()
+        image_preprocess.normalize_image = original_normalize
+
+    single_normalize = len(normalize_calls) == 1
+    shared_object = all(url is urls[0] for url in urls)
+    one_buffer = stats_pinned["buffers"] == 1 and stats_pinned["resident_bytes"] == buffer_bytes
+    steady_small = steady_peak < buffer_bytes // 2
+    released = stats_released["buffers"] == 0
+
+    print(f"\n📦 归一化缓冲 {mib(buffer_bytes)}，normalize_image 调用 {len(normalize_calls)} 次  {'✅' if single_normalize else '❌'}")
+    print(f"   旧布局（内联 base64 + 每步深拷贝）  保留 {mib(legacy_retained):>10}  峰值 {mib(legacy_peak):>10}")
+    print(f"   首个 run（含归一化）               保留 {mib(first_retained):>10}  峰值 {mib(first_peak):>10}")
+    print(f"   其余 {args.runs - 1} 个 run                     保留 {mib(steady_retained):>10}  峰值 {mib(steady_peak):>10}  "
+          f"{'✅ 未复制缓冲' if steady_small else '❌ 出现额外缓冲'}")
+    print(f"   所有解析返回同一对象  {'✅' if shared_object else '❌'}")
+    print(f"   固定期间常驻缓冲 {stats_pinned['buffers']} 个 / {mib(stats_pinned['resident_bytes'])}  {'✅' if one_buffer else '❌'}")
+    print(f"   全部释放后缓冲 {stats_released['buffers']} 个  {'✅' if released else '❌'}")
+
+    if not (single_normalize and shared_object and one_buffer and steady_small and released):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
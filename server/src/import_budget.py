@@ -0,0 +1,149 @@
+"""
+Import-time benchmark for the API entry point.
+
+Runs ``python -X importtime -c "import app"`` in fresh interpreters, parses
+the per-module timings and checks them against ``import_budget.json``: the
+median cumulative import time of the target must stay within ``budget_ms``,
+and none of the ``forbidden`` packages (LangChain, LangGraph, the OpenAI
+client, PIL, ...) may be imported eagerly. Exits non-zero on a violation.
+
+    python -m src.import_budget
+    python -m src.import_budget --runs 10 --top 20
+    python -m src.import_budget --record   # re-record budget from this machine
+"""
+
+import argparse
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import json_codec
+from src.utils.artifact_writer import atomic_write_json
+
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_FILE = os.path.join(SERVER_DIR, "import_budget.json")
+RECORD_HEADROOM = 1.5
+
+# (self_us, cumulative_us, module, depth)
+ImportRow = Tuple[int, int, str, int]
+
+
+def parse_importtime(stderr: str) -> List[ImportRow]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((int(parts[0]), int(parts[1]), stripped, depth))
+    return rows
+
+
+def measure_once(module: str) -> List[ImportRow]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVER_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"❌ 导入 {module} 失败:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def target_ms(rows: List[ImportRow], module: str) -> float:
+    for _, cumulative, name, depth in reversed(rows):
+        if name == module and depth == 0:
+            return cumulative / 1000
+    raise SystemExit(f"❌ importtime 输出中没有找到 {module}")
+
+
+def package_self_ms(rows: List[ImportRow]) -> Dict[str, float]:
+    totals: Dict[str, float] = defaultdict(float)
+    for self_us, _, name, _ in rows:
+        totals[name.split(".")[0]] += self_us / 1000
+    return totals
+
+
+def load_budget(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    return json_codec.load_file(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="测量 app.py 的导入耗时并对照预算检查。")
+    parser.add_argument("--module", default=None, help="要测量的模块，默认取预算文件中的 module（app）。")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数，取中位数。")
+    parser.add_argument("--top", type=int, default=15, help="按包列出自身耗时最高的条数。")
+    parser.add_argument("--budget-file", default=DEFAULT_BUDGET_FILE, help="预算文件路径，默认 server/import_budget.json。")
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help=f"以本机测得的中位数 × {RECORD_HEADROOM} 重写预算。",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    budget = load_budget(args.budget_file)
+    module = args.module or budget.get("module") or "app"
+    forbidden = set(budget.get("forbidden") or [])
+
+    runs = [measure_once(module) for _ in range(max(1, args.runs))]
+    totals = [target_ms(rows, module) for rows in runs]
+    median_ms = statistics.median(totals)
+    packages: Dict[str, List[float]] = defaultdict(list)
+    for rows in runs:
+        for package, ms in package_self_ms(rows).items():
+            packages[package].append(ms)
+
+    print(f"⏱️ import {module}: 中位数 {median_ms:.1f} ms（{len(totals)} 次，最小 {min(totals):.1f} / 最大 {max(totals):.1f}）")
+    print(f"\n{'包':<32} {'自身 ms':>9}")
+    ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for package, values in ranked[: args.top]:
+        print(f"{package:<32} {statistics.median(values):>9.1f}")
+
+    if args.record:
+        budget.update(
+            module=module,
+            budget_ms=round(median_ms * RECORD_HEADROOM),
+            recorded={
+                "median_ms": round(median_ms, 1),
+                "python": platform.python_version(),
+                "date": datetime.now().date().isoformat(),
+            },
+        )
+        atomic_write_json(args.budget_file, budget, pretty=True)
+        print(f"\n📝 已记录预算 {budget['budget_ms']} ms -> {args.budget_file}")
+        return
+
+    violations = []
+    eager = sorted({name.split(".")[0] for rows in runs for _, _, name, _ in rows} & forbidden)
+    if eager:
+        violations.append(f"以下重依赖在导入期被加载（应改为首次使用时导入）: {', '.join(eager)}")
+    budget_ms = budget.get("budget_ms")
+    if budget_ms is not None and median_ms > budget_ms:
+        violations.append(f"导入耗时 {median_ms:.1f} ms 超出预算 {budget_ms} ms")
+    if violations:
+        for violation in violations:
+            print(f"\n❌ {violation}")
+        raise SystemExit(1)
+    print(f"\n✅ 在预算内（{budget_ms} ms）" if budget_ms is not None else "\nℹ️ 未设置预算；用 --record 记录")
+
+
+if __name__ == "__main__":
+    main()
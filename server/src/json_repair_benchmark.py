@@ -0,0 +1,193 @@
+"""
+Fuzz and benchmark the LLM JSON extraction/repair path.
+
+Fuzz: random documents are rendered the way models misbehave (code fences,
+leading/trailing prose, a second object, Python/JS literals, trailing commas,
+braces and literal-looking words inside strings) and must parse back to the
+original value. The pre-scanner regex path is run on the same inputs for
+comparison.
+
+Benchmark: a large GeoJSON response (fenced, optionally with Python literals
+and trailing commas) parsed by both paths.
+
+    python -m src.json_repair_benchmark
+    python -m src.json_repair_benchmark --cases 5000 --features 4000 --repeat 5
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import json_codec
+from src.utils.agent_utils import _robust_json_loads
+
+
+TRICKY_TEXT = ["{", "}", "[", "]", ",]", ",}", "None", "True", "NaN", '"', "\\", "```", "D1", "滨海湾花园", " ", "\n"]
+
+
+def legacy_loads(text: str) -> Any:
+    """``_extract_first_json_object`` + ``_robust_json_loads`` as they were before the scanner."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1 or end <= start:
+        raise ValueError("no object")
+    s = text[start:end + 1].strip()
+    s = s.replace(",}", "}").replace(",]", "]")
+    for pattern, replacement in [
+        (r"\bNone\b", "null"), (r"\bTrue\b", "true"), (r"\bFalse\b", "false"),
+        (r"\bNaN\b", "null"), (r"\bInfinity\b", "null"), (r"\b-Infinity\b", "null"),
+    ]:
+        s = re.sub(pattern, replacement, s)
+    return json_codec.loads(s)
+
+
+def random_value(rng: random.Random, depth: int = 0) -> Any:
+    roll = rng.random()
+    if depth < 4 and roll < 0.25:
+        return {f"k{i}{rng.choice(TRICKY_TEXT)}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+    if depth < 4 and roll < 0.45:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    if roll < 0.65:
+        return "".join(rng.choice(TRICKY_TEXT) for _ in range(rng.randint(0, 6)))
+    if roll < 0.75:
+        return rng.choice([None, True, False])
+    if roll < 0.80:
+        return float("nan")
+    return rng.choice([rng.randint(-1000, 1000), round(rng.uniform(-180, 180), 6)])
+
+
+def render(value: Any, rng: random.Random, sloppy: bool) -> str:
+    """JSON text for ``value``; ``sloppy`` mixes in Python literals, NaN and trailing commas."""
+    space = rng.choice(["", " ", "\n  "])
+    if isinstance(value, dict):
+        items = [f"{json.dumps(key, ensure_ascii=False)}:{space}{render(item, rng, sloppy)}" for key, item in value.items()]
+        trailing = "," if sloppy and items and rng.random() < 0.3 else ""
+        return "{" + space + f",{space}".join(items) + trailing + space + "}"
+    if isinstance(value, list):
+        items = [render(item, rng, sloppy) for item in value]
+        trailing = "," if sloppy and items and rng.random() < 0.3 else ""
+        return "[" + f",{space}".join(items) + trailing + "]"
+    if value is None:
+        return "None" if sloppy and rng.random() < 0.5 else "null"
+    if isinstance(value, bool):
+        if sloppy and rng.random() < 0.5:
+            return "True" if value else "False"
+        return "true" if value else "false"
+    if isinstance(value, float) and math.isnan(value):
+        return rng.choice(["NaN", "null"]) if sloppy else "null"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def normalized(value: Any) -> Any:
+    """Expected parse result: NaN becomes null."""
+    if isinstance(value, dict):
+        return {key: normalized(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalized(item) for item in value]
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def fuzz_case(rng: random.Random) -> Tuple[str, Any]:
+    value = {"type": "FeatureCollection", "payload": random_value(rng)}
+    text = render(value, rng, sloppy=True)
+    if rng.random() < 0.5:
+        text = f"```json\n{text}\n```"
+    if rng.random() < 0.4:
+        text = rng.choice(["好的，结果如下：\n", "Here is the JSON:\n"]) + text
+    if rng.random() < 0.3:
+        text += rng.choice(["\n注意：坐标可能需要校正 {见上}。", '\n{"second": true}', "\n以上 ]"])
+    return text, normalized(value)
+
+
+def attempt(loads: Callable[[str], Any], text: str) -> Optional[Any]:
+    try:
+        return loads(text)
+    except Exception:
+        return None
+
+
+def build_geojson_response(features: int, seed: int, sloppy: bool) -> str:
+    rng = random.Random(seed)
+    collection = {
+        "_mapping_thought": "按 D1-D5 生成路线；名称中出现 {D1} 或 None 不代表空值。",
+        "type": "FeatureCollection",
+        "global_properties": [{"visual_id": "global_title", "title": "新加坡五日游", "extra_info": None}],
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(103.6 + rng.random() * 0.4, 6), round(1.2 + rng.random() * 0.25, 6)]},
+                "properties": {
+                    "name": f"POI {index} [{rng.choice(['滨海湾', '圣淘沙', '小印度'])}]",
+                    "day": f"D{rng.randint(1, 5)}",
+                    "order": index + 1,
+                    "label_title": None if rng.random() < 0.3 else f"地点 {index}",
+                    "is_core": rng.random() < 0.2,
+                    "description": "步行约 10 分钟，True 爱好者必去 {推荐}",
+                },
+            }
+            for index in range(features)
+        ],
+    }
+    return f"```json\n{render(collection, rng, sloppy=sloppy)}\n```\n以上是 GeoJSON。"
+
+
+def median_ms(repeat: int, func: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LLM JSON 提取/修复的模糊测试与性能基准。")
+    parser.add_argument("--cases", type=int, default=2000, help="模糊测试用例数。")
+    parser.add_argument("--features", type=int, default=2000, help="基准 GeoJSON 的 Feature 数。")
+    parser.add_argument("--repeat", type=int, default=5, help="基准重复次数，取中位数。")
+    parser.add_argument("--seed", type=int, default=11, help="随机种子。")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    failures: List[str] = []
+    legacy_ok = 0
+    for _ in range(args.cases):
+        text, expected = fuzz_case(rng)
+        if attempt(_robust_json_loads, text) != expected:
+            failures.append(text)
+        legacy_ok += attempt(legacy_loads, text) == expected
+    print(f"🎲 模糊测试 {args.cases} 例: 扫描器通过 {args.cases - len(failures)}，旧实现通过 {legacy_ok}")
+
+    print(f"\n⏱️ {args.features} 个 Feature 的 GeoJSON 响应（{args.repeat} 次中位数）")
+    for label, sloppy in [("规范 JSON", False), ("含 Python 字面量/尾随逗号", True)]:
+        text = build_geojson_response(args.features, args.seed, sloppy)
+        new_ms = median_ms(args.repeat, lambda: _robust_json_loads(text))
+        legacy = attempt(legacy_loads, text)
+        if legacy is None:
+            legacy_text = "  解析失败"
+        else:
+            legacy_text = f"{median_ms(args.repeat, lambda: legacy_loads(text)):>8.1f} ms"
+            if legacy != _robust_json_loads(text):
+                legacy_text += "（字符串内容被改写）"
+        print(f"   {label:<22} {len(text) / 1024:>7.0f} KB  扫描器 {new_ms:>8.1f} ms  旧实现 {legacy_text}")
+
+    if failures:
+        print(f"\n❌ 扫描器未能解析的样例:\n{failures[0][:500]}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,10 @@ MultiModal Map Generation Agent
 """
 
 import os
-import json
 import base64
+import contextvars
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Callable, List, Optional, Dict, Any
 from pathlib import Path
@@ -37,7 +38,15 @@ from src.nodes.geojson_generation import GeoJSONGenerationNode
 from src.nodes.style_code_generation import StyleCodeGenerationNode
 from src.nodes.icon_generation import IconGenerationNode
 from src.nodes.validation_node import ValidationNode
-from src.utils.agent_utils import AgentState, _escape_prompt_braces, _cleanup_json_text, _coerce_json_like_literals, _extract_first_json_object, _robust_json_loads
+from src.utils.agent_utils import AgentState, _escape_prompt_braces, _extract_first_json_object, _robust_json_loads
+from src.utils import json_codec
+from src.utils.artifact_writer import atomic_write_bytes
+from src.utils.image_preprocess import image_buffers, pin_state_image
+from src.utils import fingerprints
+from src.utils.checkpointing import delete_thread, get_checkpointer, sweep_expired_threads, thread_config, touch_thread
+from src.utils import llm_usage, metrics, tracing
+from src.utils.profiling import thread_profiled
+from src.utils.tracing import span, start_trace
 
 
 
@@ -84,12 +93,13 @@ class SessionManager:
         if content is None:
             return filepath
         
-        if isinstance(content, (dict, list)):
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(content, f, ensure_ascii=False, indent=2)
-        else:
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(str(content))
+        with span("artifact.write", file=os.path.join(subdir, filename) if subdir else filename) as write_span:
+            if isinstance(content, (dict, list)):
+                data = json_codec.dumps(content)
+            else:
+                data = str(content).encode("utf-8")
+            atomic_write_bytes(filepath, data)
+            write_span.set(bytes=len(data))
 
         try:
             self.saved_files.append(os.path.relpath(filepath, session_dir))
@@ -109,20 +119,26 @@ class SessionManager:
         if not os.path.exists(filepath):
             return None
         
+        if filename.endswith(".json"):
+            return json_codec.load_file(filepath)
         with open(filepath, "r", encoding="utf-8") as f:
-            if filename.endswith(".json"):
-                return json.load(f)
             return f.read()
 
 
 class GraphState(TypedDict, total=False):
     """LangGraph 状态包装器"""
+    session_dir: str
     agent_state: AgentState
     intent_state: AgentState
     visual_state: AgentState
     geojson_state: AgentState
     style_gate_state: AgentState
 
+def configured_llm_model() -> str:
+    """Text LLM used by Nodes 1, 3 and 5 (``LLM_MODEL``)."""
+    return os.getenv("LLM_MODEL", "gpt-5.5")
+
+
 class MultiModalMapAgent:
     """多模态地图生成 Agent 主类
     
@@ -134,7 +150,7 @@ class MultiModalMapAgent:
         
         self.openai_key = os.getenv("OPENAI_API_KEY")
         self.http_proxy = os.getenv("HTTP_PROXY")
-        self.llm_model = os.getenv("LLM_MODEL", "gpt-5.5")
+        self.llm_model = configured_llm_model()
         self.vlm_model_type = os.getenv("VLM_MODEL", "qwen").lower()
         
         if self.vlm_model_type not in ["qwen", "gemini"]:
@@ -162,11 +178,38 @@ class MultiModalMapAgent:
         self.style_node = StyleCodeGenerationNode(self.llm_for_vlm)
         self.icon_node = IconGenerationNode()
         self.validation_node = ValidationNode(self.llm_for_text)
+        try:
+            self.geojson_candidates = max(1, int(os.getenv("GEOJSON_CANDIDATES", "1")))
+        except ValueError:
+            self.geojson_candidates = 1
         self._active_node_timings: Dict[str, float] = {}
+        self._active_geojson_candidates: List[Dict[str, Any]] = []
         self._event_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._active_tracer: Optional[tracing.Tracer] = None
+        self._active_usage: Optional[llm_usage.UsageLedger] = None
 
+        self.checkpointer = get_checkpointer()
         self.workflow = self._build_graph()
 
+    def _record_node_timing(self, node: str, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        self._active_node_timings[node] = round(elapsed * 1000, 2)
+        metrics.NODE_DURATION.observe(elapsed, node=node)
+
+    def _record_run_metrics(self, state: AgentState, status: str, total_runtime_ms: float) -> None:
+        metrics.RUNS.inc(status=status)
+        metrics.RUN_DURATION.observe(total_runtime_ms / 1000)
+        metrics.VALIDATION_RETRIES.observe(state.validation_retry_count)
+
+    def _usage_mark(self) -> int:
+        return self._active_usage.mark() if self._active_usage else 0
+
+    def _node_llm_usage(self, node: str, since: int) -> Optional[Dict[str, Any]]:
+        """Token/payload totals for ``node``'s LLM calls recorded after ``since``."""
+        if self._active_usage is None:
+            return None
+        return llm_usage.summarize(self._active_usage.calls(node=node, since=since))
+
     def _emit_event(self, event_type: str, **event_data: Any) -> None:
         """Best-effort event hook for API streaming; generation must not depend on it."""
         if not self._event_callback:
@@ -182,7 +225,9 @@ class MultiModalMapAgent:
 
         def node_intent(data: GraphState):
             """execute Node 1 intent enrichment."""
-            state = data["agent_state"].model_copy(deep=True)
+            # Nodes reassign top-level fields rather than mutating nested values,
+            # so a structural copy is enough to keep the parallel branches apart.
+            state = data["agent_state"].model_copy()
             self._emit_event(
                 "node_started",
                 session_id=state.session_id,
@@ -191,8 +236,10 @@ class MultiModalMapAgent:
                 status="running",
             )
             start = time.perf_counter()
-            state = self.intent_node.execute(state)
-            self._active_node_timings["node1_intent"] = round((time.perf_counter() - start) * 1000, 2)
+            usage_mark = self._usage_mark()
+            with span("node.intent", session_id=state.session_id):
+                state = self.intent_node.execute(state)
+            self._record_node_timing("node1_intent", start)
             self._emit_event(
                 "node_completed",
                 session_id=state.session_id,
@@ -203,6 +250,7 @@ class MultiModalMapAgent:
                     "intent_enriched": state.intent_enriched,
                     "global_title": state.global_title,
                     "global_description": state.global_description,
+                    "llm_usage": self._node_llm_usage(self.intent_node.PROMPT_NAME, usage_mark),
                 },
             )
             intent_path = self.session_manager.save_file(
@@ -220,7 +268,7 @@ class MultiModalMapAgent:
 
         def node_visual(data: GraphState):
             """execute Node 2 visual structure extraction."""
-            state = data["agent_state"].model_copy(deep=True)
+            state = data["agent_state"].model_copy()
             self._emit_event(
                 "node_started",
                 session_id=state.session_id,
@@ -229,15 +277,20 @@ class MultiModalMapAgent:
                 status="running",
             )
             start = time.perf_counter()
-            state = self.visual_node.execute(state)
-            self._active_node_timings["node2_visual"] = round((time.perf_counter() - start) * 1000, 2)
+            usage_mark = self._usage_mark()
+            with span("node.visual", session_id=state.session_id):
+                state = self.visual_node.execute(state)
+            self._record_node_timing("node2_visual", start)
             self._emit_event(
                 "node_completed",
                 session_id=state.session_id,
                 node_id="visual",
                 label="Visual structure extraction",
                 status="completed",
-                payload={"visual_structure": state.visual_structure},
+                payload={
+                    "visual_structure": state.visual_structure,
+                    "llm_usage": self._node_llm_usage(self.visual_node.PROMPT_NAME, usage_mark),
+                },
             )
             visual_path = self.session_manager.save_file(state.visual_structure, f"visual_{state.session_id}.json", "node2")
             self._emit_event(
@@ -262,8 +315,26 @@ class MultiModalMapAgent:
                 payload={"validation_retry_count": state.validation_retry_count},
             )
             start = time.perf_counter()
-            state = self.geojson_node.execute(state)
-            self._active_node_timings["node3_geojson"] = round((time.perf_counter() - start) * 1000, 2)
+            usage_mark = self._usage_mark()
+            session_id, validation_round = state.session_id, state.validation_retry_count
+
+            def feature_ready(payload: Dict[str, Any]) -> None:
+                self._emit_event(
+                    "feature_ready",
+                    session_id=session_id,
+                    node_id="geojson",
+                    label="Feature ready",
+                    status="streaming",
+                    payload={**payload, "validation_retry_count": validation_round},
+                )
+
+            candidate_round = None
+            with span("node.geojson", session_id=state.session_id, attempt=state.validation_retry_count):
+                if self.geojson_candidates > 1:
+                    state, candidate_round = self._generate_geojson_candidates(state)
+                else:
+                    state = self.geojson_node.execute(state, on_feature=feature_ready)
+            self._record_node_timing("node3_geojson", start)
             feature_count = len(state.geojson_data.get("features", [])) if isinstance(state.geojson_data, dict) else 0
             self._emit_event(
                 "node_completed",
@@ -275,6 +346,8 @@ class MultiModalMapAgent:
                     "feature_count": feature_count,
                     "validation_retry_count": state.validation_retry_count,
                     "geojson": state.geojson_data,
+                    "llm_usage": self._node_llm_usage(self.geojson_node.PROMPT_NAME, usage_mark),
+                    "candidates": candidate_round,
                 },
             )
             geojson_path = self.session_manager.save_file(
@@ -301,13 +374,16 @@ class MultiModalMapAgent:
                 status="running",
             )
             start = time.perf_counter()
-            state = self.validation_node.execute(state)
-            self._active_node_timings["node5_validate"] = round((time.perf_counter() - start) * 1000, 2)
+            usage_mark = self._usage_mark()
+            with span("node.validation", session_id=state.session_id):
+                state = self.validation_node.execute(state)
+            self._record_node_timing("node5_validate", start)
             validation_payload = {
                 "is_valid": state.is_valid,
                 "failed_node": state.failed_node,
                 "validation_feedback": state.validation_feedback,
                 "validation_retry_count": state.validation_retry_count,
+                "llm_usage": self._node_llm_usage(self.validation_node.PROMPT_NAME, usage_mark),
             }
             self._emit_event(
                 "node_validation",
@@ -348,12 +424,15 @@ class MultiModalMapAgent:
                 status="running",
             )
             start = time.perf_counter()
-            state = self.style_node.execute(state)
-            self._active_node_timings["node4_style"] = round((time.perf_counter() - start) * 1000, 2)
+            usage_mark = self._usage_mark()
+            with span("node.style", session_id=state.session_id):
+                state = self.style_node.execute(state)
+            self._record_node_timing("node4_style", start)
             icon_start = time.perf_counter()
             if not state.error:
-                state = self.icon_node.execute(state, self.session_manager.get_session_dir())
-            self._active_node_timings["node4_icon_tool"] = round((time.perf_counter() - icon_start) * 1000, 2)
+                with span("node.icon", session_id=state.session_id):
+                    state = self.icon_node.execute(state, self.session_manager.get_session_dir())
+            self._record_node_timing("node4_icon_tool", icon_start)
             icon_meta = state.style_code.get("_icon_generation", {}) if isinstance(state.style_code, dict) else {}
             if isinstance(state.style_code, dict):
                 for point_style in state.style_code.get("Point") or []:
@@ -368,7 +447,12 @@ class MultiModalMapAgent:
                 node_id="style",
                 label="Style generation",
                 status="completed",
-                payload={"style_sections": style_sections, "style_code": state.style_code, "icon_generation": icon_meta},
+                payload={
+                    "style_sections": style_sections,
+                    "style_code": state.style_code,
+                    "icon_generation": icon_meta,
+                    "llm_usage": self._node_llm_usage(self.style_node.PROMPT_NAME, usage_mark),
+                },
             )
             style_path = self.session_manager.save_file(state.style_code, f"style_{state.session_id}.json", "node4")
             self._emit_event(
@@ -405,12 +489,12 @@ class MultiModalMapAgent:
             # 兜底：进入样式生成
             return "to_style"
         
-        # 节点
-        workflow.add_node("Intent", node_intent)
-        workflow.add_node("Visual", node_visual)
-        workflow.add_node("GeoJSON", node_geojson)
+        # 节点（并行分支运行在 LangGraph 的执行线程中，需各自加入本次 run 的性能分析）
+        workflow.add_node("Intent", thread_profiled(node_intent))
+        workflow.add_node("Visual", thread_profiled(node_visual))
+        workflow.add_node("GeoJSON", thread_profiled(node_geojson))
         workflow.add_node("StyleGate", node_style_gate)
-        workflow.add_node("Style", node_style)
+        workflow.add_node("Style", thread_profiled(node_style))
 
         # 边
         workflow.add_edge(START, "Intent")
@@ -432,7 +516,9 @@ class MultiModalMapAgent:
         # 收尾
         workflow.add_edge("Style", END)
 
-        return workflow.compile()
+        # With a checkpointer every superstep is persisted under the run's
+        # thread_id, so ``resume`` can continue after a crash or restart.
+        return workflow.compile(checkpointer=self.checkpointer)
 
     def _init_vlm_model(self) -> ChatOpenAI:
         """初始化 VLM 模型（支持 QwenVLM 或 Gemini）"""
@@ -460,6 +546,43 @@ class MultiModalMapAgent:
                 temperature=0.7
             )
 
+    def _generate_geojson_candidates(self, state: AgentState) -> tuple[AgentState, Dict[str, Any]]:
+        """Run Node 3 ``geojson_candidates`` times in parallel and keep the
+        candidate with the fewest deterministic QA issues (ties go to the
+        lowest index). Streaming ``feature_ready`` events are not sent in this
+        mode because candidates would interleave."""
+        count = self.geojson_candidates
+        print(f"🎲 [Node 3] 并行生成 {count} 个候选 GeoJSON...")
+
+        def generate(index: int, candidate: AgentState) -> AgentState:
+            with span("geojson.candidate", candidate=index):
+                return self.geojson_node.execute(candidate)
+
+        candidates = [state.model_copy(deep=True) for _ in range(count)]
+        with ThreadPoolExecutor(max_workers=count, thread_name_prefix="geojson-candidate") as pool:
+            # One context copy per task: a Context cannot be entered by two threads at once.
+            futures = [
+                pool.submit(contextvars.copy_context().run, thread_profiled(generate), index, candidate)
+                for index, candidate in enumerate(candidates)
+            ]
+            candidates = [future.result() for future in futures]
+
+        scores = [{"index": index, **self.validation_node.score_candidate(c)} for index, c in enumerate(candidates)]
+        usable = [entry for entry in scores if entry["score"] is not None]
+        selected = min(usable, key=lambda entry: (entry["score"], entry["index"]))["index"] if usable else 0
+        winner = candidates[selected]
+        for candidate in candidates:
+            for key, entry in candidate.poi_resolutions.items():
+                winner.poi_resolutions.setdefault(key, entry)
+
+        candidate_round = {"validation_round": state.validation_retry_count, "selected": selected, "candidates": scores}
+        self._active_geojson_candidates.append(candidate_round)
+        summary = "，".join(
+            f"#{entry['index']}={'失败' if entry['score'] is None else entry['score']}" for entry in scores
+        )
+        print(f"🏁 [Node 3] 候选程序化问题数：{summary}；选用 #{selected}")
+        return winner, candidate_round
+
     def _get_model_config(self) -> Dict[str, Any]:
         """Return non-secret model/runtime config for experiment manifests."""
         vlm_model = "qwen-vl-max" if self.vlm_model_type == "qwen" else "gemini-3-pro-preview"
@@ -498,6 +621,7 @@ class MultiModalMapAgent:
         finished_at: str,
         total_runtime_ms: float,
         status: str,
+        resumed: bool = False,
     ) -> str:
         """Persist a compact manifest for reproducibility and batch experiments."""
         manifest = {
@@ -512,12 +636,16 @@ class MultiModalMapAgent:
                 "user_text": state.user_text,
                 "image_path": state.image_path,
                 "image_filename": os.path.basename(state.image_path) if state.image_path else None,
+                "image_preprocess": state.image_preprocess,
             },
             "model_config": self._get_model_config(),
             "prompt_versions": self._get_prompt_versions(),
             "workflow": {
                 "node_timings_ms": dict(self._active_node_timings),
+                "resumed_from_checkpoint": resumed,
+                "trace_file": tracing.TRACE_FILE if self._active_tracer else None,
                 "validation_retry_count": state.validation_retry_count,
+                "geojson_candidates": list(self._active_geojson_candidates),
                 "retry_count": state.retry_count,
                 "is_valid": state.is_valid,
                 "failed_node": state.failed_node,
@@ -529,9 +657,48 @@ class MultiModalMapAgent:
                 "style_sections": sorted([k for k in state.style_code.keys() if not k.startswith("_")]) if isinstance(state.style_code, dict) else [],
                 "files": list(self.session_manager.saved_files),
             },
+            "llm_usage": self._active_usage.to_manifest() if self._active_usage else None,
             "error": state.error,
         }
         return self.session_manager.save_file(manifest, "session_manifest.json")
+
+    def _save_node_fingerprints(self, state: AgentState) -> str:
+        """Record the inputs each downstream artifact was computed from, for incremental reruns."""
+        return self.session_manager.save_file(
+            {
+                "node3": {
+                    "inputs": fingerprints.geojson_inputs(
+                        state.intent_enriched,
+                        state.user_text,
+                        state.global_title,
+                        state.global_description,
+                        self.geojson_node.PROMPT_VERSION,
+                        self.llm_model,
+                    )
+                },
+                "validation": {
+                    "inputs": fingerprints.validation_inputs(
+                        state.user_text,
+                        state.geojson_data,
+                        self.validation_node.PROMPT_VERSION,
+                        self.validation_node.mode,
+                        self.llm_model,
+                    ),
+                    "is_valid": state.is_valid,
+                    "failed_node": state.failed_node,
+                    "validation_feedback": state.validation_feedback,
+                },
+                "node4": {
+                    "inputs": fingerprints.style_inputs(
+                        state.visual_structure,
+                        state.geojson_data,
+                        state.image_path,
+                        self.style_node.PROMPT_VERSION,
+                    )
+                },
+            },
+            fingerprints.FINGERPRINT_FILE,
+        )
     
     def run(
         self,
@@ -544,10 +711,6 @@ class MultiModalMapAgent:
         
         session_dir = self.session_manager.create_session(session_id)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        started_at = datetime.now().isoformat()
-        run_start = time.perf_counter()
-        self._active_node_timings = {}
-        self._event_callback = emit_event
         
         # 1. 初始化状态对象
         state = AgentState(
@@ -563,31 +726,125 @@ class MultiModalMapAgent:
         print("=" * 60)
         
         # 2. 包装状态并启动 LangGraph 引擎
-        initial_graph_state: GraphState = {"agent_state": state}
+        initial_graph_state: GraphState = {"agent_state": state, "session_dir": session_dir}
+        return self._invoke_graph(initial_graph_state, state, session_dir, emit_event)
+
+    def has_checkpoint(self, session_id: str) -> bool:
+        if self.checkpointer is None:
+            return False
+        return self.checkpointer.get_tuple(thread_config(session_id)) is not None
+
+    def resume(
+        self,
+        session_id: str,
+        emit_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """从最近一次检查点继续执行中断的运行；已完成的节点不会重新调用。"""
+        if self.checkpointer is None:
+            raise RuntimeError("未启用运行检查点（需要安装 langgraph-checkpoint-sqlite）")
+        snapshot = self.workflow.get_state(thread_config(session_id))
+        values = snapshot.values or {}
+        if "agent_state" not in values:
+            raise ValueError(f"没有可恢复的检查点: {session_id}")
+
+        state: AgentState = values["agent_state"]
+        session_dir = values.get("session_dir") or self.session_manager.get_session_dir()
+        self.session_manager.current_session_dir = session_dir
+        self.session_manager.saved_files = sorted(
+            os.path.relpath(os.path.join(root, name), session_dir)
+            for root, _, names in os.walk(session_dir)
+            for name in names
+        )
+
+        print("=" * 60)
+        print(f"♻️ [LangGraph] 从检查点恢复运行: {session_id}")
+        print(f"   待执行节点: {', '.join(snapshot.next) or '无（仅收尾）'}")
+        print("=" * 60)
+        # ``None`` input tells LangGraph to continue from the saved checkpoint.
+        return self._invoke_graph(None, state, session_dir, emit_event, resumed=True)
+
+    def _invoke_graph(
+        self,
+        graph_input: Optional[GraphState],
+        state: AgentState,
+        session_dir: str,
+        emit_event: Optional[Callable[[str, Dict[str, Any]], None]],
+        resumed: bool = False,
+    ) -> Dict[str, Any]:
+        # A resumed run keeps counting on top of the calls the interrupted attempt already paid for.
+        ledger = llm_usage.UsageLedger(self._previous_llm_calls() if resumed else None)
+        with start_trace(state.session_id, resumed=resumed) as tracer, llm_usage.usage_ledger(ledger):
+            self._active_tracer = tracer
+            self._active_usage = ledger
+            try:
+                result = self._execute_graph(graph_input, state, session_dir, emit_event, resumed)
+            finally:
+                self._active_tracer = None
+                self._active_usage = None
+        if tracer is not None:
+            # Exported once the run span has closed so the trace is complete.
+            try:
+                tracer.write(session_dir)
+            except OSError as exc:
+                print(f"⚠️ 追踪文件写入失败: {exc}")
+        return result
+
+    def _previous_llm_calls(self) -> List[Dict[str, Any]]:
+        try:
+            manifest = self.session_manager.load_file("session_manifest.json") or {}
+        except (OSError, ValueError) as exc:
+            print(f"⚠️ 读取上次运行的用量记录失败: {exc}")
+            return []
+        return list((manifest.get("llm_usage") or {}).get("calls") or [])
+
+    def _execute_graph(
+        self,
+        graph_input: Optional[GraphState],
+        state: AgentState,
+        session_dir: str,
+        emit_event: Optional[Callable[[str, Dict[str, Any]], None]],
+        resumed: bool,
+    ) -> Dict[str, Any]:
+        started_at = datetime.now().isoformat()
+        run_start = time.perf_counter()
+        self._active_node_timings = {}
+        self._active_geojson_candidates = []
+        self._event_callback = emit_event
+        image_ref = pin_state_image(state)
+        config = thread_config(state.session_id)
+        touch_thread(self.checkpointer, state.session_id)
+        sweep_expired_threads(self.checkpointer)
         
         # invoke 会自动按照你定义的拓扑结构执行，直至抵达 END 节点
         try:
-            final_result_state = self.workflow.invoke(initial_graph_state)
+            final_result_state = self.workflow.invoke(graph_input, config=config)
         except Exception as e:
+            # The checkpoint is kept so the run can be resumed from here.
             state.error = str(e)
             finished_at = datetime.now().isoformat()
+            total_runtime_ms = (time.perf_counter() - run_start) * 1000
+            self._record_run_metrics(state, "error", total_runtime_ms)
             manifest_path = self._save_session_manifest(
                 state,
                 session_dir=session_dir,
                 started_at=started_at,
                 finished_at=finished_at,
-                total_runtime_ms=(time.perf_counter() - run_start) * 1000,
+                total_runtime_ms=total_runtime_ms,
                 status="error",
+                resumed=resumed,
             )
             return self._handle_error(state, manifest_path=manifest_path)
         finally:
             self._event_callback = None
+            image_buffers.release(image_ref)
+        delete_thread(self.checkpointer, state.session_id)
         
         # 3. 剥离并获取最终状态
         final_state: AgentState = final_result_state["agent_state"]
         finished_at = datetime.now().isoformat()
         total_runtime_ms = (time.perf_counter() - run_start) * 1000
         status = "error" if final_state.error else "success"
+        self._record_run_metrics(final_state, status, total_runtime_ms)
         manifest_path = self._save_session_manifest(
             final_state,
             session_dir=session_dir,
@@ -595,10 +852,12 @@ class MultiModalMapAgent:
             finished_at=finished_at,
             total_runtime_ms=total_runtime_ms,
             status=status,
+            resumed=resumed,
         )
         
         if final_state.error:
             return self._handle_error(final_state, manifest_path=manifest_path)
+        self._save_node_fingerprints(final_state)
             
         print("=" * 60)
         print(f"✅ 流程完成! 共经历 {final_state.validation_retry_count} 次自我纠错。")
@@ -616,6 +875,7 @@ class MultiModalMapAgent:
             "manifest_path": manifest_path,
             "runtime_ms": round(total_runtime_ms, 2),
             "node_timings_ms": dict(self._active_node_timings),
+            "llm_usage": llm_usage.summarize(self._active_usage.calls()) if self._active_usage else None,
         }
     
     def _handle_error(self, state: AgentState, manifest_path: Optional[str] = None) -> Dict[str, Any]:
@@ -644,8 +904,7 @@ class MultiModalMapAgent:
                 if files:
                     latest_file = sorted(files)[-1]
                     filepath = os.path.join(subdir_path, latest_file)
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        history[subdir] = json.load(f)
+                    history[subdir] = json_codec.load_file(filepath)
         
         return history if history else None
 
@@ -0,0 +1,194 @@
+"""
+Compact Node 3 output schema and its deterministic expansion.
+
+The LLM only decides which POIs to visit, in what order, how to label them and
+what to search for. Routes, ``visual_id`` values, label titles that repeat the
+name and default search names are derived here, so the model does not spend
+output tokens on them:
+
+    {
+      "why": "one-sentence mapping rationale",
+      "city": "北京",
+      "geo": "amap",
+      "g": [{"t": "title", "s": "script", "x": "extra info"}, {"t": "summary", "s": "script"}],
+      "p": [
+        {"n": "故宫博物院", "c": "culture", "d": 1, "o": 2, "l": "detail",
+         "s": "label script", "x": "extra info", "ll": [116.397, 39.916]}
+      ]
+    }
+
+Optional point keys: ``t`` (label title, defaults to ``n``), ``q`` (search
+name, defaults to ``n``), ``en`` (English search name), ``geo`` (provider hint
+overriding the top-level one). ``expand_compact`` turns this into the
+FeatureCollection the rest of Node 3 works on, including one LineString per
+day through that day's points in ``o`` order; full GeoJSON passes through
+unchanged.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+COMPACT_EXAMPLE = '''{
+  "why": "Node 1 为 2 天行程，D1 中轴线步行，D2 长城后返城；两天起点为 core。",
+  "city": "北京",
+  "geo": "amap",
+  "g": [
+    {"t": "2 天 1 夜北京核心景点游", "s": "中轴线历史漫步 + 长城轻量远足", "x": "D1：天安门广场→故宫博物院→景山公园；D2：八达岭长城→奥林匹克公园"},
+    {"t": "路线节奏", "s": "D1 以步行为主，D2 早出发串联远郊与返程前城市地标"}
+  ],
+  "p": [
+    {"n": "天安门广场", "c": "scenic", "d": 1, "o": 1, "l": "core", "s": "D1 起点，建议清晨抵达", "ll": [116.397, 39.908]},
+    {"n": "故宫博物院", "c": "culture", "d": 1, "o": 2, "l": "detail", "s": "步行进入，预留 3-4 小时", "x": "提前预约", "ll": [116.397, 39.916]},
+    {"n": "景山公园", "c": "scenic", "d": 1, "o": 3, "l": "secondary", "s": "俯瞰故宫和中轴线", "ll": [116.395, 39.923]},
+    {"n": "八达岭长城", "c": "scenic", "d": 2, "o": 1, "l": "core", "s": "D2 早出发，高铁/市郊铁路衔接", "ll": [116.416, 40.359]},
+    {"n": "奥林匹克公园", "c": "culture", "d": 2, "o": 2, "l": "secondary", "s": "返程前轻量游览", "ll": [116.391, 39.992]}
+  ]
+}'''
+
+GLOBAL_VISUAL_IDS = ("global_title", "global_summary")
+
+
+def is_compact(data: Any) -> bool:
+    return isinstance(data, dict) and isinstance(data.get("p"), list) and "features" not in data
+
+
+def _day_label(value: Any) -> str:
+    text = str(value if value is not None else "").strip()
+    return f"D{text}" if text.isdigit() else text or "D1"
+
+
+def _coordinates(value: Any) -> Optional[List[float]]:
+    try:
+        return [float(value[0]), float(value[1])]
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+
+
+def expand_point(item: Dict[str, Any], provider_hint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """One compact ``p`` entry as a GeoJSON Point feature; ``None`` without usable ``ll``."""
+    coordinates = _coordinates(item.get("ll"))
+    if coordinates is None:
+        return None
+    name = str(item.get("n") or "")
+    category = str(item.get("c") or "poi")
+    props: Dict[str, Any] = {
+        "visual_id": f"point_{category}",
+        "category": category,
+        "name": name,
+        "day": _day_label(item.get("d")),
+        "order": item.get("o"),
+        "label_level": item.get("l") or "secondary",
+        "label_title": item.get("t") or name,
+        "label_script": item.get("s") or "",
+        "label_extra_info": item.get("x") or "",
+        "search_name": item.get("q") or name,
+    }
+    if item.get("en"):
+        props["search_name_en"] = item["en"]
+    hint = item.get("geo") or provider_hint
+    if hint:
+        props["geocode_provider_hint"] = hint
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": coordinates}, "properties": props}
+
+
+def _order_key(feature: Dict[str, Any]) -> float:
+    try:
+        return float(feature["properties"].get("order"))
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def _day_routes(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for point in points:
+        by_day.setdefault(point["properties"]["day"], []).append(point)
+    routes = []
+    for day, day_points in by_day.items():
+        day_points = sorted(day_points, key=_order_key)
+        routes.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [list(p["geometry"]["coordinates"]) for p in day_points]},
+                "properties": {
+                    "visual_id": f"route_{day}",
+                    "name": f"{day} 路线",
+                    "day": day,
+                    "point_names": [p["properties"]["name"] for p in day_points],
+                },
+            }
+        )
+    return routes
+
+
+def _expand_globals(items: Any) -> List[Dict[str, Any]]:
+    expanded = []
+    for visual_id, item in zip(GLOBAL_VISUAL_IDS, items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        entry = {"visual_id": visual_id, "title": item.get("t") or "", "script": item.get("s") or ""}
+        if visual_id == "global_title":
+            entry["extra_info"] = item.get("x") or ""
+        expanded.append(entry)
+    return expanded
+
+
+def expand_compact(data: Any) -> Any:
+    """Expand compact Node 3 output into a FeatureCollection; anything else is returned as is."""
+    if not is_compact(data):
+        return data
+    provider_hint = data.get("geo")
+    points = [
+        feature
+        for feature in (expand_point(item, provider_hint) for item in data["p"] if isinstance(item, dict))
+        if feature is not None
+    ]
+    return {
+        "_mapping_thought": data.get("why") or "",
+        "_city": data.get("city") or "",
+        "type": "FeatureCollection",
+        "global_properties": _expand_globals(data.get("g")),
+        "features": _day_routes(points) + points,
+    }
+
+
+def compact_from_geojson(geojson_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact view of a Node 3 result, used to show the previous round to the model on QA retries."""
+    points = [
+        feature for feature in geojson_data.get("features", [])
+        if (feature.get("geometry") or {}).get("type") == "Point"
+    ]
+    hints = [(p.get("properties") or {}).get("geocode_provider_hint") for p in points]
+    provider_hint = next((hint for hint in hints if hint), None)
+    compact_points = []
+    for feature in points:
+        props = feature.get("properties") or {}
+        name = props.get("name") or ""
+        day = str(props.get("day") or "")
+        item: Dict[str, Any] = {
+            "n": name,
+            "c": props.get("category"),
+            "d": int(day[1:]) if day[1:].isdigit() else day,
+            "o": props.get("order"),
+            "l": props.get("label_level"),
+            "s": props.get("label_script") or "",
+        }
+        optional = {
+            "t": props.get("label_title") if props.get("label_title") != name else None,
+            "x": props.get("label_extra_info"),
+            "q": props.get("search_name") if props.get("search_name") not in (None, name) else None,
+            "en": props.get("search_name_en"),
+            "geo": props.get("geocode_provider_hint") if props.get("geocode_provider_hint") != provider_hint else None,
+        }
+        item.update((key, value) for key, value in optional.items() if value)
+        item["ll"] = (feature.get("geometry") or {}).get("coordinates")
+        compact_points.append(item)
+    compact: Dict[str, Any] = {"city": geojson_data.get("_city") or ""}
+    if provider_hint:
+        compact["geo"] = provider_hint
+    compact["g"] = [
+        {key: value for key, value in (("t", g.get("title")), ("s", g.get("script")), ("x", g.get("extra_info"))) if value}
+        for g in geojson_data.get("global_properties") or []
+        if isinstance(g, dict)
+    ]
+    compact["p"] = compact_points
+    return compact
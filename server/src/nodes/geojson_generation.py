@@ -1,14 +1,48 @@
+import contextvars
 import os
 import re
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate
-from ..utils.agent_utils import AgentState, _escape_prompt_braces, _extract_first_json_object, _robust_json_loads
+from ..utils.agent_utils import AgentState, _escape_prompt_braces, _robust_json_loads
+from ..utils.json_repair import FeatureStream
 from ..utils.prompt_loader import load_prompt
+from ..utils.metrics import llm_call
+from ..utils.poi_index import PoiIndex, distance_meters
+from ..utils import profiling
+from ..utils.tracing import span
 from ..validators.schema_validators import validate_geojson
 
 from ..amap_service import AMapService
-import math
+from .geojson_compact import COMPACT_EXAMPLE, compact_from_geojson, expand_compact, expand_point, is_compact
+
+try:
+    import jsonpatch
+except ImportError:  # pragma: no cover - ships with langchain-core
+    jsonpatch = None
+
+# Same-day POIs closer than this are treated as one place during dedupe.
+DUPLICATE_POI_RADIUS_METERS = 20
+
+# Properties Node 3 derives itself; they are left out of the JSON Patch target.
+SERVER_DERIVED_PROPERTIES = (
+    "feature_id",
+    "semantic_role",
+    "geocode_query",
+    "geocode_provider",
+    "geocode_language",
+    "geocode_city",
+    "geocode_source",
+    "geocode_confidence",
+    "geocode_coordinate_system",
+    "geocode_warning",
+    "geocode_reused",
+)
 
 CITY_BOUNDS = {
     "新加坡": (103.55, 1.15, 104.15, 1.50),
@@ -42,6 +76,80 @@ SINGAPORE_KNOWN_POIS = [
     {"name": "西乐索炮台空中步道", "aliases": ["西乐索炮台空中步道", "Fort Siloso Skywalk"], "coordinates": [103.8108, 1.2574], "category": "scenic", "day": 2},
 ]
 
+# Geocode metadata that does not come from a geocoder; such Points are not
+# added to the session resolution table.
+UNRESOLVED_GEOCODE_PROVIDERS = {None, "", "skipped", "model"}
+
+
+class _GeocodePrefetch:
+    """Geocode Points on a small pool while the completion is still streaming.
+
+    Results are keyed by the exact arguments ``_correct_and_sync_topology``
+    passes to ``geocode_poi``, so a prefetched lookup is only reused for an
+    identical request; anything else is geocoded synchronously as before.
+    Like the synchronous pass, only the first Point per model coordinate is
+    looked up.
+    """
+
+    def __init__(self, node: "GeoJSONGenerationNode", workers: int, on_result: Optional[Callable] = None):
+        self._node = node
+        self._on_result = on_result
+        # Held around each callback so none fires after ``close`` returns.
+        self._callback_lock = threading.Lock()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode-prefetch")
+        self._futures: dict[tuple, Future] = {}
+        self._seen_coords: set[tuple] = set()
+
+    @property
+    def submitted(self) -> int:
+        return len(self._seen_coords)
+
+    def submit(self, index: int, feature: dict, city: str) -> bool:
+        try:
+            old_coords = tuple(feature["geometry"]["coordinates"])
+            location = f"{old_coords[0]},{old_coords[1]}"
+        except (KeyError, TypeError, IndexError):
+            return False
+        if old_coords in self._seen_coords:
+            return False
+        self._seen_coords.add(old_coords)
+        query, search_name_en, provider_hint = self._node._geocode_query_fields(feature.get("properties") or {})
+        key = (query, city, location, search_name_en, provider_hint)
+        # Copy the context so geocode spans and the run profile follow the work.
+        self._futures[key] = self._executor.submit(contextvars.copy_context().run, self._lookup, index, feature, key)
+        return True
+
+    def _lookup(self, index: int, feature: dict, key: tuple) -> Optional[dict]:
+        query, city, location, search_name_en, provider_hint = key
+        with profiling.profile_thread():
+            result = self._node.amap_service.geocode_poi(
+                query,
+                city=city,
+                location=location,
+                search_name_en=search_name_en,
+                provider_hint=provider_hint,
+            )
+        if self._on_result is not None:
+            with self._callback_lock:
+                if not self._closed:
+                    try:
+                        self._on_result(index, feature, result, city)
+                    except Exception as exc:
+                        # The lookup itself succeeded; keep it so _geocode does not repeat the request.
+                        print(f"⚠️ [Node 3] feature_ready 回调失败: {exc}")
+        return result
+
+    def take(self, key: tuple) -> Optional[Future]:
+        return self._futures.pop(key, None)
+
+    def close(self) -> None:
+        """Stop reporting results; lookups still running finish without callbacks."""
+        with self._callback_lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 class GeoJSONGenerationNode:
     """Node 3: 数据结构化与拓扑映射 (Model: GPT-5/o1)
     
@@ -51,8 +159,19 @@ class GeoJSONGenerationNode:
     """
 
     PROMPT_NAME = "geojson_generation"
-    PROMPT_VERSION = "v0.4"
+    PROMPT_VERSION = "v0.5"
+    # GEOJSON_OUTPUT_SCHEMA=full keeps the previous full-GeoJSON prompt.
+    PROMPT_VERSIONS = {"compact": "v0.5", "full": "v0.4"}
     
+    @staticmethod
+    def configured_output_schema() -> str:
+        return "full" if os.getenv("GEOJSON_OUTPUT_SCHEMA", "compact").strip().lower() == "full" else "compact"
+
+    @classmethod
+    def configured_prompt_version(cls) -> str:
+        """Prompt version an instance built from the current environment would use."""
+        return cls.PROMPT_VERSIONS[cls.configured_output_schema()]
+
     def __init__(self, llm: ChatOpenAI, amap_service: AMapService = None):
         self.llm = llm
         self.amap_service = amap_service or AMapService()
@@ -60,6 +179,18 @@ class GeoJSONGenerationNode:
             self.max_pois_per_day = max(2, int(os.getenv("MAX_POIS_PER_DAY", "5")))
         except ValueError:
             self.max_pois_per_day = 5
+        self.streaming = os.getenv("GEOJSON_STREAMING", "true").strip().lower() not in {"0", "false", "no", "off"}
+        try:
+            self.geocode_workers = max(1, int(os.getenv("GEOJSON_GEOCODE_WORKERS", "4")))
+        except ValueError:
+            self.geocode_workers = 4
+        self.output_schema = self.configured_output_schema()
+        self.PROMPT_VERSION = self.PROMPT_VERSIONS[self.output_schema]
+        # patch: QA retries first ask for an RFC 6902 patch against the previous result.
+        retry_mode = os.getenv("GEOJSON_RETRY_MODE", "patch").strip().lower()
+        if retry_mode == "patch" and jsonpatch is None:
+            print("⚠️ [Node 3] 未安装 jsonpatch，QA 重试改为整体重新生成")
+        self.retry_mode = "patch" if retry_mode == "patch" and jsonpatch is not None else "regenerate"
         
         geojson_example = '''{
   "_mapping_thought": "我从 Node 1 中识别出 2 天行程，因此按 D1/D2 生成两条 LineString；每个 POI 都是具体地点；D1 起点和 D2 关键点为 core，其余为 secondary 或 detail。",
@@ -205,15 +336,28 @@ class GeoJSONGenerationNode:
   ]
 }'''
 
-        raw_system_prompt = load_prompt("geojson_generation.md").replace("{geojson_example}", geojson_example)
+        if self.output_schema == "compact":
+            raw_system_prompt = load_prompt("geojson_generation_compact.md").replace("{geojson_example}", COMPACT_EXAMPLE)
+            request_line = "请按紧凑格式输出 POI 清单："
+        else:
+            raw_system_prompt = load_prompt("geojson_generation.md").replace("{geojson_example}", geojson_example)
+            request_line = "请生成 GeoJSON 数据："
         system_prompt = _escape_prompt_braces(raw_system_prompt)
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
-            ("human", "用户旅行规划：\n{intent_enriched}\n\n{feedback_section}请生成 GeoJSON 数据：")
+            ("human", "用户旅行规划：\n{intent_enriched}\n\n{feedback_section}" + request_line)
+        ])
+        self.patch_prompt = ChatPromptTemplate.from_messages([
+            ("system", _escape_prompt_braces(raw_system_prompt + "\n" + load_prompt("geojson_patch.md"))),
+            (
+                "human",
+                "用户旅行规划：\n{intent_enriched}\n\n"
+                "【上次生成的结果（JSON Patch 的目标文档）】:\n{previous_result}\n\n"
+                "【QA 反馈意见（必须修正以下所有问题）】:\n{feedback}\n\n"
+                "请输出 JSON Patch：",
+            ),
         ])
-        
-        self.chain = self.prompt | self.llm
     
 
     
@@ -224,13 +368,7 @@ class GeoJSONGenerationNode:
         provider_hint = props.get("geocode_provider_hint") or props.get("geocode_provider") or props.get("provider_hint")
         return str(query or name), str(search_name_en).strip() if search_name_en else None, str(provider_hint).strip() if provider_hint else None
 
-    def _apply_geocode_metadata(self, props: dict, result: dict | None, fallback_query: str, skipped: bool = False) -> None:
-        if skipped:
-            props.setdefault("geocode_query", fallback_query)
-            props["geocode_provider"] = props.get("geocode_provider") or "skipped"
-            props["geocode_source"] = props.get("geocode_source") or "qa_retry_no_external_geocode"
-            props["geocode_confidence"] = props.get("geocode_confidence") or "model"
-            return
+    def _apply_geocode_metadata(self, props: dict, result: dict | None, fallback_query: str) -> None:
         if not result:
             return
         props["geocode_query"] = result.get("query") or fallback_query
@@ -243,24 +381,115 @@ class GeoJSONGenerationNode:
         if result.get("warning"):
             props["geocode_warning"] = result["warning"]
 
-    def _correct_and_sync_topology(self, geojson_data: dict, allow_external_geocode: bool = True) -> dict:
-        """核心逻辑：基于原始坐标映射，同步更新所有几何图形"""
+    def _accept_geocode(self, coords, bounds) -> bool:
+        return bool(coords) and (not bounds or self._within_bounds(coords, bounds))
+
+    def _geocode(self, prefetch: Optional[_GeocodePrefetch], query: str, city, location: str, search_name_en, provider_hint):
+        future = prefetch.take((query, city, location, search_name_en, provider_hint)) if prefetch else None
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as exc:
+                print(f"      ⚠️ [{query}] 预取坐标失败，改为同步检索: {exc}")
+        return self.amap_service.geocode_poi(
+            query,
+            city=city,
+            location=location,
+            search_name_en=search_name_en,
+            provider_hint=provider_hint,
+        )
+
+    def _resolution_keys(self, city, props: dict) -> list[str]:
+        """Resolution-table keys of a Point: its normalized name and search names, scoped to the destination."""
+        scope = self._normalize_poi_name(city)
+        query, search_name_en, _ = self._geocode_query_fields(props)
+        names = {self._normalize_poi_name(value) for value in (props.get("name"), query, search_name_en)}
+        return [f"{scope}|{name}" for name in sorted(names) if name]
+
+    def _resolved(self, resolutions: Optional[dict], city, props: dict, coordinates=None) -> Optional[dict]:
+        """Table entry for a Point; ``None`` when the model moved it (``coordinates``)
+        farther than the de-duplication radius from the resolved position, since
+        the model was shown that position and changed it on purpose."""
+        if not resolutions:
+            return None
+        for key in self._resolution_keys(city, props):
+            entry = resolutions.get(key)
+            if entry:
+                if coordinates is not None and distance_meters(coordinates, entry["coordinates"]) > DUPLICATE_POI_RADIUS_METERS:
+                    return None
+                return entry
+        return None
+
+    def _invalidate_resolutions(self, resolutions: dict, geojson_data: Optional[dict], feedback: str) -> int:
+        """Drop table entries of previous-round Points the QA feedback names, so a
+        "wrong location" complaint leads to a fresh geocode instead of a replay."""
+        if not resolutions or not geojson_data or not feedback:
+            return 0
+        text = self._normalize_poi_name(feedback)
+        city = geojson_data.get("_city", "")
+        dropped = 0
+        for feature in geojson_data.get("features", []):
+            if feature.get("geometry", {}).get("type") != "Point":
+                continue
+            props = feature.get("properties") or {}
+            query, search_name_en, _ = self._geocode_query_fields(props)
+            names = {self._normalize_poi_name(value) for value in (props.get("name"), query, search_name_en)}
+            if not any(len(name) >= 2 and name in text for name in names):
+                continue
+            for key in self._resolution_keys(city, props):
+                if resolutions.pop(key, None) is not None:
+                    dropped += 1
+        if dropped:
+            print(f"   🔄 QA 反馈涉及的 POI 不再复用会话坐标（移除 {dropped} 条解析记录）")
+        return dropped
+
+    def _remember_resolutions(self, resolutions: dict, geojson_data: dict) -> int:
+        """Record the geocoded Points of a finished result so QA retries can reuse their coordinates."""
+        city = geojson_data.get("_city", "")
+        added = 0
+        for feature in geojson_data.get("features", []):
+            if feature.get("geometry", {}).get("type") != "Point":
+                continue
+            props = feature.get("properties") or {}
+            if props.get("geocode_provider") in UNRESOLVED_GEOCODE_PROVIDERS or props.get("geocode_reused"):
+                continue
+            entry = {
+                "coordinates": list(feature["geometry"]["coordinates"]),
+                "provider": props.get("geocode_provider"),
+                "query": props.get("geocode_query"),
+                "language": props.get("geocode_language"),
+                "city": props.get("geocode_city"),
+                "source": props.get("geocode_source"),
+                "confidence": props.get("geocode_confidence"),
+                "coordinate_system": props.get("geocode_coordinate_system"),
+            }
+            for key in self._resolution_keys(city, props):
+                if resolutions.get(key) != entry:
+                    resolutions[key] = entry
+                    added += 1
+        return added
+
+    def _correct_and_sync_topology(
+        self,
+        geojson_data: dict,
+        prefetch: Optional[_GeocodePrefetch] = None,
+        resolutions: Optional[dict] = None,
+    ) -> dict:
+        """核心逻辑：基于原始坐标映射，同步更新所有几何图形。
+
+        Points already in ``resolutions`` (the session's resolution table) take
+        their resolved coordinates without a geocoder call unless the model
+        moved them; the remaining Points are geocoded.
+        """
         features = geojson_data.get("features", [])
         city = geojson_data.get("_city", "")
         bounds = self._city_bounds(city)
-        if not allow_external_geocode:
-            print("   ↪️ QA retry 轮跳过外部坐标检索，保留 Node3 按 QA 修正后的坐标")
-            for feat in features:
-                if feat.get("geometry", {}).get("type") == "Point":
-                    props = feat.setdefault("properties", {})
-                    query, _, _ = self._geocode_query_fields(props)
-                    self._apply_geocode_metadata(props, None, query, skipped=True)
-            return geojson_data
         
         # 1. 建立全局坐标真值表
         # 格式: { (原始经度, 原始纬度): [修正后经度, 修正后纬度] }
         coord_map = {}
         valid_points = []
+        reused = geocoded = 0
         
         print("   🔍 开始修正 Point 坐标并建立映射表...")
         for feat in features:
@@ -268,20 +497,24 @@ class GeoJSONGenerationNode:
                 old_coords = tuple(feat["geometry"]["coordinates"])
                 props = feat.setdefault("properties", {})
                 name = props.get("name", "")
-                
+                resolved = self._resolved(resolutions, city, props, old_coords)
+                if resolved is not None:
+                    query, _, _ = self._geocode_query_fields(props)
+                    self._apply_geocode_metadata(props, resolved, query)
+                    props["geocode_reused"] = "session"
+                    feat["geometry"]["coordinates"] = list(resolved["coordinates"])
+                    coord_map.setdefault(old_coords, list(resolved["coordinates"]))
+                    valid_points.append(feat)
+                    reused += 1
+                    continue
                 # 避免对同一原始坐标重复请求 API
                 if old_coords not in coord_map:
                     location_str = f"{old_coords[0]},{old_coords[1]}"
                     query, search_name_en, provider_hint = self._geocode_query_fields(props)
-                    geocode_result = self.amap_service.geocode_poi(
-                        query,
-                        city=city,
-                        location=location_str,
-                        search_name_en=search_name_en,
-                        provider_hint=provider_hint,
-                    )
+                    geocode_result = self._geocode(prefetch, query, city, location_str, search_name_en, provider_hint)
+                    geocoded += 1
                     geocoded_coords = geocode_result.get("coordinates") if geocode_result else None
-                    if geocoded_coords and (not bounds or self._within_bounds(geocoded_coords, bounds)):
+                    if self._accept_geocode(geocoded_coords, bounds):
                         new_coords = geocoded_coords
                         self._apply_geocode_metadata(props, geocode_result, query)
                     elif bounds and self._within_bounds(old_coords, bounds):
@@ -318,6 +551,9 @@ class GeoJSONGenerationNode:
                     feat["geometry"]["coordinates"] = coord_map[old_coords]
                     valid_points.append(feat)
 
+        if reused:
+            print(f"   ♻️ 复用会话内已解析坐标 {reused} 个，新检索 {geocoded} 个")
+
         # 2. 同步更新 LineString
         valid_lines = []
         for feat in features:
@@ -559,37 +795,15 @@ class GeoJSONGenerationNode:
         return False
 
     def _distance_meters(self, coord_a, coord_b) -> float:
-        try:
-            lon1, lat1 = float(coord_a[0]), float(coord_a[1])
-            lon2, lat2 = float(coord_b[0]), float(coord_b[1])
-        except (TypeError, ValueError, IndexError):
-            return float("inf")
-        radius = 6371000
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        d_phi = math.radians(lat2 - lat1)
-        d_lambda = math.radians(lon2 - lon1)
-        a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
-        return 2 * radius * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    def _is_duplicate_poi(self, candidate: dict, kept: list[dict]) -> bool:
+        return distance_meters(coord_a, coord_b)
+
+    def _is_duplicate_poi(self, candidate: dict, kept: PoiIndex) -> bool:
+        """Same/overlapping normalized name on any day, or within 20 m on the same day."""
         candidate_props = candidate.get("properties") or {}
-        candidate_name = self._normalize_poi_name(candidate_props.get("name"))
-        candidate_day = candidate_props.get("day")
+        if kept.name_overlaps(self._normalize_poi_name(candidate_props.get("name"))):
+            return True
         candidate_coord = candidate.get("geometry", {}).get("coordinates")
-        for existing in kept:
-            existing_props = existing.get("properties") or {}
-            existing_name = self._normalize_poi_name(existing_props.get("name"))
-            if candidate_name and existing_name:
-                if candidate_name == existing_name:
-                    return True
-                if min(len(candidate_name), len(existing_name)) >= 2 and (
-                    candidate_name in existing_name or existing_name in candidate_name
-                ):
-                    return True
-            dist = self._distance_meters(candidate_coord, existing.get("geometry", {}).get("coordinates"))
-            if candidate_day == existing_props.get("day") and dist < 20:
-                return True
-        return False
+        return bool(kept.within(candidate_coord, DUPLICATE_POI_RADIUS_METERS, group=candidate_props.get("day")))
 
     def _normalize_category(self, props: dict, fallback: str = "poi") -> str:
         raw = props.get("category") or props.get("poi_category") or props.get("type") or props.get("visual_id") or fallback
@@ -733,10 +947,17 @@ class GeoJSONGenerationNode:
         ))
 
         deduped = []
+        kept_index = PoiIndex(cell_meters=DUPLICATE_POI_RADIUS_METERS)
         for feature in candidates:
-            if self._is_duplicate_poi(feature, deduped):
+            if self._is_duplicate_poi(feature, kept_index):
                 continue
             deduped.append(feature)
+            props = feature.get("properties") or {}
+            kept_index.add(
+                feature.get("geometry", {}).get("coordinates"),
+                group=props.get("day"),
+                name=self._normalize_poi_name(props.get("name")),
+            )
 
         points_by_day: dict[int, list[dict]] = {}
         for feature in deduped:
@@ -840,7 +1061,55 @@ class GeoJSONGenerationNode:
         geojson_data["_visual_content_mapping"] = list(visual_mapping.values())
         return geojson_data
 
-    def execute(self, state: AgentState, max_retries: int = 3) -> AgentState:
+    def _feature_ready_payload(self, index: int, feature: dict, geocode_result: dict | None, city, attempt: int) -> dict:
+        """Provisional feature for progressive drawing; the final GeoJSON still arrives with node_completed."""
+        geometry = dict(feature.get("geometry") or {})
+        geocoded_coords = geocode_result.get("coordinates") if geocode_result else None
+        accepted = geometry.get("type") == "Point" and self._accept_geocode(geocoded_coords, self._city_bounds(str(city or "")))
+        if accepted:
+            geometry["coordinates"] = list(geocoded_coords)
+        return {
+            "index": index,
+            "attempt": attempt,
+            "feature": {**feature, "geometry": geometry},
+            "geocode": {
+                "provider": geocode_result.get("provider"),
+                "source": geocode_result.get("source"),
+                "coordinate_system": geocode_result.get("coordinate_system"),
+            } if accepted else None,
+        }
+
+    def _stream_completion(self, messages, on_item: Callable[[int, Any, dict], None]) -> AIMessage:
+        """Stream the completion and hand every finished ``features`` item to ``on_item`` as it closes."""
+        stream = FeatureStream("p" if self.output_schema == "compact" else "features")
+        parts = []
+        usage = None
+        response_metadata: dict = {}
+        start = time.perf_counter()
+        first_feature_ms = None
+        with span("geojson.stream") as stream_span:
+            for chunk in self.llm.stream(messages):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                parts.append(text)
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                response_metadata.update(getattr(chunk, "response_metadata", None) or {})
+                for item in stream.feed(text):
+                    if first_feature_ms is None:
+                        first_feature_ms = round((time.perf_counter() - start) * 1000, 1)
+                    on_item(stream.count - 1, item, stream.root)
+            stream_span.set(features=stream.count, first_feature_ms=first_feature_ms)
+        if stream.count:
+            print(f"   ⚡ [Node 3] 流式解析 {stream.count} 个 Feature，首个 Feature 于 {first_feature_ms} ms 就绪")
+        return AIMessage(content="".join(parts), usage_metadata=usage, response_metadata=response_metadata)
+
+    def execute(
+        self,
+        state: AgentState,
+        max_retries: int = 3,
+        on_feature: Optional[Callable[[dict], None]] = None,
+    ) -> AgentState:
+        """Generate GeoJSON; with streaming on, ``on_feature`` receives a
+        ``feature_ready`` payload per feature while the completion streams."""
         print("📍 [Node 3] 数据结构化与拓扑映射: 正在生成 GeoJSON 数据...")
         
         if not state.intent_enriched:
@@ -849,29 +1118,64 @@ class GeoJSONGenerationNode:
             return state
         
         retry_count = 0
+        patched = None
+        if state.validation_feedback:
+            self._invalidate_resolutions(state.poi_resolutions, state.geojson_data, state.validation_feedback)
+        if self.retry_mode == "patch" and state.validation_feedback and state.geojson_data:
+            patched = self._repair_with_patch(state)
         
         while retry_count < max_retries:
+            prefetch = None
             try:
                 import json
 
-                # 如果有上轮验证反馈，将其拼入 prompt 中
-                if state.validation_feedback and state.geojson_data:
-                    prev_result_str = json.dumps(state.geojson_data, ensure_ascii=False)[:2000]
-                    feedback_section = (
-                        f"【上次生成的结果（存在问题，请修正后重新生成）】:\n{prev_result_str}\n\n"
-                        f"【QA 反馈意见（必须修正以下所有问题）】:\n{state.validation_feedback}\n\n"
-                    )
+                # QA retries reuse the session's resolved coordinates and only
+                # geocode new POIs; known-POI backfill and out-of-bounds
+                # relocation stay first-pass only so QA removals stick.
+                allow_external_geocode = state.validation_retry_count == 0
+                if patched is not None:
+                    geojson_data, patched = patched, None
                 else:
-                    feedback_section = ""
+                    # 如果有上轮验证反馈，将其拼入 prompt 中
+                    if state.validation_feedback and state.geojson_data:
+                        prev_result_str = json.dumps(self._patch_target(state.geojson_data), ensure_ascii=False)
+                        feedback_section = (
+                            f"【上次生成的结果（存在问题，请修正后重新生成）】:\n{prev_result_str}\n\n"
+                            f"【QA 反馈意见（必须修正以下所有问题）】:\n{state.validation_feedback}\n\n"
+                        )
+                    else:
+                        feedback_section = ""
 
-                response = self.chain.invoke({
-                    "intent_enriched": state.intent_enriched,
-                    "feedback_section": feedback_section
-                })
-                content = response.content
+                    messages = self.prompt.format_messages(
+                        intent_enriched=state.intent_enriched,
+                        feedback_section=feedback_section,
+                    )
+                    with llm_call(
+                        self.PROMPT_NAME,
+                        self.llm,
+                        attempt=retry_count,
+                        validation_round=state.validation_retry_count,
+                        schema=self.output_schema,
+                        mode="regenerate" if state.validation_feedback else "generate",
+                    ) as call:
+                        if self.streaming:
+                            prefetch = self._prefetcher(on_feature, retry_count)
+                            response = self._stream_completion(
+                                messages,
+                                partial(
+                                    self._on_streamed_feature,
+                                    prefetch=prefetch,
+                                    on_feature=on_feature,
+                                    attempt=retry_count,
+                                    resolutions=state.poi_resolutions,
+                                ),
+                            )
+                        else:
+                            response = self.llm.invoke(messages)
+                        call.record(response, messages)
+                    content = response.content
                 
-                json_str = _extract_first_json_object(content)
-                geojson_data = _robust_json_loads(json_str)
+                    geojson_data = expand_compact(_robust_json_loads(content))
                 if not geojson_data.get("global_properties"):
                     geojson_data["global_properties"] = [
                         {
@@ -881,20 +1185,24 @@ class GeoJSONGenerationNode:
                             "extra_info": "",
                         }
                 ]
-                allow_external_geocode = state.validation_retry_count == 0
-                geojson_data = self._correct_and_sync_topology(geojson_data, allow_external_geocode=allow_external_geocode)
-                if allow_external_geocode:
-                    geojson_data = self._ensure_requested_known_pois(geojson_data, state.user_text)
-                geojson_data = self._normalize_travel_semantics(geojson_data)
-                geojson_data = self._enforce_city_bounds(geojson_data, allow_external_geocode=allow_external_geocode)
-                geojson_data = self._annotate_feature_metadata(geojson_data)
-
-                schema_report = validate_geojson(geojson_data)
+                with span("geojson.topology_sync", validation_round=state.validation_retry_count):
+                    geojson_data = self._correct_and_sync_topology(
+                        geojson_data, prefetch=prefetch, resolutions=state.poi_resolutions
+                    )
+                    if allow_external_geocode:
+                        geojson_data = self._ensure_requested_known_pois(geojson_data, state.user_text)
+                with span("geojson.normalize"):
+                    geojson_data = self._normalize_travel_semantics(geojson_data)
+                    geojson_data = self._enforce_city_bounds(geojson_data, allow_external_geocode=allow_external_geocode)
+                    geojson_data = self._annotate_feature_metadata(geojson_data)
+
+                schema_report = validate_geojson(geojson_data, verdict_only=True)
                 if schema_report["valid"]:
                     print("✅ [Node 3] GeoJSON schema 校验通过")
                 else:
                     print(f"⚠️ [Node 3] GeoJSON schema 校验失败: {schema_report['errors']}")
                 
+                self._remember_resolutions(state.poi_resolutions, geojson_data)
                 state.geojson_data = geojson_data
                 print(f"✅ [Node 3] GeoJSON 生成与拓扑修正完成，共 {len(geojson_data['features'])} 个 Feature")
                 return state
@@ -909,5 +1217,121 @@ class GeoJSONGenerationNode:
                     print(f"❌ [Node 3] 重试次数用尽: {e}")
                 else:
                     time.sleep(1)
+            finally:
+                if prefetch is not None:
+                    prefetch.close()
         
         return state
+
+    def _patch_target(self, geojson_data: dict) -> dict:
+        """The previous result as the model sees it: the compact view, or the
+        full GeoJSON without the properties Node 3 derives itself."""
+        if self.output_schema == "compact":
+            return compact_from_geojson(geojson_data)
+        target = {key: value for key, value in geojson_data.items() if key != "features"}
+        target["features"] = [
+            {
+                **feature,
+                "properties": {
+                    key: value for key, value in (feature.get("properties") or {}).items()
+                    if key not in SERVER_DERIVED_PROPERTIES
+                },
+            }
+            for feature in geojson_data.get("features", [])
+        ]
+        return target
+
+    def _check_patched(self, patched: Any) -> dict:
+        """Expand and sanity-check a patched document; raises ``ValueError`` when it is unusable."""
+        if self.output_schema == "compact":
+            if not is_compact(patched):
+                raise ValueError("patch 结果不是紧凑 POI 清单")
+            if any(not isinstance(item, dict) or expand_point(item) is None for item in patched["p"]):
+                raise ValueError("patch 结果中存在缺少坐标的 POI")
+            return expand_compact(patched)
+        report = validate_geojson(patched, verdict_only=True) if isinstance(patched, dict) else {"valid": False, "errors": ["不是 JSON 对象"]}
+        if not report["valid"]:
+            raise ValueError(f"patch 结果 schema 校验失败: {report['errors']}")
+        return patched
+
+    def _repair_with_patch(self, state: AgentState) -> Optional[dict]:
+        """Fix the previous result with an RFC 6902 patch from the model;
+        ``None`` means the patch was unusable and the caller regenerates."""
+        import json
+
+        print("🩹 [Node 3] QA 修复模式：请求 JSON Patch...")
+        target = self._patch_target(state.geojson_data)
+        messages = self.patch_prompt.format_messages(
+            intent_enriched=state.intent_enriched,
+            previous_result=json.dumps(target, ensure_ascii=False),
+            feedback=state.validation_feedback,
+        )
+        start = time.perf_counter()
+        try:
+            with llm_call(
+                self.PROMPT_NAME,
+                self.llm,
+                attempt=0,
+                validation_round=state.validation_retry_count,
+                schema=self.output_schema,
+                mode="patch",
+            ) as call:
+                response = self.llm.invoke(messages)
+                call.record(response, messages)
+            operations = (_robust_json_loads(response.content) or {}).get("patch")
+            if not isinstance(operations, list) or not operations:
+                raise ValueError("模型未返回 patch 操作")
+            with span("geojson.patch", operations=len(operations)):
+                patched = self._check_patched(jsonpatch.apply_patch(target, operations))
+            if not patched.get("_mapping_thought"):
+                patched["_mapping_thought"] = state.geojson_data.get("_mapping_thought", "")
+        except Exception as exc:
+            print(f"⚠️ [Node 3] JSON Patch 修复失败，回退为整体重新生成: {exc}")
+            return None
+        output_tokens = (getattr(response, "usage_metadata", None) or {}).get("output_tokens")
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        print(f"🩹 [Node 3] JSON Patch 已应用：{len(operations)} 个操作，输出 {output_tokens} token，耗时 {elapsed_ms} ms")
+        return patched
+
+    def _prefetcher(self, on_feature: Optional[Callable[[dict], None]], attempt: int) -> _GeocodePrefetch:
+        def on_result(index: int, feature: dict, result: dict | None, city) -> None:
+            if on_feature is not None:
+                on_feature(self._feature_ready_payload(index, feature, result, city, attempt))
+
+        return _GeocodePrefetch(self, self.geocode_workers, on_result)
+
+    def _on_streamed_feature(
+        self,
+        index: int,
+        feature: Any,
+        root: dict,
+        prefetch: Optional[_GeocodePrefetch],
+        on_feature: Optional[Callable[[dict], None]],
+        attempt: int,
+        resolutions: Optional[dict] = None,
+    ) -> None:
+        """Start geocoding a streamed Point (the city must already be known);
+        Points already in the session resolution table and other features are
+        reported straight away. Compact items are expanded first and skipped
+        when they have no usable coordinates."""
+        if not isinstance(feature, dict):
+            return
+        if self.output_schema == "compact":
+            feature = expand_point(feature, root.get("geo"))
+            if feature is None:
+                return
+        city = root.get("city" if self.output_schema == "compact" else "_city")
+        is_point = (feature.get("geometry") or {}).get("type") == "Point"
+        resolved = (
+            self._resolved(resolutions, city, feature.get("properties") or {}, feature["geometry"].get("coordinates"))
+            if is_point and city
+            else None
+        )
+        if resolved is not None:
+            if on_feature is not None:
+                on_feature(self._feature_ready_payload(index, feature, resolved, city, attempt))
+            return
+        if is_point and prefetch is not None and city is not None and prefetch.submit(index, feature, city):
+            return  # feature_ready is sent once its geocode lands
+        if on_feature is not None:
+            on_feature(self._feature_ready_payload(index, feature, None, city, attempt))
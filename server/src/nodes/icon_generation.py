@@ -9,6 +9,9 @@ import requests
 from PIL import Image
 
 from ..utils.agent_utils import AgentState
+from ..utils.fingerprints import fingerprint
+from ..utils.metrics import ICONS
+from ..utils.tracing import span
 
 
 class IconGenerationNode:
@@ -59,6 +62,31 @@ class IconGenerationNode:
             f"Preferred accent color: {color or 'match the style description'}."
         )
 
+    def icon_fingerprint(self, prompt: str) -> str:
+        """Fingerprint of everything that determines a generated icon."""
+        return fingerprint(
+            {
+                "prompt": prompt,
+                "model": self.model,
+                "size": self.size,
+                "quality": self.quality,
+                "output_format": self.output_format,
+                "transparent_postprocess": self.transparent_postprocess,
+                "version": self.PROMPT_VERSION,
+            }
+        )
+
+    def _reuse_previous_icon(self, point_style: dict, previous: dict | None, icon_fp: str, icon_dir: Path) -> bool:
+        if not isinstance(previous, dict) or previous.get("icon_fingerprint") != icon_fp:
+            return False
+        icon_path = previous.get("icon_path")
+        if not icon_path or previous.get("icon_error") or not (icon_dir.parent / icon_path).is_file():
+            return False
+        for key in ("url", "icon_path", "icon_model", "icon_fingerprint"):
+            if key in previous:
+                point_style[key] = previous[key]
+        return True
+
     def _client(self):
         from openai import OpenAI
 
@@ -201,7 +229,8 @@ class IconGenerationNode:
             image.save(output_path, "PNG")
         return changed
 
-    def execute(self, state: AgentState, session_dir: str) -> AgentState:
+    def execute(self, state: AgentState, session_dir: str, previous_style_code: dict | None = None) -> AgentState:
+        """Generate Point icons; icons whose inputs match ``previous_style_code`` are reused."""
         print("🖼️ [Node 6] Icon generation: 正在根据 Point.icon描述 生成 POI 图标...")
 
         if not state.style_code:
@@ -217,6 +246,7 @@ class IconGenerationNode:
             "transparent_background": True,
             "transparency_postprocess": self.transparent_postprocess,
             "generated_count": 0,
+            "reused_count": 0,
             "errors": [],
         }
         state.style_code["_icon_generation"] = icon_meta
@@ -228,6 +258,29 @@ class IconGenerationNode:
         icon_dir = Path(session_dir) / "icon"
         icon_dir.mkdir(parents=True, exist_ok=True)
 
+        previous_points = {}
+        if isinstance(previous_style_code, dict):
+            for item in previous_style_code.get("Point") or []:
+                if isinstance(item, dict) and item.get("visual_id"):
+                    previous_points[item["visual_id"]] = item
+
+        pending = []
+        for index, point_style in enumerate(point_styles, start=1):
+            if not isinstance(point_style, dict):
+                continue
+            visual_id = point_style.get("visual_id") or f"point_{index}"
+            prompt = point_style.get("iconPrompt") or self._build_prompt(point_style)
+            icon_fp = self.icon_fingerprint(prompt)
+            if self._reuse_previous_icon(point_style, previous_points.get(visual_id), icon_fp, icon_dir):
+                icon_meta["reused_count"] += 1
+                ICONS.inc(outcome="reused")
+                print(f"   ♻️ {visual_id} 输入未变化，复用已有图标")
+                continue
+            pending.append((index, point_style, visual_id, prompt, icon_fp))
+
+        if not pending:
+            return state
+
         if not self._enabled():
             print("ℹ️ [Node 6] Icon generation disabled by ENABLE_ICON_IMAGE_GENERATION")
             return state
@@ -241,32 +294,36 @@ class IconGenerationNode:
             client = self._client()
         except Exception as exc:
             icon_meta["errors"].append(f"OpenAI image client unavailable: {exc}")
+            ICONS.inc(len(pending), outcome="failed")
             print(f"⚠️ [Node 6] OpenAI image client unavailable: {exc}")
             return state
 
-        for index, point_style in enumerate(point_styles, start=1):
-            if not isinstance(point_style, dict):
-                continue
-            visual_id = point_style.get("visual_id") or f"point_{index}"
+        for index, point_style, visual_id, prompt, icon_fp in pending:
             filename = f"{self._slug(visual_id, f'point_{index}')}.png"
             output_path = icon_dir / filename
-            prompt = point_style.get("iconPrompt") or self._build_prompt(point_style)
 
             try:
-                response = self._generate_image(client, prompt)
-                if not self._write_image_from_response(response, output_path):
-                    raise RuntimeError("image response did not include b64_json or downloadable url")
+                with span("image.generate", visual_id=visual_id, model=self.model):
+                    response = self._generate_image(client, prompt)
+                with span("artifact.write", file=f"icon/{filename}"):
+                    if not self._write_image_from_response(response, output_path):
+                        raise RuntimeError("image response did not include b64_json or downloadable url")
                 if self.transparent_postprocess:
-                    self._postprocess_transparency(output_path)
+                    with span("image.postprocess", visual_id=visual_id):
+                        self._postprocess_transparency(output_path)
                 point_style["url"] = f"/api/multimodal/session/{state.session_id}/icon/{filename}"
                 point_style["icon_path"] = f"icon/{filename}"
                 point_style["icon_model"] = self.model
+                point_style["icon_fingerprint"] = icon_fp
+                point_style.pop("icon_error", None)
                 icon_meta["generated_count"] += 1
+                ICONS.inc(outcome="generated")
                 print(f"   ✅ {visual_id} -> {output_path.name}")
             except Exception as exc:
                 message = f"{visual_id}: {exc}"
                 point_style["icon_error"] = str(exc)
                 icon_meta["errors"].append(message)
+                ICONS.inc(outcome="failed")
                 print(f"⚠️ [Node 6] 图标生成失败 {message}")
 
         return state
@@ -2,6 +2,7 @@ from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from ..utils.agent_utils import AgentState
 from ..utils.prompt_loader import load_prompt
+from ..utils.metrics import llm_call
 
 
 class IntentEnrichmentNode:
@@ -24,13 +25,14 @@ class IntentEnrichmentNode:
             ("system", system_prompt),
             ("human", "{user_text}")
         ])
-        
-        self.chain = self.prompt | self.llm
     
     def execute(self, state: AgentState) -> AgentState:
         print("🧠 [Node 1] 意图丰富: 正在进行意图分析与行程规划...")
         try:
-            response = self.chain.invoke({"user_text": state.user_text})
+            messages = self.prompt.format_messages(user_text=state.user_text)
+            with llm_call(self.PROMPT_NAME, self.llm) as call:
+                response = self.llm.invoke(messages)
+                call.record(response, messages)
             content = response.content
             
             # 解析输出，提取行程信息
@@ -5,7 +5,9 @@ from typing import Any
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from ..utils.agent_utils import AgentState, _extract_first_json_object, _robust_json_loads
+from ..utils.image_preprocess import image_data_url
 from ..utils.prompt_loader import load_prompt
+from ..utils.metrics import llm_call
 from ..validators.schema_validators import validate_style_spec
 
 
@@ -486,16 +488,19 @@ class StyleCodeGenerationNode:
                 ),
             ]
 
-            if state.image_base64:
+            image_url = image_data_url(state)
+            if image_url:
                 messages[1].content.insert(
                     0,
                     {
                         "type": "image_url",
-                        "image_url": {"url": state.image_base64},
+                        "image_url": {"url": image_url},
                     },
                 )
 
-            response = self.llm.invoke(messages)
+            with llm_call(self.PROMPT_NAME, self.llm) as call:
+                response = self.llm.invoke(messages)
+                call.record(response, messages)
             json_str = _extract_first_json_object(response.content)
             if not json_str:
                 raise ValueError("无法解析 Style Code JSON")
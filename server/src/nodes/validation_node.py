@@ -1,13 +1,62 @@
 import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from ..utils.agent_utils import AgentState, _extract_first_json_object, _robust_json_loads
+from ..utils.agent_utils import AgentState, _robust_json_loads
 from ..utils.prompt_loader import load_prompt
+from ..utils.fingerprints import fingerprint
+from ..utils.metrics import VALIDATION_VERDICTS, llm_call
+from ..utils.poi_index import PoiIndex
+from ..validators.schema_validators import validate_geojson
 from ..amap_service import CHINA_CITY_MARKERS, FOREIGN_CITY_MARKERS
+from .geojson_generation import UNRESOLVED_GEOCODE_PROVIDERS
 import copy
-import math
 import re
 
+# Same-day POIs closer than this are checked for redundant stops.
+DENSE_POI_RADIUS_METERS = 750
+
+# Above this share of changed features a retry round is reviewed in full.
+INCREMENTAL_MAX_CHANGED_SHARE = 0.5
+
+
+class VerdictCache:
+    """Process-wide LRU of LLM QA verdicts keyed by the canonical hash of the
+    QA input (prompt version, model, user request, deterministic report and
+    compressed GeoJSON), so byte-identical GeoJSON is never sent to QA twice."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._verdicts: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+            return dict(verdict) if verdict is not None else None
+
+    def put(self, key: str, verdict: dict) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._verdicts[key] = dict(verdict)
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.capacity:
+                self._verdicts.popitem(last=False)
+
+
+try:
+    _VERDICT_CACHE_SIZE = max(0, int(os.getenv("VALIDATION_VERDICT_CACHE_SIZE", "256")))
+except ValueError:
+    _VERDICT_CACHE_SIZE = 256
+verdict_cache = VerdictCache(_VERDICT_CACHE_SIZE)
+
+
 class ValidationNode:
     """Node 5: GeoJSON 质量验证节点 (Critic Node)
 
@@ -16,10 +65,22 @@ class ValidationNode:
     """
 
     PROMPT_NAME = "validation"
-    PROMPT_VERSION = "v0.3"
+    PROMPT_VERSION = "v0.4"
+
+    @staticmethod
+    def configured_mode() -> str:
+        # llm: every clean GeoJSON goes to the QA LLM; deterministic_first:
+        # a clean deterministic report with enough geocoded Points passes as is.
+        return "deterministic_first" if os.getenv("VALIDATION_MODE", "llm").strip().lower() == "deterministic_first" else "llm"
 
     def __init__(self, llm: ChatOpenAI):
         self.llm = llm
+        self.mode = self.configured_mode()
+        try:
+            self.skip_confidence = float(os.getenv("VALIDATION_SKIP_CONFIDENCE", "0.9"))
+        except ValueError:
+            self.skip_confidence = 0.9
+        self.incremental = os.getenv("VALIDATION_INCREMENTAL", "true").strip().lower() in {"1", "true", "yes", "on"}
 
         system_prompt = load_prompt("validation.md")
 
@@ -37,8 +98,27 @@ class ValidationNode:
 
 请给出你的 QA 验证 JSON 结果：""")
         ])
+        # QA retry rounds: only what changed since the last reviewed round.
+        self.delta_prompt = ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            ("human", """请审核以下数据：
 
-        self.chain = self.prompt | self.llm
+【原始用户请求】：{user_query}
+
+【程序化结构校验结果】：
+{deterministic_report}
+
+【上一轮 QA 结论】：
+{previous_verdict}
+
+【本轮行程概览（_city 与每天按 order 排列的全部 POI）】：
+{itinerary}
+
+【Node 3 本轮相对上一轮的变更（added 新增、changed 修改、removed 删除；未列出的 Feature 与上一轮完全相同，global_properties 仅在变化时给出；坐标已为 QA 校验做过骨架精简）】：
+{geojson_delta}
+
+请结合上一轮 QA 结论，审核本轮整体结果是否合格，给出你的 QA 验证 JSON 结果：""")
+        ])
 
     def _compress_geojson_for_qa(self, geojson_data: dict) -> dict:
         """脱水压缩 GeoJSON：裁剪 LineString 的超长坐标，避免 Token 溢出"""
@@ -80,24 +160,6 @@ class ValidationNode:
     def _normalize_name(self, value: str) -> str:
         return re.sub(r"[\s·•\-_/()（）【】\[\]，,。.:：;；'\"“”]", "", str(value or "").lower())
 
-    def _distance_meters(self, coord_a, coord_b) -> float:
-        try:
-            lon1, lat1 = float(coord_a[0]), float(coord_a[1])
-            lon2, lat2 = float(coord_b[0]), float(coord_b[1])
-        except (TypeError, ValueError, IndexError):
-            return float("inf")
-        radius = 6371000
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        d_phi = math.radians(lat2 - lat1)
-        d_lambda = math.radians(lon2 - lon1)
-        a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
-        return 2 * radius * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    def _mentioned_by_user(self, name: str, user_text: str) -> bool:
-        normalized_name = self._normalize_name(name)
-        normalized_user = self._normalize_name(user_text)
-        return bool(normalized_name and normalized_name in normalized_user)
-
     def _macro_area(self, name: str) -> str:
         normalized = self._normalize_name(name)
         for area in ["滨海湾", "圣淘沙", "小印度", "唐人街", "克拉码头"]:
@@ -234,31 +296,36 @@ class ValidationNode:
                 ):
                     issues.append("圣淘沙是区域/岛屿，不应在已有环球影城、S.E.A.海洋馆、西乐索海滩等具体 POI 时作为单独 Point。")
 
+        # Same-day pairs closer than 750 m come from the grid index instead of
+        # a pairwise scan; per-POI name facts are computed once.
+        normalized_user = self._normalize_name(user_text)
+        point_facts = []
+        density_index = PoiIndex(cell_meters=DENSE_POI_RADIUS_METERS)
+        for feature in points:
+            props = feature.get("properties") or {}
+            name = props.get("name", "")
+            normalized = self._normalize_name(name)
+            point_facts.append((name, normalized, self._macro_area(name), bool(normalized and normalized in normalized_user)))
+            density_index.add(feature.get("geometry", {}).get("coordinates"), group=props.get("day"))
+
         for index, first in enumerate(points):
-            first_props = first.get("properties") or {}
-            first_name = first_props.get("name", "")
-            first_day = first_props.get("day")
-            first_area = self._macro_area(first_name)
-            for second in points[index + 1:]:
-                second_props = second.get("properties") or {}
-                second_name = second_props.get("name", "")
-                if first_day != second_props.get("day"):
+            first_name, first_normalized, first_area, first_requested = point_facts[index]
+            neighbours = density_index.within(
+                first.get("geometry", {}).get("coordinates"),
+                DENSE_POI_RADIUS_METERS,
+                group=(first.get("properties") or {}).get("day"),
+            )
+            for second_index, dist in neighbours:
+                if second_index <= index:
                     continue
-                dist = self._distance_meters(
-                    first.get("geometry", {}).get("coordinates"),
-                    second.get("geometry", {}).get("coordinates"),
-                )
-                second_area = self._macro_area(second_name)
+                second_name, second_normalized, second_area, second_requested = point_facts[second_index]
                 same_area = first_area and first_area == second_area
-                contains = (
-                    self._normalize_name(first_name) in self._normalize_name(second_name)
-                    or self._normalize_name(second_name) in self._normalize_name(first_name)
-                )
-                both_requested = self._mentioned_by_user(first_name, user_text) and self._mentioned_by_user(second_name, user_text)
-                if not both_requested and dist < 750 and (same_area or contains):
+                contains = first_normalized in second_normalized or second_normalized in first_normalized
+                both_requested = first_requested and second_requested
+                if not both_requested and (same_area or contains):
                     requested_names = [
-                        name for name in [first_name, second_name]
-                        if self._mentioned_by_user(name, user_text)
+                        name for name, requested in [(first_name, first_requested), (second_name, second_requested)]
+                        if requested
                     ]
                     action = (
                         f"优先保留用户明确点名的 {requested_names[0]}，删除另一个未点名 POI。"
@@ -275,6 +342,138 @@ class ValidationNode:
         data = state.geojson_data if isinstance(state.geojson_data, dict) else {}
         return self._semantic_geojson_issues(state) + self._route_consistency_issues(data)
 
+    def score_candidate(self, state: AgentState) -> dict:
+        """Deterministic quality of a Node 3 candidate (fewer issues is better);
+        ``score`` is ``None`` when the candidate produced no GeoJSON."""
+        data = state.geojson_data if isinstance(state.geojson_data, dict) else None
+        if state.error or not data:
+            return {"score": None, "issues": None, "schema_errors": None, "feature_count": 0, "error": state.error}
+        issues = self._deterministic_geojson_issues(state)
+        schema_errors = validate_geojson(data, verdict_only=True)["errors"]
+        return {
+            "score": len(issues) + len(schema_errors),
+            "issues": len(issues),
+            "schema_errors": len(schema_errors),
+            "feature_count": len(data.get("features", [])),
+            "error": None,
+        }
+
+    def _feature_keys(self, features: list) -> list[str]:
+        """Stable identity for diffing rounds: Points by normalized name, routes by day."""
+        keys, seen = [], {}
+        for feature in features:
+            props = feature.get("properties") or {}
+            geom_type = (feature.get("geometry") or {}).get("type")
+            if geom_type == "Point":
+                key = f"poi:{self._normalize_name(props.get('name'))}"
+            elif geom_type == "LineString":
+                key = f"route:{props.get('day') or ''}"
+            else:
+                key = f"feature:{geom_type}"
+            seen[key] = seen.get(key, 0) + 1
+            keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+        return keys
+
+    def _feature_fingerprint(self, feature: dict) -> str:
+        # feature_id is positional (it shifts when an earlier feature is removed)
+        # and geocode_reused only says the coordinates came from an earlier round.
+        props = {k: v for k, v in (feature.get("properties") or {}).items() if k not in ("feature_id", "geocode_reused")}
+        return fingerprint({"geometry": feature.get("geometry"), "properties": props})
+
+    def _qa_snapshot(self, compressed_geojson: dict, verdict: dict) -> dict:
+        features = compressed_geojson.get("features", [])
+        return {
+            "city": compressed_geojson.get("_city"),
+            "global": fingerprint(compressed_geojson.get("global_properties")),
+            "features": {
+                key: [self._feature_fingerprint(feature), str((feature.get("properties") or {}).get("day") or "")]
+                for key, feature in zip(self._feature_keys(features), features)
+            },
+            "verdict": {"is_valid": bool(verdict.get("is_valid")), "feedback": verdict.get("feedback") or ""},
+        }
+
+    def _qa_delta(self, baseline: Optional[dict], compressed_geojson: dict) -> Optional[dict]:
+        """Changes since the last reviewed round, or ``None`` when the round must be checked in full."""
+        if not baseline or not isinstance(compressed_geojson, dict) or compressed_geojson.get("_city") != baseline.get("city"):
+            return None
+        features = compressed_geojson.get("features", [])
+        previous = baseline.get("features") or {}
+        added, changed, days = [], [], set()
+        current_keys = self._feature_keys(features)
+        for key, feature in zip(current_keys, features):
+            day = str((feature.get("properties") or {}).get("day") or "")
+            fingerprint_day = previous.get(key)
+            if fingerprint_day is None:
+                added.append(feature)
+                days.add(day)
+            elif fingerprint_day[0] != self._feature_fingerprint(feature):
+                changed.append(feature)
+                days.update((day, fingerprint_day[1]))
+        current = set(current_keys)
+        removed = [key for key in previous if key not in current]
+        days.update(previous[key][1] for key in removed)
+        global_changed = fingerprint(compressed_geojson.get("global_properties")) != baseline.get("global")
+        return {
+            "days": days,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+            "global_changed": global_changed,
+            "changed_count": len(added) + len(changed) + len(removed),
+        }
+
+    def _scoped_state(self, state: AgentState, days: set) -> AgentState:
+        """``state`` with only the features of ``days``; every deterministic check is per day, so
+        unchanged days keep the clean result they had when the baseline was reviewed."""
+        data = state.geojson_data
+        features = [f for f in data.get("features", []) if str((f.get("properties") or {}).get("day") or "") in days]
+        return state.model_copy(update={"geojson_data": {**data, "features": features}})
+
+    def _itinerary(self, geojson_data: dict) -> dict:
+        days: dict[str, list] = {}
+        points = [f for f in geojson_data.get("features", []) if (f.get("geometry") or {}).get("type") == "Point"]
+        for feature in sorted(points, key=lambda f: int((f.get("properties") or {}).get("order") or 999)):
+            props = feature.get("properties") or {}
+            days.setdefault(str(props.get("day") or ""), []).append(props.get("name", ""))
+        return {"_city": geojson_data.get("_city"), "days": dict(sorted(days.items()))}
+
+    def _delta_messages(self, state: AgentState, deterministic_report: str, compressed_geojson: dict, delta: dict):
+        payload = {"added": delta["added"], "changed": delta["changed"], "removed": delta["removed"]}
+        if delta["global_changed"]:
+            payload["global_properties"] = compressed_geojson.get("global_properties")
+        verdict = state.qa_baseline["verdict"]
+        previous_verdict = "通过" if verdict["is_valid"] else f"未通过：{verdict['feedback']}"
+        return self.delta_prompt.format_messages(
+            user_query=state.user_text,
+            deterministic_report=deterministic_report,
+            previous_verdict=previous_verdict,
+            itinerary=json.dumps(self._itinerary(compressed_geojson), ensure_ascii=False),
+            geojson_delta=json.dumps(payload, ensure_ascii=False),
+        )
+
+    def _deterministic_confidence(self, state: AgentState) -> float:
+        """Share of Points whose coordinates came from a geocoder rather than the model."""
+        data = state.geojson_data if isinstance(state.geojson_data, dict) else {}
+        points = [f for f in data.get("features", []) if f.get("geometry", {}).get("type") == "Point"]
+        if not points:
+            return 0.0
+        resolved = sum(
+            1 for f in points
+            if (f.get("properties") or {}).get("geocode_provider") not in UNRESOLVED_GEOCODE_PROVIDERS
+        )
+        return resolved / len(points)
+
+    def _verdict_key(self, user_query: str, deterministic_report: str, geojson_data) -> str:
+        return fingerprint(
+            {
+                "prompt": self.PROMPT_VERSION,
+                "model": getattr(self.llm, "model_name", None),
+                "user_query": user_query,
+                "deterministic_report": deterministic_report,
+                "geojson": geojson_data,
+            }
+        )
+
     def _deterministic_report(self, state: AgentState) -> str:
         data = state.geojson_data if isinstance(state.geojson_data, dict) else {}
         route_issues = self._route_consistency_issues(data)
@@ -295,12 +494,20 @@ class ValidationNode:
     def execute(self, state: AgentState, max_global_retries: int = 3) -> AgentState:
         print("🕵️ [Node 5] GeoJSON 质量验证: 正在审查 Node 3 的输出...")
 
-        deterministic_issues = self._deterministic_geojson_issues(state)
+        # 将字典转为字符串喂给大模型，截断防止 token 溢出
+        compressed_geojson = self._compress_geojson_for_qa(state.geojson_data)
+        delta = self._qa_delta(state.qa_baseline, compressed_geojson) if self.incremental else None
+        scoped = state
+        if delta is not None:
+            scoped = self._scoped_state(state, delta["days"])
+            print(f"   🔁 [Node 5] 增量校验：相对上一轮变更 {delta['changed_count']} 个 Feature，涉及 {len(delta['days'])} 天")
+        deterministic_issues = self._deterministic_geojson_issues(scoped)
         if deterministic_issues and state.validation_retry_count < max_global_retries:
             state.is_valid = False
             state.failed_node = "node3"
             state.validation_feedback = " ".join(deterministic_issues)
             state.validation_retry_count += 1
+            VALIDATION_VERDICTS.inc(source="deterministic_fail")
             print(f"   ⚠️ [Node 5] 程序化验证未通过，打回给 [node3]（第 {state.validation_retry_count} 次）。")
             print(f"   📝 QA 建议: {state.validation_feedback}")
             return state
@@ -308,32 +515,65 @@ class ValidationNode:
         # 防止无限死循环
         if state.validation_retry_count >= max_global_retries:
             print("❌ [Node 5] 达到全局最大纠错重试次数，强制终止。")
+            VALIDATION_VERDICTS.inc(source="forced")
             state.is_valid = True  # 强制放行，进入 node4
             return state
 
+        if self.mode == "deterministic_first" and not deterministic_issues:
+            confidence = self._deterministic_confidence(state)
+            schema_ok = validate_geojson(state.geojson_data, verdict_only=True)["valid"] if isinstance(state.geojson_data, dict) else False
+            if schema_ok and confidence >= self.skip_confidence:
+                print(f"   ✅ [Node 5] 程序化校验全部通过（坐标检索覆盖率 {confidence:.0%}），跳过 LLM QA。")
+                VALIDATION_VERDICTS.inc(source="deterministic_pass")
+                state.is_valid = True
+                state.failed_node = "none"
+                state.validation_feedback = ""
+                state.qa_baseline = self._qa_snapshot(compressed_geojson, {"is_valid": True})
+                return state
+
         try:
-            # 将字典转为字符串喂给大模型，截断防止 token 溢出
-            compressed_geojson = self._compress_geojson_for_qa(state.geojson_data)
-            geojson_str = json.dumps(compressed_geojson, ensure_ascii=False)
-            response = self.chain.invoke({
-                "user_query": state.user_text,
-                "deterministic_report": self._deterministic_report(state),
-                "geojson_data": geojson_str
-            })
-
-            json_str = _extract_first_json_object(response.content)
-            result = _robust_json_loads(json_str)
+            deterministic_report = self._deterministic_report(scoped)
+            cache_key = self._verdict_key(state.user_text, deterministic_report, compressed_geojson)
+            result = verdict_cache.get(cache_key)
+            if result is not None:
+                print("   ♻️ [Node 5] 相同 GeoJSON 已有 QA 结论，复用缓存结果。")
+                VALIDATION_VERDICTS.inc(source="cache")
+            else:
+                features = compressed_geojson.get("features", [])
+                use_delta = delta is not None and delta["changed_count"] <= INCREMENTAL_MAX_CHANGED_SHARE * max(1, len(features))
+                if use_delta:
+                    messages = self._delta_messages(state, deterministic_report, compressed_geojson, delta)
+                else:
+                    geojson_str = json.dumps(compressed_geojson, ensure_ascii=False)
+                    messages = self.prompt.format_messages(
+                        user_query=state.user_text,
+                        deterministic_report=deterministic_report,
+                        geojson_data=geojson_str,
+                    )
+                with llm_call(
+                    self.PROMPT_NAME, self.llm, validation_round=state.validation_retry_count, incremental=use_delta
+                ) as call:
+                    response = self.llm.invoke(messages)
+                    call.record(response, messages)
+
+                result = _robust_json_loads(response.content)
+                if isinstance(result, dict) and "is_valid" in result:
+                    verdict_cache.put(cache_key, result)
+                VALIDATION_VERDICTS.inc(source="llm")
 
             state.is_valid = result.get("is_valid", False)
             state.failed_node = result.get("failed_node", "none")
             state.validation_feedback = result.get("feedback", "")
 
-            if not state.is_valid and self._is_route_only_false_positive(state.validation_feedback, state):
+            if not state.is_valid and self._is_route_only_false_positive(state.validation_feedback, scoped):
                 print("   ↪️ [Node 5] LLM QA route 机械校验误判，程序化 route 校验已通过，本轮放行。")
                 state.is_valid = True
                 state.failed_node = "none"
                 state.validation_feedback = ""
 
+            state.qa_baseline = self._qa_snapshot(
+                compressed_geojson, {"is_valid": state.is_valid, "feedback": state.validation_feedback}
+            )
             if state.is_valid:
                 print("   ✅ [Node 5] 验证通过！数据质量合格。")
             else:
@@ -1,9 +1,10 @@
 import os
-import base64
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from ..utils.agent_utils import AgentState, _extract_first_json_object, _robust_json_loads
+from ..utils.image_preprocess import image_data_url, normalize_image
 from ..utils.prompt_loader import load_prompt
+from ..utils.metrics import llm_call
 from ..validators.schema_validators import validate_visual_structure
 
 
@@ -67,14 +68,9 @@ class VisualStructureNode:
         self.system_prompt = system_prompt
     
     def image_to_base64(self, image_path: str) -> str:
-        ext = os.path.splitext(image_path)[1].lower().lstrip('.')
-        if ext not in ["jpg", "jpeg", "png", "gif", "bmp"]:
-            raise ValueError(f"不支持的图片格式：{ext}")
-        
-        with open(image_path, "rb") as f:
-            base64_data = base64.b64encode(f.read()).decode("utf-8")
-        
-        return f"data:image/{ext};base64,{base64_data}"
+        """Data URL of the normalized (resized, EXIF-oriented, re-encoded) rendition."""
+        data_url, _ = normalize_image(image_path)
+        return data_url
 
     def _default_visual_structure(self) -> dict:
         return {
@@ -129,17 +125,18 @@ class VisualStructureNode:
             return state
         
         try:
-            if not state.image_base64:
-                state.image_base64 = self.image_to_base64(state.image_path)
+            image_url = image_data_url(state)
 
             messages = [
                 SystemMessage(content=self.system_prompt),
                 HumanMessage(content=[
-                    {"type": "image_url", "image_url": {"url": state.image_base64}},
+                    {"type": "image_url", "image_url": {"url": image_url}},
                     {"type": "text", "text": "请分析这张图片的视觉结构，并严格输出 JSON（不要额外解释）。"},
                 ]),
             ]
-            response = self.llm.invoke(messages)
+            with llm_call(self.PROMPT_NAME, self.llm) as call:
+                response = self.llm.invoke(messages)
+                call.record(response, messages)
             content = response.content
             
             json_str = _extract_first_json_object(content)
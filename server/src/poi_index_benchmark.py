@@ -0,0 +1,196 @@
+"""
+Benchmark Node 3 POI de-duplication and the QA density check.
+
+Builds a synthetic multi-day FeatureCollection (clustered POIs with repeated
+and near-duplicate names), runs the pairwise reference implementations the
+nodes used before ``PoiIndex`` and the indexed paths the nodes use now, checks
+that both produce the same result and prints the timings.
+
+    python -m src.poi_index_benchmark
+    python -m src.poi_index_benchmark --pois 5000 --days 7 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.nodes.geojson_generation import DUPLICATE_POI_RADIUS_METERS, GeoJSONGenerationNode
+from src.nodes.validation_node import DENSE_POI_RADIUS_METERS, ValidationNode
+from src.utils.agent_utils import AgentState
+from src.utils.poi_index import PoiIndex, distance_meters
+
+
+CENTER = (103.85, 1.29)
+AREAS = ["滨海湾", "圣淘沙", "小印度", "唐人街", "克拉码头", "乌节路", "武吉知马", "加东", "荷兰村", "甘榜格南"]
+KINDS = ["花园", "博物馆", "美食中心", "观景台", "码头", "市场", "公园", "艺术馆", "神庙", "步道"]
+DENSITY_ISSUE_PREFIX = "同一天存在疑似重复/过密 POI"
+
+
+def build_collection(pois: int, days: int, seed: int) -> Dict[str, Any]:
+    """Clustered points; roughly one in ten repeats an earlier name or sits next to an earlier point."""
+    rng = random.Random(seed)
+    clusters = [
+        (CENTER[0] + rng.uniform(-0.15, 0.15), CENTER[1] + rng.uniform(-0.08, 0.08), rng.choice(AREAS))
+        for _ in range(max(1, pois // 40))
+    ]
+    features: List[Dict[str, Any]] = []
+    for index in range(pois):
+        day = f"D{rng.randint(1, days)}"
+        roll = rng.random()
+        if features and roll < 0.05:
+            source = rng.choice(features)
+            name = source["properties"]["name"] + rng.choice(["", "站", "游客中心"])
+            lon, lat = source["geometry"]["coordinates"]
+            lon, lat = lon + rng.uniform(-0.01, 0.01), lat + rng.uniform(-0.01, 0.01)
+        elif features and roll < 0.10:
+            source = rng.choice(features)
+            day = source["properties"]["day"]
+            lon, lat = source["geometry"]["coordinates"]
+            lon, lat = lon + rng.uniform(-0.0001, 0.0001), lat + rng.uniform(-0.0001, 0.0001)
+            name = f"{rng.choice(AREAS)}{rng.choice(KINDS)}{index}"
+        else:
+            base_lon, base_lat, area = rng.choice(clusters)
+            lon, lat = base_lon + rng.gauss(0, 0.004), base_lat + rng.gauss(0, 0.004)
+            name = f"{area}{rng.choice(KINDS)}{index}"
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+                "properties": {"name": name, "day": day, "order": index + 1},
+            }
+        )
+    return {"type": "FeatureCollection", "_city": "新加坡", "features": features}
+
+
+def pairwise_dedupe(node: GeoJSONGenerationNode, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The O(n^2) de-duplication Node 3 ran before the index."""
+    kept: List[Dict[str, Any]] = []
+    for candidate in candidates:
+        candidate_props = candidate.get("properties") or {}
+        candidate_name = node._normalize_poi_name(candidate_props.get("name"))
+        candidate_coord = candidate.get("geometry", {}).get("coordinates")
+        duplicate = False
+        for existing in kept:
+            existing_props = existing.get("properties") or {}
+            existing_name = node._normalize_poi_name(existing_props.get("name"))
+            if candidate_name and existing_name:
+                if candidate_name == existing_name or (
+                    min(len(candidate_name), len(existing_name)) >= 2
+                    and (candidate_name in existing_name or existing_name in candidate_name)
+                ):
+                    duplicate = True
+                    break
+            dist = distance_meters(candidate_coord, existing.get("geometry", {}).get("coordinates"))
+            if candidate_props.get("day") == existing_props.get("day") and dist < DUPLICATE_POI_RADIUS_METERS:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(candidate)
+    return kept
+
+
+def indexed_dedupe(node: GeoJSONGenerationNode, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The de-duplication loop of ``GeoJSONGenerationNode._normalize_travel_semantics``."""
+    kept: List[Dict[str, Any]] = []
+    kept_index = PoiIndex(cell_meters=DUPLICATE_POI_RADIUS_METERS)
+    for feature in candidates:
+        if node._is_duplicate_poi(feature, kept_index):
+            continue
+        kept.append(feature)
+        props = feature.get("properties") or {}
+        kept_index.add(
+            feature.get("geometry", {}).get("coordinates"),
+            group=props.get("day"),
+            name=node._normalize_poi_name(props.get("name")),
+        )
+    return kept
+
+
+def pairwise_density_issues(node: ValidationNode, state: AgentState) -> List[Tuple[str, str, int]]:
+    """``(first, second, meters)`` for every pair the pre-index QA loop flagged."""
+    points = [f for f in state.geojson_data["features"] if f.get("geometry", {}).get("type") == "Point"]
+    user = node._normalize_name(state.user_text)
+    flagged = []
+    for index, first in enumerate(points):
+        first_props = first.get("properties") or {}
+        first_name = first_props.get("name", "")
+        for second in points[index + 1:]:
+            second_props = second.get("properties") or {}
+            second_name = second_props.get("name", "")
+            if first_props.get("day") != second_props.get("day"):
+                continue
+            dist = distance_meters(first["geometry"]["coordinates"], second["geometry"]["coordinates"])
+            first_area = node._macro_area(first_name)
+            same_area = first_area and first_area == node._macro_area(second_name)
+            first_normalized, second_normalized = node._normalize_name(first_name), node._normalize_name(second_name)
+            contains = first_normalized in second_normalized or second_normalized in first_normalized
+            both_requested = bool(first_normalized and first_normalized in user) and bool(
+                second_normalized and second_normalized in user
+            )
+            if not both_requested and dist < DENSE_POI_RADIUS_METERS and (same_area or contains):
+                flagged.append((first_name, second_name, int(dist)))
+    return flagged
+
+
+def indexed_density_issues(node: ValidationNode, state: AgentState) -> List[str]:
+    return [issue for issue in node._semantic_geojson_issues(state) if issue.startswith(DENSITY_ISSUE_PREFIX)]
+
+
+def best_of(repeat: int, func: Callable[[], Any]) -> Tuple[float, Any]:
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="对比 POI 去重与过密检查的逐对实现和空间索引实现。")
+    parser.add_argument("--pois", type=int, default=2000, help="合成 POI 数量。")
+    parser.add_argument("--days", type=int, default=5, help="行程天数。")
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现的重复次数，取中位数。")
+    parser.add_argument("--seed", type=int, default=7, help="随机种子。")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    collection = build_collection(args.pois, args.days, args.seed)
+    features = collection["features"]
+    # Only the pure helpers are exercised; skip __init__ so no AMap key is needed.
+    geojson_node = GeoJSONGenerationNode.__new__(GeoJSONGenerationNode)
+    validation_node = ValidationNode(llm=None)
+    state = AgentState(session_id="poi-index-benchmark", user_text="新加坡五日游，想去滨海湾花园和克拉码头", geojson_data=collection)
+
+    print(f"📍 {len(features)} 个 POI，{args.days} 天，重复 {args.repeat} 次取中位数")
+
+    slow_ms, slow_kept = best_of(args.repeat, lambda: pairwise_dedupe(geojson_node, features))
+    fast_ms, fast_kept = best_of(args.repeat, lambda: indexed_dedupe(geojson_node, features))
+    same_dedupe = [id(f) for f in slow_kept] == [id(f) for f in fast_kept]
+    print(f"\n🧹 Node 3 去重: 保留 {len(fast_kept)} 个")
+    print(f"   逐对  {slow_ms:>9.1f} ms")
+    print(f"   索引  {fast_ms:>9.1f} ms  ({slow_ms / max(fast_ms, 1e-9):.1f}x)  {'✅ 结果一致' if same_dedupe else '❌ 结果不一致'}")
+
+    slow_ms, slow_pairs = best_of(args.repeat, lambda: pairwise_density_issues(validation_node, state))
+    fast_ms, fast_issues = best_of(args.repeat, lambda: indexed_density_issues(validation_node, state))
+    expected = [f"{DENSITY_ISSUE_PREFIX}：{first} 与 {second} 相距约 {dist} 米" for first, second, dist in slow_pairs]
+    same_density = len(expected) == len(fast_issues) and all(
+        issue.startswith(prefix) for prefix, issue in zip(expected, fast_issues)
+    )
+    print(f"\n🔎 QA 过密检查: {len(fast_issues)} 条问题")
+    print(f"   逐对  {slow_ms:>9.1f} ms")
+    print(f"   索引  {fast_ms:>9.1f} ms  ({slow_ms / max(fast_ms, 1e-9):.1f}x)  {'✅ 结果一致' if same_density else '❌ 结果不一致'}")
+
+    if not (same_dedupe and same_density):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
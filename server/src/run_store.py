@@ -1,29 +1,271 @@
 """
-In-memory store for observable agent runs.
+Stores for observable agent runs.
 
-This is intentionally process-local: it supports the current development and
-debug workflow without changing persistence semantics for generated sessions.
+``MemoryRunStore`` is process-local and is the default for the development
+workflow. ``SqliteRunStore`` keeps events, artifacts and results in a local
+SQLite database (WAL mode) so that any uvicorn worker on the same machine can
+serve SSE and results for a run started by another worker; select it with
+``RUN_STORE_BACKEND=sqlite``.
+
+Each run keeps a bounded ring buffer of already-serialized SSE frames with
+monotonic ids, so a client reconnecting with ``Last-Event-ID`` only replays
+what it missed. Large payload values (GeoJSON, style code, ...) are stored
+once as run artifacts and events carry a ``$ref`` to them instead.
+
+Finished runs are bounded: their results are spilled to disk and reloaded on
+demand, and whole records are evicted by TTL and by run count / byte budget.
 """
 
+import abc
 import asyncio
+import hashlib
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .utils import json_codec
+from .utils.artifact_writer import artifact_writer
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+EVENT_BUFFER_SIZE = _env_int("SSE_EVENT_BUFFER_SIZE", 512)
+INLINE_PAYLOAD_BYTES = _env_int("SSE_INLINE_PAYLOAD_BYTES", 16 * 1024)
+DEFAULT_SPILL_DIR = Path(__file__).resolve().parents[1] / "output" / ".runstore"
+
+Frames = List[Tuple[int, str]]
+
+
+def _with_gap_reset(run_id: str, last_event_id: int, frames: Frames) -> Frames:
+    """Prepend a ``stream_reset`` frame when events after ``last_event_id`` were trimmed.
+
+    The reset frame takes the id just before the oldest buffered frame, so the
+    client's cursor lines up with the replay that follows; on receiving it the
+    client reloads the run from its snapshot URL instead of trusting the stream.
+    """
+    if not frames or frames[0][0] <= last_event_id + 1:
+        return frames
+    reset_id = frames[0][0] - 1
+    event = {
+        "type": "stream_reset",
+        "run_id": run_id,
+        "status": "reset",
+        "payload": {
+            "missed_after": last_event_id,
+            "oldest_event_id": frames[0][0],
+            "snapshot": f"/api/multimodal/runs/{run_id}",
+        },
+        "event_id": reset_id,
+    }
+    data = json_codec.dumps_str(event, pretty=False)
+    return [(reset_id, f"id: {reset_id}\nevent: stream_reset\ndata: {data}\n\n")] + frames
+
+
+@dataclass
+class RunArtifact:
+    content: bytes
+    etag: str
 
 
 @dataclass
 class RunRecord:
     run_id: str
-    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    events: Deque[Tuple[int, str]] = field(default_factory=lambda: deque(maxlen=EVENT_BUFFER_SIZE or None))
+    last_event_id: int = 0
+    artifacts: Dict[str, RunArtifact] = field(default_factory=dict)
     done: bool = False
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    spilled: bool = False
+    finished_at: Optional[float] = None
+    buffered_bytes: int = 0
+    on_publish: Optional[Callable[["RunRecord", int, str, Dict[str, "RunArtifact"]], None]] = field(
+        default=None, repr=False
+    )
+    _new_artifacts: Dict[str, "RunArtifact"] = field(default_factory=dict, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def _store_artifact(self, value: Any, encoded: bytes) -> Dict[str, Any]:
+        digest = hashlib.sha256(encoded).hexdigest()
+        artifact_id = digest[:16]
+        if artifact_id not in self.artifacts:
+            self.artifacts[artifact_id] = RunArtifact(content=encoded, etag=f'"{digest}"')
+            self.buffered_bytes += len(encoded)
+            self._new_artifacts[artifact_id] = self.artifacts[artifact_id]
+        return {
+            "$ref": f"/api/multimodal/runs/{self.run_id}/artifacts/{artifact_id}",
+            "bytes": len(encoded),
+            "kind": "feature_collection" if isinstance(value, dict) and value.get("type") == "FeatureCollection" else type(value).__name__,
+        }
+
+    def _externalize_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not INLINE_PAYLOAD_BYTES:
+            return payload
+        slim = {}
+        for key, value in payload.items():
+            if isinstance(value, (dict, list)):
+                encoded = json_codec.dumps(value, pretty=False)
+                if len(encoded) > INLINE_PAYLOAD_BYTES:
+                    slim[key] = self._store_artifact(value, encoded)
+                    continue
+            slim[key] = value
+        return slim
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Assign the next event id, serialize the frame once and wake subscribers."""
+        self.last_event_id += 1
+        self._new_artifacts = {}
+        event = dict(event)
+        if isinstance(event.get("payload"), dict):
+            event["payload"] = self._externalize_payload(event["payload"])
+        event["event_id"] = self.last_event_id
+        data = json_codec.dumps_str(event, pretty=False)
+        frame = f"id: {self.last_event_id}\nevent: {event['type']}\ndata: {data}\n\n"
+        if self.events.maxlen and len(self.events) == self.events.maxlen:
+            self.buffered_bytes -= len(self.events[0][1])
+        self.events.append((self.last_event_id, frame))
+        self.buffered_bytes += len(frame)
+        if self.on_publish is not None:
+            self.on_publish(self, self.last_event_id, frame, self._new_artifacts)
+        self._notify()
+        return self.last_event_id
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def frames_after(self, last_event_id: int) -> Frames:
+        """Buffered frames newer than ``last_event_id`` (oldest first).
+
+        If the ring buffer already dropped some of them, the result starts with
+        a ``stream_reset`` frame.
+        """
+        if not self.events or self.events[-1][0] <= last_event_id:
+            return []
+        frames = [(event_id, frame) for event_id, frame in self.events if event_id > last_event_id]
+        return _with_gap_reset(self.run_id, last_event_id, frames)
+
+    async def wait_for_change(self, timeout: Optional[float]) -> bool:
+        """Wait for a new event or completion; ``False`` if ``timeout`` elapsed first."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
 
+class RunStore(abc.ABC):
+    """Backend interface used by the run endpoints.
 
-class RunStore:
-    def __init__(self) -> None:
+    The worker that executes a run holds its ``RunRecord`` (from ``create``)
+    and publishes into it; readers only go through the async accessors so a
+    backend may serve them from another process.
+    """
+
+    @abc.abstractmethod
+    async def create(self, run_id: str) -> RunRecord:
+        ...
+
+    @abc.abstractmethod
+    async def finish(self, record: RunRecord) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def exists(self, run_id: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def frames_after(self, run_id: str, last_event_id: int) -> Tuple[Frames, bool]:
+        """Buffered frames newer than ``last_event_id`` and whether the run is done."""
+
+    @abc.abstractmethod
+    async def wait_for_change(self, run_id: str, last_event_id: int, timeout: Optional[float]) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def get_artifact(self, run_id: str, artifact_id: str) -> Optional[RunArtifact]:
+        ...
+
+    @abc.abstractmethod
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Run status and result as returned by ``GET /api/multimodal/runs/{run_id}``."""
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Sizes and counters for the stats endpoint and ``/metrics``; must not block."""
+
+
+def _snapshot(record: RunRecord) -> Dict[str, Any]:
+    return {
+        "run_id": record.run_id,
+        "done": record.done,
+        "result": record.result,
+        "error": record.error,
+    }
+
+
+class MemoryRunStore(RunStore):
+    """Process-local store.
+
+    Finished runs spill their result and payload artifacts to ``spill_dir``
+    (``<run_id>.json`` plus ``<run_id>.artifacts/<artifact_id>.json``), so the
+    in-memory record only keeps the event ring buffer until it is evicted.
+    Spill files have their own retention (age, run count and byte cap) and
+    outlive the record: results and ``$ref`` artifacts of evicted runs are
+    read back from disk. The retention sweep runs at startup and then at most
+    every ``spill_sweep_interval`` seconds, off the event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 3600,
+        max_runs: int = 200,
+        max_bytes: int = 256 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        spill_ttl_seconds: float = 7 * 24 * 3600,
+        spill_max_runs: int = 0,
+        spill_max_bytes: int = 1024 * 1024 * 1024,
+        spill_sweep_interval: float = 300,
+    ) -> None:
         self._runs: Dict[str, RunRecord] = {}
+        self.ttl_seconds = ttl_seconds
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self.spill_max_runs = spill_max_runs
+        self.spill_max_bytes = spill_max_bytes
+        self.spill_sweep_interval = spill_sweep_interval
+        self.evictions = {"ttl": 0, "capacity": 0}
+        self.spilled_count = 0
+        self.spill_removed = 0
+        self.spill_usage = {"runs": 0, "bytes": 0}
+        self._sweeping = False
+        self._last_sweep = 0.0
+        self._sweep_spill_dir()
 
-    def create(self, run_id: str) -> RunRecord:
+    async def create(self, run_id: str) -> RunRecord:
+        self.evict()
         record = RunRecord(run_id=run_id)
         self._runs[run_id] = record
         return record
@@ -31,5 +273,534 @@ class RunStore:
     def get(self, run_id: str) -> Optional[RunRecord]:
         return self._runs.get(run_id)
 
+    def _spill_path(self, run_id: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{os.path.basename(run_id)}.json")
+
+    def _artifact_dir(self, run_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{os.path.basename(run_id)}.artifacts")
+
+    async def finish(self, record: RunRecord) -> None:
+        """Mark a run done, move its result and artifacts to disk and apply eviction."""
+        record.finish()
+        if self.spill_dir:
+            await self._spill(record)
+        self.evict()
+        if self.spill_dir and not self._sweeping and time.monotonic() - self._last_sweep >= self.spill_sweep_interval:
+            self._sweeping = True
+            try:
+                await asyncio.to_thread(self._sweep_spill_dir, set(self._runs))
+            finally:
+                self._sweeping = False
+
+    async def _spill(self, record: RunRecord) -> None:
+        # The snapshot file is what the retention sweep tracks, so write it
+        # whenever artifacts were spilled too.
+        spill_snapshot = bool(record.artifacts) or record.result is not None or bool(record.error)
+        try:
+            if record.artifacts:
+                artifact_dir = self._artifact_dir(record.run_id)
+                os.makedirs(artifact_dir, exist_ok=True)
+                await asyncio.gather(
+                    *(
+                        artifact_writer.write_bytes(os.path.join(artifact_dir, f"{artifact_id}.json"), artifact.content)
+                        for artifact_id, artifact in record.artifacts.items()
+                    )
+                )
+                record.buffered_bytes -= sum(len(artifact.content) for artifact in record.artifacts.values())
+                record.artifacts = {}
+            if spill_snapshot:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                await artifact_writer.write_json(self._spill_path(record.run_id), _snapshot(record))
+                record.result = None
+                record.spilled = True
+                self.spilled_count += 1
+        except Exception as exc:
+            print(f"⚠️ RunStore 结果落盘失败 {record.run_id}: {exc}")
+
+    def _sweep_spill_dir(self, keep: Set[str] = frozenset()) -> None:
+        """Apply the spill retention: drop files past ``spill_ttl_seconds``, then the
+        oldest ones while over ``spill_max_runs`` / ``spill_max_bytes``.
+
+        Runs in ``keep`` (still held in memory) are never removed. Scans the
+        directory instead of indexing every spilled run, so memory stays flat
+        however many runs are kept on disk.
+        """
+        self._last_sweep = time.monotonic()
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        spilled = []
+        with os.scandir(self.spill_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                run_id = entry.name[: -len(".json")]
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                spilled.append((stat.st_mtime, run_id, stat.st_size + self._artifact_bytes(run_id)))
+        spilled.sort()
+
+        cutoff = time.time() - self.spill_ttl_seconds if self.spill_ttl_seconds else None
+        total_bytes = sum(size for _, _, size in spilled)
+        remaining = len(spilled)
+        removed = 0
+        for written_at, run_id, size in spilled:
+            expired = cutoff is not None and written_at < cutoff
+            over_count = self.spill_max_runs and remaining > self.spill_max_runs
+            over_bytes = self.spill_max_bytes and total_bytes > self.spill_max_bytes
+            if not (expired or over_count or over_bytes):
+                break
+            if run_id in keep:
+                continue
+            self._remove_spilled(run_id)
+            remaining -= 1
+            total_bytes -= size
+            removed += 1
+        self.spill_removed += removed
+        self.spill_usage = {"runs": remaining, "bytes": total_bytes}
+
+    def _artifact_bytes(self, run_id: str) -> int:
+        try:
+            with os.scandir(self._artifact_dir(run_id)) as entries:
+                return sum(entry.stat().st_size for entry in entries if entry.is_file())
+        except OSError:
+            return 0
+
+    def _remove_spilled(self, run_id: str) -> None:
+        try:
+            os.unlink(self._spill_path(run_id))
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            print(f"⚠️ RunStore 删除落盘结果失败 {run_id}: {exc}")
+        shutil.rmtree(self._artifact_dir(run_id), ignore_errors=True)
+
+    async def exists(self, run_id: str) -> bool:
+        return run_id in self._runs
+
+    async def frames_after(self, run_id: str, last_event_id: int) -> Tuple[Frames, bool]:
+        record = self._runs.get(run_id)
+        if record is None:
+            return [], True
+        return record.frames_after(last_event_id), record.done
+
+    async def wait_for_change(self, run_id: str, last_event_id: int, timeout: Optional[float]) -> bool:
+        record = self._runs.get(run_id)
+        if record is None:
+            return True
+        return await record.wait_for_change(timeout)
+
+    async def get_artifact(self, run_id: str, artifact_id: str) -> Optional[RunArtifact]:
+        record = self._runs.get(run_id)
+        if record is not None and artifact_id in record.artifacts:
+            return record.artifacts[artifact_id]
+        if not self.spill_dir or not re.fullmatch(r"[0-9a-f]{16}", artifact_id):
+            return None
+        return await asyncio.to_thread(self._load_spilled_artifact, run_id, artifact_id)
+
+    def _load_spilled_artifact(self, run_id: str, artifact_id: str) -> Optional[RunArtifact]:
+        try:
+            with open(os.path.join(self._artifact_dir(run_id), f"{artifact_id}.json"), "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return RunArtifact(content=content, etag=f'"{hashlib.sha256(content).hexdigest()}"')
+
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        record = self._runs.get(run_id)
+        if record and not record.spilled:
+            return _snapshot(record)
+        return await asyncio.to_thread(self._load_spilled, run_id)
+
+    def _load_spilled(self, run_id: str) -> Optional[Dict[str, Any]]:
+        path = self._spill_path(run_id)
+        if not path or not os.path.isfile(path):
+            return None
+        try:
+            return json_codec.load_file(path)
+        except (OSError, ValueError) as exc:
+            print(f"⚠️ RunStore 读取落盘结果失败 {run_id}: {exc}")
+            return None
+
+    def evict(self) -> None:
+        """Drop finished runs past their TTL, then oldest finished runs over budget.
+
+        Their spill files stay; ``_sweep_spill_dir`` applies the spill retention.
+        """
+        now = time.monotonic()
+        finished = sorted(
+            (record for record in self._runs.values() if record.done),
+            key=lambda record: record.finished_at or 0,
+        )
+        survivors = []
+        for record in finished:
+            if self.ttl_seconds and now - (record.finished_at or now) > self.ttl_seconds:
+                self._drop(record, "ttl")
+            else:
+                survivors.append(record)
+
+        total_bytes = sum(record.buffered_bytes for record in self._runs.values())
+        for record in survivors:
+            over_count = self.max_runs and len(self._runs) > self.max_runs
+            over_bytes = self.max_bytes and total_bytes > self.max_bytes
+            if not over_count and not over_bytes:
+                break
+            total_bytes -= record.buffered_bytes
+            self._drop(record, "capacity")
+
+    def _drop(self, record: RunRecord, reason: str) -> None:
+        self._runs.pop(record.run_id, None)
+        self.evictions[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        active = sum(1 for record in self._runs.values() if not record.done)
+        return {
+            "backend": "memory",
+            "runs": len(self._runs),
+            "active_runs": active,
+            "finished_runs": len(self._runs) - active,
+            "buffered_bytes": sum(record.buffered_bytes for record in self._runs.values()),
+            "spilled_results": self.spilled_count,
+            "spill": {**self.spill_usage, "removed": self.spill_removed},
+            "evictions": dict(self.evictions),
+            "limits": {
+                "ttl_seconds": self.ttl_seconds,
+                "max_runs": self.max_runs,
+                "max_bytes": self.max_bytes,
+                "spill_ttl_seconds": self.spill_ttl_seconds,
+                "spill_max_runs": self.spill_max_runs,
+                "spill_max_bytes": self.spill_max_bytes,
+                "spill_sweep_interval": self.spill_sweep_interval,
+            },
+        }
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    last_event_id INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result BLOB
+);
+CREATE INDEX IF NOT EXISTS runs_finished ON runs (done, finished_at);
+CREATE TABLE IF NOT EXISTS run_events (
+    run_id TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    frame TEXT NOT NULL,
+    PRIMARY KEY (run_id, event_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_artifacts (
+    run_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (run_id, artifact_id)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteRunStore(RunStore):
+    """Run store shared by every worker process on the machine.
+
+    The publishing worker serves its own subscribers from the in-memory record
+    and hands every write (run rows, frames, artifacts, eviction) to a single
+    writer thread, which commits whatever has queued up in one transaction, so
+    waiting on the SQLite write lock never blocks the event loop. Other
+    workers read from the database and poll ``runs.last_event_id`` every
+    ``poll_interval`` seconds while waiting, which is what stands in for a
+    notification channel.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        ttl_seconds: float = 3600,
+        max_runs: int = 200,
+        poll_interval: float = 0.1,
+        write_batch: int = 256,
+    ) -> None:
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_runs = max_runs
+        self.poll_interval = poll_interval
+        self.write_batch = max(1, write_batch)
+        self.evictions = {"ttl": 0, "capacity": 0}
+        self._local_runs: Dict[str, RunRecord] = {}
+        self._tls = threading.local()
+        self._db_stats: Dict[str, int] = {"runs": 0, "active_runs": 0, "stored_bytes": 0}
+        self._writes: "queue.SimpleQueue[Tuple[Callable[[sqlite3.Connection], None], Future]]" = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn().executescript(_SQLITE_SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="runstore-sqlite-writer", daemon=True)
+        self._writer.start()
+        self.evict()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._tls.conn = conn
+        return conn
+
+    def _submit(self, job: Callable[[sqlite3.Connection], None]) -> Future:
+        """Queue ``job`` for the writer thread; the future resolves once its transaction commits."""
+        future: Future = Future()
+        self._writes.put((job, future))
+        return future
+
+    def _write_loop(self) -> None:
+        conn = self._conn()
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.write_batch:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for job, _ in batch:
+                        job(conn)
+            except Exception as exc:
+                print(f"⚠️ RunStore SQLite 写入失败（{len(batch)} 项）: {exc}")
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for _, future in batch:
+                future.set_result(None)
+
+    async def create(self, run_id: str) -> RunRecord:
+        self.evict()
+        created_at = time.time()
+        # Wait for the row so another worker can serve the stream as soon as we return the run id.
+        await asyncio.wrap_future(
+            self._submit(
+                lambda conn: conn.execute(
+                    "INSERT OR REPLACE INTO runs (run_id, created_at) VALUES (?, ?)",
+                    (run_id, created_at),
+                )
+            )
+        )
+        record = RunRecord(run_id=run_id, on_publish=self._persist_event)
+        self._local_runs[run_id] = record
+        return record
+
+    def _persist_event(
+        self, record: RunRecord, event_id: int, frame: str, artifacts: Dict[str, RunArtifact]
+    ) -> None:
+        run_id = record.run_id
+        rows = [(run_id, key, item.etag, item.content) for key, item in artifacts.items()]
+
+        def write(conn: sqlite3.Connection) -> None:
+            conn.executemany(
+                "INSERT OR IGNORE INTO run_artifacts (run_id, artifact_id, etag, content) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO run_events (run_id, event_id, frame) VALUES (?, ?, ?)",
+                (run_id, event_id, frame),
+            )
+            conn.execute("UPDATE runs SET last_event_id = ? WHERE run_id = ?", (event_id, run_id))
+            if EVENT_BUFFER_SIZE:
+                conn.execute(
+                    "DELETE FROM run_events WHERE run_id = ? AND event_id <= ?",
+                    (run_id, event_id - EVENT_BUFFER_SIZE),
+                )
+
+        self._submit(write)
+
+    async def finish(self, record: RunRecord) -> None:
+        result = json_codec.dumps(record.result, pretty=False) if record.result is not None else None
+        run_id, error, finished_at = record.run_id, record.error, time.time()
+        # Queued after every frame of the run, so readers never see done=1 with frames missing.
+        await asyncio.wrap_future(
+            self._submit(
+                lambda conn: conn.execute(
+                    "UPDATE runs SET done = 1, finished_at = ?, error = ?, result = ? WHERE run_id = ?",
+                    (finished_at, error, result, run_id),
+                )
+            )
+        )
+        record.finish()
+        self._local_runs.pop(record.run_id, None)
+        self.evict()
+
+    async def exists(self, run_id: str) -> bool:
+        if run_id in self._local_runs:
+            return True
+        return await asyncio.to_thread(self._run_state, run_id) is not None
+
+    def _run_state(self, run_id: str) -> Optional[Tuple[int, bool]]:
+        row = self._conn().execute(
+            "SELECT last_event_id, done FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    async def frames_after(self, run_id: str, last_event_id: int) -> Tuple[Frames, bool]:
+        record = self._local_runs.get(run_id)
+        if record is not None:
+            return record.frames_after(last_event_id), record.done
+        return await asyncio.to_thread(self._frames_after_db, run_id, last_event_id)
+
+    def _frames_after_db(self, run_id: str, last_event_id: int) -> Tuple[Frames, bool]:
+        conn = self._conn()
+        state = self._run_state(run_id)
+        if state is None:
+            return [], True
+        if state[0] <= last_event_id:
+            return [], state[1]
+        rows = conn.execute(
+            "SELECT event_id, frame FROM run_events WHERE run_id = ? AND event_id > ? ORDER BY event_id",
+            (run_id, last_event_id),
+        ).fetchall()
+        return _with_gap_reset(run_id, last_event_id, [(event_id, frame) for event_id, frame in rows]), state[1]
+
+    async def wait_for_change(self, run_id: str, last_event_id: int, timeout: Optional[float]) -> bool:
+        record = self._local_runs.get(run_id)
+        if record is not None:
+            return await record.wait_for_change(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = await asyncio.to_thread(self._run_state, run_id)
+            if state is None or state[0] > last_event_id or state[1]:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            delay = self.poll_interval
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(delay)
+
+    async def get_artifact(self, run_id: str, artifact_id: str) -> Optional[RunArtifact]:
+        record = self._local_runs.get(run_id)
+        if record is not None and artifact_id in record.artifacts:
+            return record.artifacts[artifact_id]
+        return await asyncio.to_thread(self._get_artifact_db, run_id, artifact_id)
+
+    def _get_artifact_db(self, run_id: str, artifact_id: str) -> Optional[RunArtifact]:
+        row = self._conn().execute(
+            "SELECT content, etag FROM run_artifacts WHERE run_id = ? AND artifact_id = ?",
+            (run_id, artifact_id),
+        ).fetchone()
+        return RunArtifact(content=bytes(row[0]), etag=row[1]) if row else None
+
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        record = self._local_runs.get(run_id)
+        if record is not None:
+            return _snapshot(record)
+        return await asyncio.to_thread(self._load_db, run_id)
+
+    def _load_db(self, run_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT done, error, result FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "run_id": run_id,
+            "done": bool(row[0]),
+            "result": json_codec.loads(row[2]) if row[2] is not None else None,
+            "error": row[1],
+        }
+
+    def evict(self) -> Future:
+        """Queue deletion of finished runs past their TTL, then the oldest finished runs over ``max_runs``."""
+        return self._submit(self._evict)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        expired: List[str] = []
+        if self.ttl_seconds:
+            expired = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT run_id FROM runs WHERE done = 1 AND finished_at < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+            ]
+        overflow: List[str] = []
+        if self.max_runs:
+            total = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] - len(expired)
+            if total > self.max_runs:
+                overflow = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT run_id FROM runs WHERE done = 1 ORDER BY finished_at LIMIT ? OFFSET ?",
+                        (total - self.max_runs, len(expired)),
+                    )
+                ]
+        for table in ("run_events", "run_artifacts", "runs"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE run_id = ?",
+                [(run_id,) for run_id in expired + overflow],
+            )
+        self.evictions = {
+            "ttl": self.evictions["ttl"] + len(expired),
+            "capacity": self.evictions["capacity"] + len(overflow),
+        }
+        self._refresh_stats(conn)
+
+    def _refresh_stats(self, conn: sqlite3.Connection) -> None:
+        runs, active = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(done = 0), 0) FROM runs"
+        ).fetchone()
+        stored_bytes = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(LENGTH(frame)), 0) FROM run_events)"
+            " + (SELECT COALESCE(SUM(LENGTH(content)), 0) FROM run_artifacts)"
+            " + (SELECT COALESCE(SUM(LENGTH(result)), 0) FROM runs)"
+        ).fetchone()[0]
+        self._db_stats = {"runs": runs, "active_runs": active, "stored_bytes": stored_bytes}
+
+    def stats(self) -> Dict[str, Any]:
+        """Database sizes as of the last eviction pass (every run create/finish) plus local counters."""
+        db_stats = self._db_stats
+        return {
+            "backend": "sqlite",
+            "runs": db_stats["runs"],
+            "active_runs": db_stats["active_runs"],
+            "finished_runs": db_stats["runs"] - db_stats["active_runs"],
+            "local_runs": len(self._local_runs),
+            "stored_bytes": db_stats["stored_bytes"],
+            "evictions": dict(self.evictions),
+            "limits": {
+                "ttl_seconds": self.ttl_seconds,
+                "max_runs": self.max_runs,
+            },
+        }
+
+
+def _create_run_store() -> RunStore:
+    backend = os.getenv("RUN_STORE_BACKEND", "memory").strip().lower()
+    ttl_seconds = _env_int("RUN_STORE_TTL_SECONDS", 3600)
+    max_runs = _env_int("RUN_STORE_MAX_RUNS", 200)
+    if backend == "sqlite":
+        return SqliteRunStore(
+            os.getenv("RUN_STORE_SQLITE_PATH") or str(DEFAULT_SPILL_DIR / "runs.sqlite3"),
+            ttl_seconds=ttl_seconds,
+            max_runs=max_runs,
+            poll_interval=_env_int("RUN_STORE_POLL_MS", 100) / 1000,
+        )
+    if backend != "memory":
+        raise ValueError(f"⚠️ RUN_STORE_BACKEND 必须为 'memory' 或 'sqlite'，当前值: {backend}")
+    return MemoryRunStore(
+        ttl_seconds=ttl_seconds,
+        max_runs=max_runs,
+        max_bytes=_env_int("RUN_STORE_MAX_BYTES", 256 * 1024 * 1024),
+        spill_dir=os.getenv("RUN_STORE_SPILL_DIR") or str(DEFAULT_SPILL_DIR),
+        spill_ttl_seconds=_env_int("RUN_STORE_SPILL_TTL_SECONDS", 7 * 24 * 3600),
+        spill_max_runs=_env_int("RUN_STORE_SPILL_MAX_RUNS", 0),
+        spill_max_bytes=_env_int("RUN_STORE_SPILL_MAX_BYTES", 1024 * 1024 * 1024),
+        spill_sweep_interval=_env_int("RUN_STORE_SPILL_SWEEP_SECONDS", 300),
+    )
+
 
-run_store = RunStore()
+run_store = _create_run_store()
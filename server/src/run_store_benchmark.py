@@ -0,0 +1,182 @@
+"""
+Soak check for the bounded in-memory RunStore.
+
+Pushes many short runs through ``MemoryRunStore`` the way the run endpoints
+do (create, publish node events with a GeoJSON-sized payload, finish and
+spill the result) and samples traced Python memory, resident run count and
+the number of spill files along the way. After warm-up memory must stay
+within ``--tolerance`` of the first sample and resident runs at or under
+``--max-runs``.
+
+Eviction only drops the in-memory record, so once the soak is done the
+earliest run the spill retention keeps (the very first one unless
+``--spill-max-runs`` is set) must still load from disk with its result and
+``$ref`` artifacts intact, and a retention sweep must leave at most
+``--spill-max-runs`` spill files.
+
+    python -m src.run_store_benchmark
+    python -m src.run_store_benchmark --runs 100000 --max-runs 200 --samples 10
+    python -m src.run_store_benchmark --runs 20000 --pois 150 --spill-max-runs 5000
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.run_store import MemoryRunStore
+
+
+def build_result(run_index: int, pois: int) -> Dict[str, Any]:
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [103.85 + i * 1e-4, 1.29 + i * 1e-4]},
+            "properties": {"name": f"POI {run_index}-{i}", "day": f"D{i % 5 + 1}", "order": i + 1},
+        }
+        for i in range(pois)
+    ]
+    return {
+        "session_id": f"soak-{run_index}",
+        "geojson": {"type": "FeatureCollection", "features": features},
+        "style_code": {"layers": [{"id": f"layer-{i}", "paint": {"color": "#336699"}} for i in range(8)]},
+    }
+
+
+def run_id(run_index: int) -> str:
+    return f"soak-{run_index:08d}"
+
+
+async def run_once(store: MemoryRunStore, run_index: int, events: int, pois: int) -> List[str]:
+    """Run one soak iteration; returns the ids of the ``$ref`` artifacts it published."""
+    record = await store.create(run_id(run_index))
+    result = build_result(run_index, pois)
+    for event_index in range(events):
+        record.publish(
+            {
+                "type": "node_completed",
+                "run_id": record.run_id,
+                "node_id": "geojson",
+                "payload": {"step": event_index, "geojson": result["geojson"]},
+            }
+        )
+    record.result = result
+    record.publish({"type": "workflow_completed", "run_id": record.run_id, "payload": result})
+    artifact_ids = list(record.artifacts)
+    await store.finish(record)
+    return artifact_ids
+
+
+def count_spill_files(spill_dir: str) -> int:
+    return sum(1 for name in os.listdir(spill_dir) if name.endswith(".json"))
+
+
+async def soak(args, spill_dir: str) -> Dict[str, Any]:
+    store = MemoryRunStore(
+        ttl_seconds=0,
+        max_runs=args.max_runs,
+        max_bytes=args.max_bytes,
+        spill_dir=spill_dir,
+        spill_ttl_seconds=0,
+        spill_max_runs=args.spill_max_runs,
+        spill_max_bytes=0,
+    )
+    checkpoints = {max(1, args.runs * (i + 1) // args.samples) for i in range(args.samples)}
+    # The oldest run the spill retention has to keep.
+    earliest = max(1, args.runs - args.spill_max_runs + 1) if args.spill_max_runs else 1
+    earliest_artifacts: List[str] = []
+    samples = []
+    start = time.perf_counter()
+    for run_index in range(1, args.runs + 1):
+        artifact_ids = await run_once(store, run_index, args.events, args.pois)
+        if run_index == earliest:
+            earliest_artifacts = artifact_ids
+        if run_index in checkpoints:
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            stats = store.stats()
+            samples.append(
+                {
+                    "runs_done": run_index,
+                    "traced_bytes": current,
+                    "resident_runs": stats["runs"],
+                    "buffered_bytes": stats["buffered_bytes"],
+                    "spill_files": count_spill_files(spill_dir),
+                    "elapsed": time.perf_counter() - start,
+                }
+            )
+            sample = samples[-1]
+            print(
+                f"   {run_index:>8} runs  {sample['traced_bytes'] / 1024 / 1024:>8.2f} MiB traced  "
+                f"{sample['resident_runs']:>5} 常驻  {sample['spill_files']:>7} 落盘文件  {sample['elapsed']:>7.1f} s"
+            )
+
+    await asyncio.to_thread(store._sweep_spill_dir, set(store._runs))
+    snapshot = await store.load(run_id(earliest))
+    artifacts = [await store.get_artifact(run_id(earliest), artifact_id) for artifact_id in earliest_artifacts]
+    return {
+        "samples": samples,
+        "evictions": sum(store.evictions.values()),
+        "earliest": earliest,
+        "reloaded": bool(
+            snapshot
+            and snapshot.get("done")
+            and (snapshot.get("result") or {}).get("session_id") == f"soak-{earliest}"
+        ),
+        "artifacts": len(earliest_artifacts),
+        "artifacts_reloaded": all(artifacts),
+        "spill_files": count_spill_files(spill_dir),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MemoryRunStore 长时间运行检查：内存、常驻 run 数与落盘文件数应保持平稳。")
+    parser.add_argument("--runs", type=int, default=100000, help="依次执行的 run 数量。")
+    parser.add_argument("--events", type=int, default=4, help="每个 run 发布的节点事件数。")
+    parser.add_argument("--pois", type=int, default=40, help="每个 run 结果中的 POI 数量。")
+    parser.add_argument("--max-runs", type=int, default=200, help="RunStore 保留的 run 上限。")
+    parser.add_argument("--max-bytes", type=int, default=64 * 1024 * 1024, help="RunStore 缓冲字节上限。")
+    parser.add_argument("--spill-max-runs", type=int, default=0, help="落盘保留的 run 上限，0 表示不限（保留全部以便重载最早的 run）。")
+    parser.add_argument("--samples", type=int, default=10, help="采样次数。")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="相对首个采样允许的内存增长比例。")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"🧪 {args.runs} 个 run，每个 {args.events} 个事件、{args.pois} 个 POI，上限 {args.max_runs} 个 run")
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory(prefix="runstore-soak-") as spill_dir:
+        report = asyncio.run(soak(args, spill_dir))
+    tracemalloc.stop()
+
+    # The first sample is taken once the store is already at capacity; later ones must not grow from it.
+    samples = report["samples"]
+    baseline, final = samples[0], samples[-1]
+    peak_traced = max(sample["traced_bytes"] for sample in samples)
+    memory_flat = peak_traced <= baseline["traced_bytes"] * (1 + args.tolerance)
+    runs_bounded = all(sample["resident_runs"] <= args.max_runs for sample in samples)
+    spill_bounded = not args.spill_max_runs or report["spill_files"] <= args.spill_max_runs
+    reloaded = report["reloaded"] and report["artifacts_reloaded"]
+
+    print(f"\n📈 traced 内存: 首个采样 {baseline['traced_bytes'] / 1024 / 1024:.2f} MiB，峰值 {peak_traced / 1024 / 1024:.2f} MiB，"
+          f"最终 {final['traced_bytes'] / 1024 / 1024:.2f} MiB  {'✅ 平稳' if memory_flat else '❌ 持续增长'}")
+    print(f"🗂️ 常驻 run 最多 {max(s['resident_runs'] for s in samples)}  {'✅' if runs_bounded else '❌'}")
+    print(f"💾 回收后落盘文件 {report['spill_files']}"
+          f"{f'（上限 {args.spill_max_runs}）' if args.spill_max_runs else ''}  {'✅' if spill_bounded else '❌'}")
+    print(f"♻️ 淘汰 {report['evictions']} 次后重载 {run_id(report['earliest'])}：结果 {'✅' if report['reloaded'] else '❌'}，"
+          f"{report['artifacts']} 个 $ref artifact {'✅' if report['artifacts_reloaded'] else '❌'}")
+
+    if not (memory_flat and runs_bounded and spill_bounded and reloaded):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmark and consistency check for GeoJSON schema validation.
+
+Consistency: random FeatureCollections with injected defects (null or empty
+coordinates, wrong literals, missing keys, non-object items) are validated
+with the full model path and the verdict-only path; both must return the same
+verdict and error list, and the level-wise coordinate walk must agree with
+the recursive one it replaced.
+
+Benchmark: collections with a few very long routes (10k vertices by default)
+and with many POIs, validated by the recursive-walk models as they were
+before, the current full report and ``verdict_only``.
+
+    python -m src.schema_validation_benchmark
+    python -m src.schema_validation_benchmark --vertices 50000 --pois 10000 --repeat 5
+"""
+
+import argparse
+import copy
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from pydantic import Field, ValidationError, field_validator
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.schemas.geo_schema import Feature, GeoFeatureCollection, Geometry, _contains_empty_or_null
+from src.validators.schema_validators import validate_geojson
+
+
+def legacy_contains_empty_or_null(value: Any) -> bool:
+    """The recursive coordinate walk as it was before the level-wise one."""
+    if value is None:
+        return True
+    if isinstance(value, list):
+        if len(value) == 0:
+            return True
+        return any(legacy_contains_empty_or_null(item) for item in value)
+    return False
+
+
+class LegacyGeometry(Geometry):
+    @field_validator("coordinates")
+    @classmethod
+    def coordinates_must_not_be_empty(cls, value: Any) -> Any:
+        if legacy_contains_empty_or_null(value):
+            raise ValueError("coordinates must not contain null or empty arrays")
+        return value
+
+
+class LegacyFeature(Feature):
+    geometry: LegacyGeometry
+
+
+class LegacyFeatureCollection(GeoFeatureCollection):
+    features: List[LegacyFeature] = Field(default_factory=list)
+
+
+def legacy_validate(data: Dict[str, Any]) -> bool:
+    try:
+        LegacyFeatureCollection.model_validate(data)
+    except ValidationError:
+        return False
+    return True
+
+
+def build_collection(routes: int, vertices: int, pois: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[round(103.6 + rng.random() * 0.4, 6), round(1.2 + rng.random() * 0.25, 6)] for _ in range(vertices)],
+            },
+            "properties": {"visual_id": f"route_D{day + 1}", "day": f"D{day + 1}"},
+        }
+        for day in range(routes)
+    ]
+    features += [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(103.6 + rng.random() * 0.4, 6), round(1.2 + rng.random() * 0.25, 6)]},
+            "properties": {"visual_id": "point_scenic", "name": f"POI {index}", "day": f"D{index % max(routes, 1) + 1}"},
+        }
+        for index in range(pois)
+    ]
+    return {
+        "type": "FeatureCollection",
+        "global_properties": [{"visual_id": "global_title", "title": "新加坡五日游"}],
+        "features": features,
+    }
+
+
+def _random_feature(rng: random.Random) -> Dict[str, Any]:
+    if rng.random() < 0.5:
+        return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [103.8, 1.29]}, "properties": {"name": "鱼尾狮公园"}}
+    coordinates = [[103.8 + i * 0.01, 1.29] for i in range(rng.randint(2, 6))]
+    return {"type": "Feature", "geometry": {"type": "LineString", "coordinates": coordinates}, "properties": {"day": "D1"}}
+
+
+def _break(feature: Any, rng: random.Random) -> Any:
+    roll = rng.random()
+    geometry = feature["geometry"]
+    coordinates = geometry["coordinates"]
+    if roll < 0.15:
+        target = coordinates[rng.randrange(len(coordinates))] if isinstance(coordinates[0], list) else coordinates
+        target[rng.randrange(len(target))] = None
+    elif roll < 0.3:
+        if isinstance(coordinates[0], list):
+            coordinates[rng.randrange(len(coordinates))] = []
+        else:
+            geometry["coordinates"] = []
+    elif roll < 0.4:
+        geometry["coordinates"] = None
+    elif roll < 0.5:
+        geometry["type"] = "Polygon"
+    elif roll < 0.6:
+        del geometry["coordinates"]
+    elif roll < 0.7:
+        feature["properties"] = []
+    elif roll < 0.8:
+        feature["type"] = "feature"
+    elif roll < 0.9:
+        return rng.choice(["Feature", 3, None])
+    else:
+        geometry["coordinates"] = "103.8,1.29"
+    return feature
+
+
+def fuzz_collection(rng: random.Random) -> Dict[str, Any]:
+    features = [_random_feature(rng) for _ in range(rng.randint(0, 5))]
+    features = [_break(feature, rng) if rng.random() < 0.3 else feature for feature in features]
+    data: Dict[str, Any] = {"type": "FeatureCollection" if rng.random() < 0.9 else "Feature", "features": features}
+    if rng.random() < 0.3:
+        data["global_properties"] = [{"title": rng.choice(["标题", None, 3])}]
+    if rng.random() < 0.05:
+        del data["features"]
+    return data
+
+
+def median_ms(repeat: int, func: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="GeoJSON schema 校验的一致性检查与性能基准。")
+    parser.add_argument("--cases", type=int, default=3000, help="一致性检查的随机用例数。")
+    parser.add_argument("--routes", type=int, default=5, help="长路线条数（每天一条）。")
+    parser.add_argument("--vertices", type=int, default=10000, help="每条路线的顶点数。")
+    parser.add_argument("--pois", type=int, default=5000, help="多 POI 场景的 Point 数。")
+    parser.add_argument("--repeat", type=int, default=7, help="基准重复次数，取中位数。")
+    parser.add_argument("--seed", type=int, default=17, help="随机种子。")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    mismatches: List[Dict[str, Any]] = []
+    invalid = 0
+    for _ in range(args.cases):
+        data = fuzz_collection(rng)
+        full = validate_geojson(copy.deepcopy(data))
+        fast = validate_geojson(copy.deepcopy(data), verdict_only=True)
+        invalid += not full["valid"]
+        walks_agree = all(
+            _contains_empty_or_null(feature["geometry"]["coordinates"]) == legacy_contains_empty_or_null(feature["geometry"]["coordinates"])
+            for feature in data.get("features", [])
+            if isinstance(feature, dict) and isinstance(feature.get("geometry"), dict) and "coordinates" in feature["geometry"]
+        )
+        if (full["valid"], full["errors"]) != (fast["valid"], fast["errors"]) or legacy_validate(data) != full["valid"] or not walks_agree:
+            mismatches.append(data)
+    print(f"🎲 一致性检查 {args.cases} 例（其中 {invalid} 例不合法）: 不一致 {len(mismatches)}")
+
+    scenarios = [
+        (f"{args.routes} 条 × {args.vertices} 顶点路线", build_collection(args.routes, args.vertices, 0, args.seed)),
+        (f"{args.pois} 个 POI", build_collection(1, 10, args.pois, args.seed)),
+        ("典型结果（3 天 15 个 POI）", build_collection(3, 6, 15, args.seed)),
+    ]
+    print(f"\n⏱️ GeoJSON schema 校验（{args.repeat} 次中位数）")
+    for label, data in scenarios:
+        legacy_ms = median_ms(args.repeat, lambda: legacy_validate(data))
+        full_ms = median_ms(args.repeat, lambda: validate_geojson(data))
+        fast_ms = median_ms(args.repeat, lambda: validate_geojson(data, verdict_only=True))
+        print(f"   {label:<24} 旧实现 {legacy_ms:>8.2f} ms  完整报告 {full_ms:>8.2f} ms  仅结论 {fast_ms:>8.2f} ms")
+
+    if mismatches:
+        print(f"\n❌ 不一致的样例:\n{mismatches[0]}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
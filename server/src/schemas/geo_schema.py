@@ -1,16 +1,36 @@
+from itertools import chain
 from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, field_validator
+from typing_extensions import Annotated, NotRequired, TypedDict
 
 
 def _contains_empty_or_null(value: Any) -> bool:
-    if value is None:
-        return True
-    if isinstance(value, list):
-        if len(value) == 0:
+    """Walk nested coordinate arrays one nesting level at a time.
+
+    Each level is checked with C-level ``None in`` / ``all`` and flattened with
+    ``chain``, so a 10k-vertex LineString costs a few list passes instead of
+    one Python call per vertex.
+    """
+    if not isinstance(value, list):
+        return value is None
+    level = value
+    while True:
+        if not level or None in level:
             return True
-        return any(_contains_empty_or_null(item) for item in value)
-    return False
+        if set(map(type, level)) != {list}:
+            level = [item for item in level if isinstance(item, list)]
+            if not level:
+                return False
+        if not all(level):
+            return True
+        level = list(chain.from_iterable(level))
+
+
+def _check_coordinates(value: Any) -> Any:
+    if _contains_empty_or_null(value):
+        raise ValueError("coordinates must not contain null or empty arrays")
+    return value
 
 
 class Geometry(BaseModel):
@@ -22,9 +42,7 @@ class Geometry(BaseModel):
     @field_validator("coordinates")
     @classmethod
     def coordinates_must_not_be_empty(cls, value: Any) -> Any:
-        if _contains_empty_or_null(value):
-            raise ValueError("coordinates must not contain null or empty arrays")
-        return value
+        return _check_coordinates(value)
 
 
 class Feature(BaseModel):
@@ -58,3 +76,46 @@ class GeoFeatureCollection(BaseModel):
         if not value:
             raise ValueError("features must not be empty")
         return value
+
+
+# Plain-dict mirror of the models above for verdict-only validation: the same
+# constraints compiled into one pydantic-core validator, without building a
+# model instance per feature. Only the verdict is taken from it; error reports
+# always come from the models, whose messages name the model classes.
+def _features_not_empty(value: List[Any]) -> List[Any]:
+    if not value:
+        raise ValueError("features must not be empty")
+    return value
+
+
+class GeometryDict(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    type: Literal["Point", "LineString"]
+    coordinates: Annotated[Any, AfterValidator(_check_coordinates)]
+
+
+class FeatureDict(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    type: Literal["Feature"]
+    geometry: GeometryDict
+    properties: NotRequired[Dict[str, Any]]
+
+
+class GlobalPropertyDict(TypedDict, total=False):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    title: Optional[str]
+    description: Optional[str]
+    script: Optional[str]
+    extra_info: Optional[str]
+    visual_id: Optional[str]
+
+
+class GeoFeatureCollectionDict(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    type: Literal["FeatureCollection"]
+    features: NotRequired[Annotated[List[FeatureDict], AfterValidator(_features_not_empty)]]
+    global_properties: NotRequired[List[GlobalPropertyDict]]
@@ -0,0 +1,247 @@
+"""
+Summarize ``session_trace.json`` files written by traced agent runs.
+
+One session prints a flame-style tree: sibling spans with the same name are
+merged into one frame showing call count, total and self time. Several
+sessions (or ``--all``) print an aggregate table per span name.
+
+    python -m src.trace_report output/20260101_120000_session_1
+    python -m src.trace_report --all --output-dir output
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import json_codec
+from src.utils.tracing import TRACE_FILE
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output")
+BAR_WIDTH = 30
+
+
+@dataclass
+class TraceSpan:
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_ns: int
+    end_ns: int
+    attributes: Dict[str, Any]
+    error: bool
+    children: List["TraceSpan"] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def self_ms(self) -> float:
+        # Children can overlap (parallel graph branches), so subtract their union.
+        covered = 0
+        cursor = self.start_ns
+        for child in sorted(self.children, key=lambda s: s.start_ns):
+            start = max(child.start_ns, cursor)
+            end = min(child.end_ns, self.end_ns)
+            if end > start:
+                covered += end - start
+                cursor = end
+        return max(0, self.end_ns - self.start_ns - covered) / 1e6
+
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def load_trace(path: str) -> List[TraceSpan]:
+    """Return the root spans of an OTLP/JSON trace file with children attached."""
+    document = json_codec.load_file(path)
+    spans: Dict[str, TraceSpan] = {}
+    for resource in document.get("resourceSpans", []):
+        for scope in resource.get("scopeSpans", []):
+            for raw in scope.get("spans", []):
+                spans[raw["spanId"]] = TraceSpan(
+                    span_id=raw["spanId"],
+                    parent_id=raw.get("parentSpanId"),
+                    name=raw["name"],
+                    start_ns=int(raw["startTimeUnixNano"]),
+                    end_ns=int(raw["endTimeUnixNano"]),
+                    attributes={a["key"]: _attribute_value(a["value"]) for a in raw.get("attributes", [])},
+                    error=raw.get("status", {}).get("code") == 2,
+                )
+    roots = []
+    for span in spans.values():
+        parent = spans.get(span.parent_id) if span.parent_id else None
+        if parent is None:
+            roots.append(span)
+        else:
+            parent.children.append(span)
+    return sorted(roots, key=lambda s: s.start_ns)
+
+
+def resolve_trace_path(target: str, output_dir: str) -> str:
+    """Accept a trace file, a session directory or a session directory name."""
+    candidates = [target, os.path.join(target, TRACE_FILE), os.path.join(output_dir, target, TRACE_FILE)]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"找不到追踪文件: {target}")
+
+
+def discover_traces(output_dir: str) -> List[str]:
+    paths = []
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name, TRACE_FILE)
+        if os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+
+def _span_label(span: TraceSpan) -> str:
+    # Distinguish LLM calls by node so the breakdown shows which prompt waited.
+    node = span.attributes.get("node")
+    return f"{span.name}[{node}]" if node and span.name == "llm.invoke" else span.name
+
+
+@dataclass
+class _Frame:
+    label: str
+    count: int = 0
+    total_ms: float = 0.0
+    self_ms: float = 0.0
+    errors: int = 0
+    spans: List[TraceSpan] = field(default_factory=list)
+
+
+def _merge_frames(spans: List[TraceSpan]) -> List[_Frame]:
+    frames: Dict[str, _Frame] = {}
+    for span in sorted(spans, key=lambda s: s.start_ns):
+        label = _span_label(span)
+        frame = frames.get(label)
+        if frame is None:
+            frame = frames[label] = _Frame(label)
+        frame.count += 1
+        frame.total_ms += span.duration_ms
+        frame.self_ms += span.self_ms
+        frame.errors += int(span.error)
+        frame.spans.append(span)
+    return list(frames.values())
+
+
+def print_flame(roots: List[TraceSpan], min_ms: float = 0.0) -> None:
+    run_ms = sum(root.duration_ms for root in roots) or 1.0
+
+    def walk(spans: List[TraceSpan], depth: int) -> None:
+        for frame in _merge_frames(spans):
+            if frame.total_ms < min_ms:
+                continue
+            share = frame.total_ms / run_ms
+            bar = "█" * round(share * BAR_WIDTH)
+            count = f" ×{frame.count}" if frame.count > 1 else ""
+            error = f"  ❌{frame.errors}" if frame.errors else ""
+            name = f"{'  ' * depth}{frame.label}{count}"
+            print(
+                f"{name:<48} {frame.total_ms:>10.1f} ms  self {frame.self_ms:>9.1f} ms  "
+                f"{share * 100:>5.1f}%  {bar}{error}"
+            )
+            walk([child for span in frame.spans for child in span.children], depth + 1)
+
+    walk(roots, 0)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_aggregate(traces: Dict[str, List[TraceSpan]]) -> None:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    self_times: Dict[str, float] = defaultdict(float)
+    sessions: Dict[str, set] = defaultdict(set)
+    run_total = 0.0
+
+    def walk(session: str, span: TraceSpan) -> None:
+        label = _span_label(span)
+        durations[label].append(span.duration_ms)
+        self_times[label] += span.self_ms
+        sessions[label].add(session)
+        for child in span.children:
+            walk(session, child)
+
+    for session, roots in traces.items():
+        for root in roots:
+            run_total += root.duration_ms
+            walk(session, root)
+
+    run_total = run_total or 1.0
+    print(f"{'span':<40} {'会话':>5} {'次数':>6} {'总计 ms':>11} {'自身 ms':>11} {'均值':>9} {'p50':>9} {'p95':>9} {'自身占比':>8}")
+    for label in sorted(durations, key=lambda key: self_times[key], reverse=True):
+        values = durations[label]
+        print(
+            f"{label:<40} {len(sessions[label]):>5} {len(values):>6} {sum(values):>11.1f} "
+            f"{self_times[label]:>11.1f} {sum(values) / len(values):>9.1f} {_percentile(values, 0.5):>9.1f} "
+            f"{_percentile(values, 0.95):>9.1f} {self_times[label] / run_total * 100:>7.1f}%"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="查看 MapLayout 会话的追踪耗时分解。")
+    parser.add_argument(
+        "sessions",
+        nargs="*",
+        help="会话目录、会话目录名或 session_trace.json 路径；传入多个时输出汇总表。",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="汇总输出目录下所有带追踪文件的会话。",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=DEFAULT_OUTPUT_DIR,
+        help="会话输出目录，默认 server/output。",
+    )
+    parser.add_argument(
+        "--min-ms",
+        type=float,
+        default=0.0,
+        help="单会话火焰视图中隐藏总耗时低于该值的帧。",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.all:
+        paths = discover_traces(args.output_dir)
+    else:
+        paths = [resolve_trace_path(target, args.output_dir) for target in args.sessions]
+    if not paths:
+        raise SystemExit("没有找到追踪文件；运行时设置 RUN_TRACING=true 以生成 session_trace.json")
+
+    if len(paths) == 1:
+        print(f"🔥 {paths[0]}")
+        print_flame(load_trace(paths[0]), min_ms=args.min_ms)
+        return
+
+    traces = {os.path.basename(os.path.dirname(path)): load_trace(path) for path in paths}
+    print(f"📊 共汇总 {len(traces)} 个会话")
+    print_aggregate(traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Rank LLM token and payload usage recorded in ``session_manifest.json`` files.
+
+Reads the ``llm_usage`` block written by every run and prints the biggest
+consumers across sessions: per node (prompt), per session and the heaviest
+individual calls, plus Node 3 QA-retry calls split by retry mode (JSON Patch
+repair vs full regeneration).
+
+    python -m src.usage_report
+    python -m src.usage_report --output-dir output --top 20 --sort request_bytes
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import json_codec
+from src.utils.llm_usage import summarize
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output")
+MANIFEST_FILE = "session_manifest.json"
+SORT_FIELDS = ("total_tokens", "prompt_tokens", "completion_tokens", "request_bytes", "response_bytes")
+
+
+def load_usage(output_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Return ``{session_dir_name: [call, ...]}`` for manifests that recorded usage."""
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            continue
+        try:
+            manifest = json_codec.load_file(path)
+        except (OSError, ValueError) as exc:
+            print(f"⚠️ 跳过无法读取的清单 {path}: {exc}")
+            continue
+        calls = (manifest.get("llm_usage") or {}).get("calls")
+        if calls:
+            sessions[name] = calls
+    return sessions
+
+
+def _kb(value: int) -> str:
+    return f"{value / 1024:.1f}"
+
+
+def _header(first: str, width: int) -> str:
+    return (
+        f"{first:<{width}} {'调用':>6} {'输入 tok':>10} {'输出 tok':>10} {'合计 tok':>10} "
+        f"{'请求 KB':>9} {'响应 KB':>9} {'估算':>5}"
+    )
+
+
+def _row(label: str, width: int, summary: Dict[str, Any]) -> str:
+    return (
+        f"{label:<{width}} {summary['calls']:>6} {summary['prompt_tokens']:>10} {summary['completion_tokens']:>10} "
+        f"{summary['total_tokens']:>10} {_kb(summary['request_bytes']):>9} {_kb(summary['response_bytes']):>9} "
+        f"{summary.get('estimated_calls', 0):>5}"
+    )
+
+
+def print_by_node(sessions: Dict[str, List[Dict[str, Any]]], sort: str) -> None:
+    by_node: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for calls in sessions.values():
+        for call in calls:
+            by_node[call.get("node") or "unknown"].append(call)
+    rows = sorted(((node, summarize(calls)) for node, calls in by_node.items()), key=lambda r: r[1][sort], reverse=True)
+    grand = summarize([call for calls in sessions.values() for call in calls])
+    print(_header("节点", 24) + f" {'占比':>7}")
+    for node, summary in rows:
+        share = summary[sort] / grand[sort] * 100 if grand[sort] else 0.0
+        print(_row(node, 24, summary) + f" {share:>6.1f}%")
+    print(_row("合计", 24, grand))
+
+
+def print_by_session(sessions: Dict[str, List[Dict[str, Any]]], sort: str, top: int) -> None:
+    rows = sorted(((name, summarize(calls)) for name, calls in sessions.items()), key=lambda r: r[1][sort], reverse=True)
+    print(_header("会话", 40))
+    for name, summary in rows[:top]:
+        print(_row(name, 40, summary))
+
+
+def print_top_calls(sessions: Dict[str, List[Dict[str, Any]]], sort: str, top: int) -> None:
+    calls: List[Tuple[str, Dict[str, Any]]] = [(name, call) for name, items in sessions.items() for call in items]
+    calls.sort(key=lambda item: item[1].get(sort) or 0, reverse=True)
+    print(f"{'会话':<40} {'节点':<24} {'轮次':>6} {'输入 tok':>10} {'输出 tok':>10} {'请求 KB':>9} {'来源':<9}")
+    for name, call in calls[:top]:
+        round_label = call.get("validation_round", "-")
+        if call.get("attempt") is not None:
+            round_label = f"{round_label}.{call['attempt']}"
+        print(
+            f"{name:<40} {call.get('node') or 'unknown':<24} {str(round_label):>6} {call.get('prompt_tokens', 0):>10} "
+            f"{call.get('completion_tokens', 0):>10} {_kb(call.get('request_bytes', 0)):>9} {call.get('token_source', '-'):<9}"
+        )
+
+
+def print_retry_modes(sessions: Dict[str, List[Dict[str, Any]]]) -> bool:
+    """Node 3 calls made for QA retries (validation_round > 0), grouped by ``mode``."""
+    by_mode: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for calls in sessions.values():
+        for call in calls:
+            if call.get("node") == "geojson_generation" and (call.get("validation_round") or 0) > 0:
+                by_mode[call.get("mode") or "regenerate"].append(call)
+    if not by_mode:
+        return False
+    print(f"{'模式':<12} {'调用':>6} {'平均输出 tok':>12} {'平均耗时 ms':>12} {'失败':>5}")
+    for mode, calls in sorted(by_mode.items()):
+        count = len(calls)
+        completion = sum(call.get("completion_tokens") or 0 for call in calls) / count
+        duration = sum(call.get("duration_ms") or 0 for call in calls) / count
+        failed = sum(1 for call in calls if call.get("outcome") not in (None, "ok"))
+        print(f"{mode:<12} {count:>6} {completion:>12.0f} {duration:>12.0f} {failed:>5}")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="统计 MapLayout 会话中 LLM 调用的 token 与请求体积。")
+    parser.add_argument(
+        "--output-dir",
+        default=DEFAULT_OUTPUT_DIR,
+        help="会话输出目录，默认 server/output。",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=SORT_FIELDS,
+        default="total_tokens",
+        help="排序字段，默认 total_tokens。",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="会话与单次调用排行各显示的条数。",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sessions = load_usage(args.output_dir)
+    if not sessions:
+        raise SystemExit(f"没有找到带 llm_usage 的会话清单: {args.output_dir}")
+
+    print(f"📊 共汇总 {len(sessions)} 个会话，按 {args.sort} 排序（估算 = 非服务端上报的调用数）")
+    print("\n🧩 按节点")
+    print_by_node(sessions, args.sort)
+    print("\n🗂️ 按会话")
+    print_by_session(sessions, args.sort, args.top)
+    print("\n🔝 单次调用")
+    print_top_calls(sessions, args.sort, args.top)
+    print("\n🩹 Node 3 QA 重试（按重试模式）")
+    if not print_retry_modes(sessions):
+        print("   无 QA 重试调用")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Atomic artifact writes that run off the event loop.
+
+Every write goes to a temp file in the target directory, is fsynced and then
+renamed over the destination, so a crash never leaves a torn artifact. Async
+endpoints hand writes to a dedicated I/O executor; repeated saves of the same
+path that arrive while a write is in flight are coalesced so only the latest
+content is written, and every caller resolves once that content is durable.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from . import json_codec
+
+
+def _read_umask() -> int:
+    # Linux reports the umask in /proc/self/status without touching it.
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    # Elsewhere it can only be read by setting it. Between the two calls the
+    # process-wide umask is 0, so a file another thread creates in that window
+    # (reloader, warm-up) would come out world-writable; this runs once, at
+    # import time.
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp creates 0600 files; artifacts get the mode a plain open() would give.
+_FILE_MODE = 0o666 & ~_read_umask()
+
+
+def apply_default_file_mode(fd: int) -> None:
+    """Give a ``mkstemp`` file the mode ``open()`` would have created it with."""
+    os.fchmod(fd, _FILE_MODE)
+
+
+def _fsync_directory(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Write ``data`` to ``path`` via temp file + fsync + rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            apply_default_file_mode(f.fileno())
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def atomic_write_json(path: str, content: Any, *, pretty: bool | None = None) -> None:
+    atomic_write_bytes(path, json_codec.dumps(content, pretty=pretty))
+
+
+@dataclass
+class _PendingWrite:
+    encode: Callable[[], bytes]
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class _PathState:
+    running: bool = False
+    queued: Optional[_PendingWrite] = None
+
+
+class ArtifactWriter:
+    """Coalescing atomic writer backed by a dedicated I/O thread pool."""
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifact-io")
+        self._lock = threading.Lock()
+        self._paths: Dict[str, _PathState] = {}
+
+    def submit(self, path: str, encode: Callable[[], bytes]) -> Future:
+        """Schedule a write; ``encode`` runs on the I/O thread right before writing."""
+        path = os.path.abspath(path)
+        with self._lock:
+            state = self._paths.get(path)
+            if state is None:
+                state = self._paths[path] = _PathState()
+            if state.running:
+                # A write for this path is in flight: replace whatever is queued
+                # behind it so only the newest content hits the disk.
+                if state.queued is None:
+                    state.queued = _PendingWrite(encode)
+                else:
+                    state.queued.encode = encode
+                return state.queued.future
+            state.running = True
+            pending = _PendingWrite(encode)
+        self._executor.submit(self._run, path, pending)
+        return pending.future
+
+    def _run(self, path: str, pending: _PendingWrite) -> None:
+        try:
+            atomic_write_bytes(path, pending.encode())
+        except BaseException as exc:
+            pending.future.set_exception(exc)
+        else:
+            pending.future.set_result(path)
+
+        with self._lock:
+            state = self._paths[path]
+            next_pending, state.queued = state.queued, None
+            if next_pending is None:
+                del self._paths[path]
+        if next_pending is not None:
+            self._executor.submit(self._run, path, next_pending)
+
+    def pending(self) -> int:
+        """Number of paths with a write in flight or queued."""
+        with self._lock:
+            return len(self._paths)
+
+    async def write_bytes(self, path: str, data: bytes) -> str:
+        return await asyncio.wrap_future(self.submit(path, lambda: data))
+
+    async def write_json(self, path: str, content: Any, *, pretty: bool | None = None) -> str:
+        """Serialize and atomically write ``content``; returns once it is durable."""
+        return await asyncio.wrap_future(
+            self.submit(path, lambda: json_codec.dumps(content, pretty=pretty))
+        )
+
+
+def _max_workers() -> int:
+    try:
+        return max(1, int(os.getenv("ARTIFACT_IO_WORKERS", "4")))
+    except ValueError:
+        return 4
+
+
+artifact_writer = ArtifactWriter(max_workers=_max_workers())
@@ -0,0 +1,161 @@
+"""
+Durable LangGraph checkpointer for resumable agent runs.
+
+The compiled workflow checkpoints its channel values after every superstep
+(plus per-task pending writes) into a local SQLite database, keyed by the run's
+session id as ``thread_id``. After a crash or restart the run can continue from
+the last completed node without re-invoking nodes that already finished.
+
+Checkpoints of a successful run are deleted when it finishes. Failed or
+abandoned runs keep theirs so they can be resumed, until their thread has
+been idle for ``RUN_CHECKPOINT_TTL_SECONDS``; a side table records when each
+thread last started or resumed, and runs sweep expired threads as they start.
+
+Requires the optional ``langgraph-checkpoint-sqlite`` package; without it runs
+work as before but cannot be resumed.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+DEFAULT_CHECKPOINT_PATH = Path(__file__).resolve().parents[2] / "output" / ".runstore" / "checkpoints.sqlite3"
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+RUN_CHECKPOINT_TTL_SECONDS = _env_int("RUN_CHECKPOINT_TTL_SECONDS", 7 * 24 * 3600)
+SWEEP_INTERVAL_SECONDS = 600
+
+_ACTIVITY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_activity (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+_checkpointer = None
+_activity_conn: Optional[sqlite3.Connection] = None
+_last_sweep = 0.0
+
+
+@lru_cache(maxsize=1)
+def _sqlite_saver_class():
+    # Imported on first use: langgraph is heavy and app.py must start without it.
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:  # optional durable checkpoint backend
+        return None
+    return SqliteSaver
+
+
+def checkpointing_enabled() -> bool:
+    value = os.getenv("RUN_CHECKPOINTS", "true").strip().lower()
+    return value not in {"0", "false", "no", "off"} and _sqlite_saver_class() is not None
+
+
+def get_checkpointer():
+    """Process-wide SqliteSaver shared by all agents, or ``None`` when unavailable."""
+    global _checkpointer, _activity_conn
+    if not checkpointing_enabled():
+        return None
+    with _lock:
+        if _checkpointer is None:
+            path = os.getenv("RUN_CHECKPOINT_PATH") or str(DEFAULT_CHECKPOINT_PATH)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            _checkpointer = _sqlite_saver_class()(conn, serde=_serializer())
+            _activity_conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            _activity_conn.executescript(_ACTIVITY_SCHEMA)
+        return _checkpointer
+
+
+def _serializer():
+    # AgentState is checkpointed as a pydantic model; register it so newer
+    # langgraph versions deserialize it without the unregistered-type warning.
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=[("src.utils.agent_utils", "AgentState")])
+    except TypeError:
+        return JsonPlusSerializer()
+
+
+def thread_config(session_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": session_id}}
+
+
+def delete_thread(checkpointer: Optional[Any], session_id: str) -> None:
+    """Drop a finished run's checkpoints; older langgraph versions keep them."""
+    if checkpointer is None or not hasattr(checkpointer, "delete_thread"):
+        return
+    try:
+        checkpointer.delete_thread(session_id)
+    except Exception as exc:
+        print(f"⚠️ 清理检查点失败 {session_id}: {exc}")
+        return
+    _execute_activity("DELETE FROM thread_activity WHERE thread_id = ?", (session_id,))
+
+
+def _execute_activity(sql: str, params: tuple = ()) -> list:
+    if _activity_conn is None:
+        return []
+    try:
+        with _lock:
+            return _activity_conn.execute(sql, params).fetchall()
+    except sqlite3.Error as exc:
+        print(f"⚠️ 检查点活动记录读写失败: {exc}")
+        return []
+
+
+def touch_thread(checkpointer: Optional[Any], session_id: str) -> None:
+    """Record that ``session_id`` started or resumed now, restarting its TTL."""
+    if checkpointer is None or not RUN_CHECKPOINT_TTL_SECONDS:
+        return
+    _execute_activity(
+        "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+        (session_id, time.time()),
+    )
+
+
+def sweep_expired_threads(checkpointer: Optional[Any]) -> int:
+    """Delete checkpoints of threads idle for longer than the TTL; runs at most every ``SWEEP_INTERVAL_SECONDS``."""
+    global _last_sweep
+    if checkpointer is None or not RUN_CHECKPOINT_TTL_SECONDS or not hasattr(checkpointer, "delete_thread"):
+        return 0
+    now = time.time()
+    with _lock:
+        if now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+            return 0
+        _last_sweep = now
+    # Threads checkpointed before activity was tracked start their TTL now;
+    # the saver creates its tables on first write.
+    if _execute_activity("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'"):
+        _execute_activity(
+            "INSERT OR IGNORE INTO thread_activity (thread_id, updated_at)"
+            " SELECT DISTINCT thread_id, ? FROM checkpoints",
+            (now,),
+        )
+    expired = [
+        row[0]
+        for row in _execute_activity(
+            "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+            (now - RUN_CHECKPOINT_TTL_SECONDS,),
+        )
+    ]
+    for thread_id in expired:
+        delete_thread(checkpointer, thread_id)
+    if expired:
+        print(f"🧹 已清理 {len(expired)} 个过期运行检查点")
+    return len(expired)
@@ -0,0 +1,103 @@
+"""
+Input fingerprints for incremental downstream reruns.
+
+Each downstream node records a fingerprint of the inputs it was last computed
+from in ``node_fingerprints.json`` inside the session directory. A rerun
+recomputes a node only when the fingerprint of its current inputs differs;
+otherwise the previous artifact is reused.
+
+Node 3 and validation fingerprints include the prompt version (for Node 3 it
+follows ``GEOJSON_OUTPUT_SCHEMA``), the model and, for validation,
+``VALIDATION_MODE``. Node 3 also reads ``user_text`` (known-POI checks) and
+the global title/description (fallback ``global_properties``).
+
+The style fingerprint covers the whole GeoJSON, because Node 4 sends the
+full FeatureCollection (names, label text and coordinates included) to the
+style LLM; any edit it could react to invalidates the generated styles.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from . import json_codec
+from .artifact_writer import atomic_write_json
+
+
+FINGERPRINT_FILE = "node_fingerprints.json"
+
+
+def fingerprint(value: Any) -> str:
+    return hashlib.sha256(json_codec.dumps(value, pretty=False, sort_keys=True)).hexdigest()[:16]
+
+
+def geojson_inputs(
+    intent_enriched: Optional[str],
+    user_text: Optional[str],
+    global_title: Optional[str],
+    global_description: Optional[str],
+    prompt_version: str,
+    model: Optional[str],
+) -> str:
+    return fingerprint(
+        {
+            "intent_enriched": intent_enriched,
+            "user_text": user_text,
+            "global_title": global_title,
+            "global_description": global_description,
+            "prompt_version": prompt_version,
+            "model": model,
+        }
+    )
+
+
+def validation_inputs(
+    user_text: Optional[str],
+    geojson_data: Any,
+    prompt_version: str,
+    mode: str,
+    model: Optional[str],
+) -> str:
+    return fingerprint(
+        {
+            "user_text": user_text,
+            "geojson": geojson_data,
+            "prompt_version": prompt_version,
+            "mode": mode,
+            "model": model,
+        }
+    )
+
+
+def style_inputs(
+    visual_structure: Any,
+    geojson_data: Any,
+    image_path: Optional[str],
+    prompt_version: str,
+) -> str:
+    return fingerprint(
+        {
+            "visual_structure": visual_structure,
+            "geojson": geojson_data,
+            "image": os.path.basename(image_path) if image_path else None,
+            "prompt_version": prompt_version,
+        }
+    )
+
+
+def load_fingerprints(session_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(session_dir, FINGERPRINT_FILE)
+    if not os.path.isfile(path):
+        return None
+    try:
+        data = json_codec.load_file(path)
+    except (OSError, ValueError) as exc:
+        print(f"⚠️ 读取 {FINGERPRINT_FILE} 失败: {exc}")
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def save_fingerprints(session_dir: str, fingerprints: Dict[str, Any]) -> str:
+    path = os.path.join(session_dir, FINGERPRINT_FILE)
+    atomic_write_json(path, fingerprints)
+    return path
@@ -0,0 +1,259 @@
+"""
+Reference image normalization before VLM calls.
+
+Each reference image gets one normalized rendition per content hash: EXIF
+orientation applied, longest edge capped at ``VLM_IMAGE_MAX_EDGE`` and
+re-encoded (JPEG, or PNG when the image has transparency). Renditions are
+cached on disk next to the source image under ``.normalized/``.
+
+``AgentState`` only carries an image handle (``image_ref``). The data URL lives
+once per process in ``image_buffers``: a run pins the handle for its lifetime,
+nodes resolve it lazily, and released buffers are kept in a small LRU so the
+next run referencing the same image hits immediately.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+from .artifact_writer import atomic_write_bytes
+from .tracing import span
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+VLM_IMAGE_MAX_EDGE = _env_int("VLM_IMAGE_MAX_EDGE", 1568)
+VLM_IMAGE_QUALITY = min(95, max(30, _env_int("VLM_IMAGE_QUALITY", 85)))
+IMAGE_BUFFER_IDLE_CAPACITY = _env_int("IMAGE_BUFFER_IDLE_CAPACITY", 8)
+
+
+@dataclass
+class NormalizedImage:
+    sha256: str
+    media_type: str
+    width: int
+    height: int
+    original_bytes: int
+    normalized_bytes: int
+    cache_path: Optional[str]
+    cached: bool
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.normalized_bytes
+
+    def summary(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["saved_bytes"] = self.saved_bytes
+        data["max_edge"] = VLM_IMAGE_MAX_EDGE
+        return data
+
+
+def _file_sha256(path: str) -> str:
+    # Uploads are stored as ``<sha256><ext>``; trust that name instead of rehashing.
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if re.fullmatch(r"[0-9a-f]{64}", stem):
+        return stem
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(image_path: str) -> tuple[bytes, str, int, int]:
+    # PIL is imported on first use so importing this module (and app.py) stays cheap.
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as source:
+        source_format = source.format
+        source_size = source.size
+        oriented = source.getexif().get(0x0112, 1) not in (None, 1)
+        image = ImageOps.exif_transpose(source)
+        if VLM_IMAGE_MAX_EDGE:
+            image.thumbnail((VLM_IMAGE_MAX_EDGE, VLM_IMAGE_MAX_EDGE), Image.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.convert("RGBA").save(buffer, format="PNG", optimize=True)
+            media_type = "image/png"
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=VLM_IMAGE_QUALITY, optimize=True)
+            media_type = "image/jpeg"
+        data = buffer.getvalue()
+
+    # Small, upright JPEG/PNG inputs can come out larger after re-encoding;
+    # keep the original bytes in that case.
+    if (
+        source_format in ("JPEG", "PNG")
+        and not oriented
+        and image.size == source_size
+        and os.path.getsize(image_path) <= len(data)
+    ):
+        with open(image_path, "rb") as f:
+            data = f.read()
+        media_type = "image/jpeg" if source_format == "JPEG" else "image/png"
+    return data, media_type, image.width, image.height
+
+
+def normalize_image(image_path: str) -> tuple[str, NormalizedImage]:
+    """Return ``(data_url, info)`` for the normalized rendition of ``image_path``."""
+    with span("image.normalize") as normalize_span:
+        data_url, info = _normalize_image(image_path)
+        normalize_span.set(cached=info.cached, bytes=info.normalized_bytes)
+    return data_url, info
+
+
+def _normalize_image(image_path: str) -> tuple[str, NormalizedImage]:
+    from PIL import Image
+
+    sha256 = _file_sha256(image_path)
+    original_bytes = os.path.getsize(image_path)
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(image_path)), ".normalized")
+    cached = False
+    data = None
+    for media_type, ext in (("image/jpeg", "jpg"), ("image/png", "png")):
+        cache_path = os.path.join(cache_dir, f"{sha256}_{VLM_IMAGE_MAX_EDGE}_q{VLM_IMAGE_QUALITY}.{ext}")
+        if os.path.isfile(cache_path):
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+            cached = True
+            break
+
+    if data is None:
+        data, media_type, width, height = _encode(image_path)
+        ext = "png" if media_type == "image/png" else "jpg"
+        cache_path = os.path.join(cache_dir, f"{sha256}_{VLM_IMAGE_MAX_EDGE}_q{VLM_IMAGE_QUALITY}.{ext}")
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            atomic_write_bytes(cache_path, data)
+        except OSError as exc:
+            print(f"⚠️ 参考图缓存写入失败: {exc}")
+            cache_path = None
+
+    info = NormalizedImage(
+        sha256=sha256,
+        media_type=media_type,
+        width=width,
+        height=height,
+        original_bytes=original_bytes,
+        normalized_bytes=len(data),
+        cache_path=cache_path,
+        cached=cached,
+    )
+    data_url = f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return data_url, info
+
+
+@dataclass
+class _ImageBuffer:
+    image_path: str
+    refs: int = 0
+    data_url: Optional[str] = None
+    info: Optional[NormalizedImage] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ImageBufferCache:
+    """Refcounted, process-wide normalized image buffers keyed by image handle."""
+
+    def __init__(self, idle_capacity: int = IMAGE_BUFFER_IDLE_CAPACITY) -> None:
+        self.idle_capacity = idle_capacity
+        self._lock = threading.Lock()
+        self._buffers: "OrderedDict[str, _ImageBuffer]" = OrderedDict()
+
+    @staticmethod
+    def handle_for(image_path: str) -> str:
+        return f"{_file_sha256(image_path)}:{VLM_IMAGE_MAX_EDGE}:{VLM_IMAGE_QUALITY}"
+
+    def pin(self, image_path: str) -> str:
+        """Register ``image_path`` and hold its buffer until ``release``; cheap, no decoding."""
+        handle = self.handle_for(image_path)
+        with self._lock:
+            buffer = self._buffers.get(handle)
+            if buffer is None:
+                buffer = self._buffers[handle] = _ImageBuffer(image_path=image_path)
+            buffer.refs += 1
+            self._buffers.move_to_end(handle)
+        return handle
+
+    def release(self, handle: Optional[str]) -> None:
+        if not handle:
+            return
+        with self._lock:
+            buffer = self._buffers.get(handle)
+            if buffer is None:
+                return
+            buffer.refs = max(0, buffer.refs - 1)
+            self._trim()
+
+    def _trim(self) -> None:
+        idle = [key for key, buffer in self._buffers.items() if buffer.refs == 0]
+        for key in idle[: max(0, len(idle) - self.idle_capacity)]:
+            del self._buffers[key]
+
+    def resolve(self, handle: str) -> Optional[tuple[str, NormalizedImage]]:
+        """Data URL and info for ``handle``, normalizing on first use."""
+        with self._lock:
+            buffer = self._buffers.get(handle)
+            if buffer is None:
+                return None
+            self._buffers.move_to_end(handle)
+        with buffer.lock:
+            if buffer.data_url is None:
+                buffer.data_url, buffer.info = normalize_image(buffer.image_path)
+                cached = buffer.info.cached
+            else:
+                cached = True
+        return buffer.data_url, NormalizedImage(**{**asdict(buffer.info), "cached": cached})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = [buffer for buffer in self._buffers.values() if buffer.data_url is not None]
+            return {
+                "buffers": len(self._buffers),
+                "pinned": sum(1 for buffer in self._buffers.values() if buffer.refs),
+                "resident_bytes": sum(len(buffer.data_url) for buffer in resident),
+            }
+
+
+image_buffers = ImageBufferCache()
+
+
+def pin_state_image(state) -> Optional[str]:
+    """Attach an image handle for ``state.image_path``; the caller releases it after the run."""
+    if state.image_ref or not state.image_path or not os.path.exists(state.image_path):
+        return state.image_ref
+    state.image_ref = image_buffers.pin(state.image_path)
+    return state.image_ref
+
+
+def image_data_url(state) -> Optional[str]:
+    """Resolve ``state.image_ref`` (or ``state.image_path``) to the normalized data URL."""
+    resolved = image_buffers.resolve(state.image_ref) if state.image_ref else None
+    if resolved is None:
+        if not state.image_path or not os.path.exists(state.image_path):
+            return None
+        # Not pinned by a run (e.g. a node used on its own): use the disk cache only.
+        resolved = normalize_image(state.image_path)
+    data_url, info = resolved
+    if state.image_preprocess is None:
+        state.image_preprocess = info.summary()
+        print(
+            f"🖼️ 参考图归一化: {info.width}x{info.height} {info.media_type}, "
+            f"{info.original_bytes} -> {info.normalized_bytes} 字节{'（缓存）' if info.cached else ''}"
+        )
+    return data_url
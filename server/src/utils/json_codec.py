@@ -0,0 +1,82 @@
+"""
+Shared JSON codec for session artifacts, SSE frames and API responses.
+
+orjson is used when it is installed; otherwise the stdlib ``json`` module is
+used with equivalent options, so callers never depend on which backend is
+active. Artifacts are written compact by default; set ``JSON_PRETTY_PRINT=true``
+to get indented files while debugging.
+"""
+
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def pretty_print_enabled() -> bool:
+    value = os.getenv("JSON_PRETTY_PRINT", "false").strip().lower()
+    return value in {"1", "true", "yes", "on"}
+
+
+def _stdlib_dumps(obj: Any, pretty: bool, sort_keys: bool = False) -> str:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys)
+
+
+def dumps(obj: Any, *, pretty: bool | None = None, sort_keys: bool = False) -> bytes:
+    """Serialize ``obj`` to UTF-8 JSON bytes; ``sort_keys`` gives a canonical form for hashing."""
+    pretty = pretty_print_enabled() if pretty is None else pretty
+    if orjson is not None:
+        options = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=options)
+        except TypeError:
+            # orjson rejects a few values the stdlib accepts (e.g. >64-bit ints).
+            pass
+    return _stdlib_dumps(obj, pretty, sort_keys).encode("utf-8")
+
+
+def dumps_str(obj: Any, *, pretty: bool | None = None) -> str:
+    """Serialize ``obj`` to a JSON string (used for SSE frames and prompts)."""
+    return dumps(obj, pretty=pretty).decode("utf-8")
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    """Parse JSON text; raises ``json.JSONDecodeError`` on invalid input."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Fall through so NaN/Infinity and other stdlib-tolerated input
+            # still parse, and errors keep the stdlib exception type.
+            pass
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def deep_copy(obj: Any) -> Any:
+    """Deep copy a JSON-compatible value via a serialize/parse round trip."""
+    return loads(dumps(obj, pretty=False))
+
+
+def dump_file(path: str, obj: Any, *, pretty: bool | None = None) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(obj, pretty=pretty))
+
+
+def load_file(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,232 @@
+"""
+Tolerant JSON extraction and repair for LLM output.
+
+Model responses wrap JSON in code fences or prose, sometimes emit a second
+object after the first, and use Python/JS literals or trailing commas. This
+module walks the text once with a string-aware tokenizer: string literals are
+consumed whole (so braces, ``None`` or ``,]`` inside a value are never
+touched), brackets are balanced to find where the first top-level value ends,
+and in the same pass bare ``None``/``True``/``False``/``NaN``/``Infinity`` are
+rewritten to JSON and trailing commas before ``}``/``]`` are dropped.
+Everything between tokens (numbers, whitespace, ordinary commas) is copied in
+slices rather than character by character.
+
+``loads_first_json`` first tries a strict C-level ``raw_decode`` of the first
+value (well-formed output, the common case, never reaches the Python
+tokenizer) and only runs the repair pass when that fails.
+
+Truncated output (unbalanced brackets) is not completed; it still fails to
+parse, so the caller's retry path decides what to do with it.
+
+``FeatureStream`` applies the same string-aware scanning to a completion that
+is still streaming: it yields each element of the top-level ``features``
+array as soon as its closing brace arrives.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import json_codec
+
+
+_TOKEN = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"?'            # string literal (possibly unterminated)
+    r"|,\s*(?=[}\]])"                          # trailing comma
+    r"|[{}\[\]]"                               # container delimiters
+    r"|-?\bInfinity\b|\b(?:None|True|False|NaN)\b",
+    re.S,
+)
+
+_LITERALS = {
+    "None": "null",
+    "True": "true",
+    "False": "false",
+    "NaN": "null",
+    "Infinity": "null",
+    "-Infinity": "null",
+}
+
+
+def _reject_constant(name: str) -> Any:
+    raise ValueError(f"non-standard JSON constant {name}")
+
+
+# Strict: NaN/Infinity must go through the repair pass so they become null.
+_STRICT_DECODER = json.JSONDecoder(parse_constant=_reject_constant)
+
+
+def _first_value_start(text: str) -> int:
+    start = text.find("{")
+    return text.find("[") if start == -1 else start
+
+
+def _scan(text: str, start: int, repair: bool) -> Tuple[str, Optional[int]]:
+    """Walk from ``start`` (an opening bracket, or any position for a bare
+    value) and return ``(text, end)``; ``end`` is ``None`` when the brackets
+    never balance. With ``repair`` the returned text has literals coerced and
+    trailing commas removed, otherwise it is the raw slice."""
+    pieces = []
+    last = start
+    depth = 0
+    end = None
+    for match in _TOKEN.finditer(text, start):
+        token = match.group()
+        head = token[0]
+        if head == '"':
+            continue
+        if head == "{" or head == "[":
+            depth += 1
+        elif head == "}" or head == "]":
+            depth -= 1
+            if depth <= 0:
+                end = match.end()
+                break
+        elif repair:
+            pieces.append(text[last:match.start()])
+            if head != ",":
+                pieces.append(_LITERALS[token])
+            last = match.end()
+    stop = len(text) if end is None else end
+    if not repair:
+        return text[start:stop], end
+    pieces.append(text[last:stop])
+    return "".join(pieces), end
+
+
+def extract_json_object(text: Optional[str]) -> Optional[str]:
+    """Raw text of the first balanced top-level ``{...}`` in ``text``.
+
+    Falls back to the span from the first ``{`` to the last ``}`` when the
+    brackets never balance, and returns ``None`` when there is no object.
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    if start == -1:
+        return None
+    raw, end = _scan(text, start, repair=False)
+    if end is not None:
+        return raw
+    last = text.rfind("}")
+    return text[start:last + 1] if last > start else None
+
+
+def repair_json(text: Optional[str]) -> str:
+    """First top-level JSON object (or array, when there is no object) in
+    ``text`` with literals coerced and trailing commas dropped; fences and
+    surrounding prose are discarded."""
+    text = text or ""
+    start = _first_value_start(text)
+    if start == -1:
+        return _scan(text, 0, repair=True)[0].strip()
+    return _scan(text, start, repair=True)[0]
+
+
+def loads_first_json(text: Optional[str]) -> Any:
+    """Parse the first JSON object in ``text``, repairing it if needed;
+    raises ``json.JSONDecodeError`` when even the repaired text is invalid."""
+    text = text or ""
+    start = _first_value_start(text)
+    if start != -1:
+        try:
+            return _STRICT_DECODER.raw_decode(text, start)[0]
+        except ValueError:
+            pass
+    return json_codec.loads(repair_json(text))
+
+
+_STREAM_TOKEN = re.compile(r'["{}\[\]:,]')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+class FeatureStream:
+    """Incremental scanner over a streamed FeatureCollection.
+
+    ``feed(chunk)`` returns the elements of the top-level ``features`` array
+    that were completed by ``chunk``, parsed (and repaired) one by one.
+    Root-level string members seen so far (``_city``, ``type``...) are kept in
+    ``root``. Only the unfinished tail is buffered, so memory stays at about
+    one feature however long the completion is.
+    """
+
+    def __init__(self, array_key: str = "features") -> None:
+        self.array_key = array_key
+        self.root: Dict[str, Any] = {}
+        self.count = 0
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._root_key: Optional[str] = None
+        self._after_colon = False
+        self._in_array = False
+        self._item_start: Optional[int] = None
+
+    def _root_string(self, token: str) -> str:
+        try:
+            return json.loads(token)
+        except ValueError:
+            return token[1:-1]
+
+    def feed(self, chunk: str) -> List[Any]:
+        buffer = self._buffer + chunk
+        pos = self._pos
+        ready: List[Any] = []
+        if not self._started:
+            start = buffer.find("{", pos)
+            if start == -1:
+                self._buffer, self._pos = "", 0
+                return ready
+            self._started = True
+            pos = start
+        while self._depth >= 0:
+            match = _STREAM_TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char, index = match.group(), match.start()
+            if char == '"':
+                string = _STRING.match(buffer, index)
+                if string is None:
+                    pos = index  # unterminated; rescan once more text arrives
+                    break
+                pos = string.end()
+                if self._depth == 1:
+                    value = self._root_string(string.group())
+                    if self._after_colon and self._root_key is not None:
+                        self.root[self._root_key] = value
+                        self._after_colon = False
+                    else:
+                        self._root_key = value
+                continue
+            pos = match.end()
+            if char == "{" or char == "[":
+                self._depth += 1
+                if self._depth == 2 and char == "[" and self._after_colon and self._root_key == self.array_key:
+                    self._in_array = True
+                elif self._in_array and self._depth == 3 and char == "{":
+                    self._item_start = index
+                if self._depth == 2:
+                    self._after_colon = False
+            elif char == "}" or char == "]":
+                if self._item_start is not None and self._depth == 3 and char == "}":
+                    try:
+                        ready.append(loads_first_json(buffer[self._item_start:pos]))
+                        self.count += 1
+                    except ValueError:
+                        pass  # the full-text parse at the end decides
+                    self._item_start = None
+                elif self._in_array and self._depth == 2:
+                    self._in_array = False
+                self._depth -= 1
+                if self._depth == 0:
+                    self._depth = -1  # root closed; ignore trailing text
+            elif self._depth == 1:
+                self._after_colon = char == ":"
+        keep = self._item_start if self._item_start is not None else pos
+        self._buffer = buffer[keep:]
+        self._pos = pos - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        return ready
@@ -0,0 +1,173 @@
+"""
+Token and payload accounting for LLM/VLM calls.
+
+Every call made through ``metrics.llm_call`` is measured here: prompt and
+completion tokens (from the provider's ``usage_metadata`` when reported,
+otherwise counted locally with tiktoken, otherwise estimated from the text),
+and request/response payload bytes including inline image data URLs.
+
+A run installs a ``UsageLedger`` for its duration; calls made while it is
+active, including from LangGraph worker threads, are appended to it and end up
+in the session manifest and node events.
+"""
+
+import contextvars
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional local tokenizer
+    tiktoken = None
+
+
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: Optional[str]):
+    key = model or ""
+    with _encodings_lock:
+        if key not in _encodings:
+            encoding = None
+            try:
+                encoding = tiktoken.encoding_for_model(model) if model else None
+            except Exception:
+                encoding = None
+            if encoding is None:
+                try:
+                    encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as exc:
+                    print(f"⚠️ tiktoken 编码表不可用，改用估算: {exc}")
+            _encodings[key] = encoding
+        return _encodings[key]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> Tuple[int, str]:
+    """Return ``(tokens, source)`` where source is ``tiktoken`` or ``estimate``."""
+    if not text:
+        return 0, "estimate"
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=())), "tiktoken"
+    # Rough fallback: CJK characters are about one token each, other text ~4 chars/token.
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4, "estimate"
+
+
+def _content_payload(content: Any) -> Tuple[str, int]:
+    """Text of a message content and the bytes of any inline images."""
+    if isinstance(content, str):
+        return content, 0
+    texts: List[str] = []
+    image_bytes = 0
+    for part in content or []:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            texts.append(str(part.get("text") or ""))
+        elif isinstance(part, dict) and part.get("type") == "image_url":
+            image_url = part.get("image_url")
+            url = image_url.get("url") if isinstance(image_url, dict) else image_url
+            image_bytes += len(str(url or ""))
+    return "\n".join(texts), image_bytes
+
+
+def messages_payload(messages: Any) -> Tuple[str, int]:
+    """Prompt text and total request payload bytes for a list of chat messages."""
+    texts: List[str] = []
+    image_bytes = 0
+    for message in messages or []:
+        text, images = _content_payload(getattr(message, "content", message))
+        texts.append(text)
+        image_bytes += images
+    text = "\n".join(texts)
+    return text, len(text.encode("utf-8")) + image_bytes
+
+
+def measure(model: Optional[str], messages: Any, response: Any) -> Dict[str, Any]:
+    prompt_text, request_bytes = messages_payload(messages)
+    response_text, _ = _content_payload(getattr(response, "content", "") if response is not None else "")
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        prompt_tokens = int(usage["input_tokens"])
+        completion_tokens = int(usage.get("output_tokens") or 0)
+        token_source = "provider"
+    else:
+        prompt_tokens, token_source = count_tokens(prompt_text, model)
+        completion_tokens, _ = count_tokens(response_text, model)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "request_bytes": request_bytes,
+        "response_bytes": len(response_text.encode("utf-8")),
+        "token_source": token_source,
+    }
+
+
+_TOTAL_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens", "request_bytes", "response_bytes")
+
+
+def summarize(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = {"calls": len(calls), **{field: 0 for field in _TOTAL_FIELDS}}
+    for call in calls:
+        for field in _TOTAL_FIELDS:
+            summary[field] += call.get(field) or 0
+    if any(call.get("token_source") != "provider" for call in calls):
+        summary["estimated_calls"] = sum(1 for call in calls if call.get("token_source") != "provider")
+    return summary
+
+
+class UsageLedger:
+    """Per-run list of LLM call measurements; thread-safe."""
+
+    def __init__(self, calls: Optional[List[Dict[str, Any]]] = None) -> None:
+        self._lock = threading.Lock()
+        self._calls: List[Dict[str, Any]] = list(calls or [])
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._calls.append(entry)
+
+    def mark(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def calls(self, node: Optional[str] = None, since: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            calls = self._calls[since:]
+        return [call for call in calls if node is None or call.get("node") == node]
+
+    def to_manifest(self) -> Dict[str, Any]:
+        calls = self.calls()
+        by_node: Dict[str, List[Dict[str, Any]]] = {}
+        for call in calls:
+            by_node.setdefault(call.get("node") or "unknown", []).append(call)
+        return {
+            "total": summarize(calls),
+            "by_node": {node: summarize(node_calls) for node, node_calls in by_node.items()},
+            "calls": calls,
+        }
+
+
+_active: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar("maplayout_llm_usage", default=None)
+
+
+@contextmanager
+def usage_ledger(ledger: UsageLedger) -> Iterator[UsageLedger]:
+    token = _active.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _active.reset(token)
+
+
+def record_call(entry: Dict[str, Any]) -> None:
+    ledger = _active.get()
+    if ledger is not None:
+        ledger.record(entry)
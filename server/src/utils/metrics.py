@@ -0,0 +1,322 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by one lock
+each, so recording a sample on the hot path is a dict lookup and an addition.
+Values that are cheaper to read than to track (RunStore size, pending writes,
+active runs) are registered as collectors and evaluated only when ``/metrics``
+is scraped.
+
+The metric catalog lives at the bottom of this module so every reporter
+(``MultiModalMapAgent``, the nodes, ``AMapService`` and ``app.py``) shares the
+same names and label sets.
+"""
+
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from . import llm_usage
+from .tracing import span
+
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    @property
+    def family(self) -> str:
+        return self.name
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    @property
+    def family(self) -> str:
+        return f"{self.name}_total"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.family, self._labels(key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self._labels(key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        if not self.labelnames:
+            self._values[()] = ([0] * (len(self.buckets) + 1), [0.0])
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        samples: List[Sample] = []
+        for key, counts, total in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"duplicate metric {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        """``collector()`` yields ``(name, type, help, [(labels, value), ...])`` at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self, extra_collectors: Sequence[Collector] = ()) -> str:
+        """Prometheus text exposition format (version 0.0.4).
+
+        ``extra_collectors`` run after the registered ones for this render only,
+        e.g. over state the caller snapshotted on its own thread.
+        """
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors) + list(extra_collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.family} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as exc:
+                print(f"⚠️ 指标采集失败: {exc}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+RUNS = registry.counter(
+    "maplayout_runs", "Agent runs finished, by status.", ["status"]
+)
+RUN_DURATION = registry.histogram(
+    "maplayout_run_duration_seconds", "End-to-end agent run latency.", buckets=_SECONDS_BUCKETS
+)
+NODE_DURATION = registry.histogram(
+    "maplayout_node_duration_seconds", "Agent node latency.", ["node"], buckets=_SECONDS_BUCKETS
+)
+VALIDATION_RETRIES = registry.histogram(
+    "maplayout_validation_retries", "validation_retry_count per finished run.", buckets=(0, 1, 2, 3, 5)
+)
+VALIDATION_VERDICTS = registry.counter(
+    "maplayout_validation_verdicts", "QA verdicts, by what decided them.", ["source"]
+)
+LLM_DURATION = registry.histogram(
+    "maplayout_llm_request_duration_seconds", "LLM/VLM request latency.", ["node", "outcome"], buckets=_SECONDS_BUCKETS
+)
+LLM_TOKENS = registry.counter(
+    "maplayout_llm_tokens", "LLM tokens, provider-reported or counted locally.", ["node", "direction"]
+)
+GEOCODE_LOOKUPS = registry.counter(
+    "maplayout_geocode_lookups", "POI geocode lookups, by the source that answered (none = miss).", ["source"]
+)
+GEOCODE_PROVIDER_REQUESTS = registry.counter(
+    "maplayout_geocode_provider_requests", "Geocode provider HTTP requests, by outcome.", ["provider", "outcome"]
+)
+ICONS = registry.counter(
+    "maplayout_icons", "Point icons, by outcome.", ["outcome"]
+)
+EVENT_LOOP_LAG = registry.histogram(
+    "maplayout_event_loop_lag_seconds",
+    "Scheduling delay of the API event loop.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_LOOP_LAG_LAST = registry.gauge(
+    "maplayout_event_loop_lag_last_seconds", "Most recent event loop scheduling delay."
+)
+SSE_STREAMS = registry.gauge(
+    "maplayout_sse_streams", "Open SSE event streams."
+)
+
+
+class _LLMCall:
+    __slots__ = ("_node", "_model", "_attributes", "_span_cm", "_span", "_start", "_messages", "_response")
+
+    def __init__(self, node: str, llm: Any, attributes: Dict[str, Any]) -> None:
+        self._node = node
+        self._model = getattr(llm, "model_name", None)
+        self._attributes = attributes
+        self._span_cm = span("llm.invoke", node=node, model=self._model, **attributes)
+        self._messages = None
+        self._response = None
+
+    def __enter__(self) -> "_LLMCall":
+        self._span = self._span_cm.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def record(self, response: Any, messages: Any = None) -> None:
+        self._response = response
+        self._messages = messages
+        self._span.set_llm_response(response)
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self._start
+        outcome = "error" if exc is not None else "ok"
+        LLM_DURATION.observe(duration, node=self._node, outcome=outcome)
+        usage = llm_usage.measure(self._model, self._messages, self._response)
+        if usage["prompt_tokens"]:
+            LLM_TOKENS.inc(usage["prompt_tokens"], node=self._node, direction="input")
+        if usage["completion_tokens"]:
+            LLM_TOKENS.inc(usage["completion_tokens"], node=self._node, direction="output")
+        llm_usage.record_call({
+            "node": self._node,
+            "model": self._model,
+            **self._attributes,
+            **usage,
+            "duration_ms": round(duration * 1000, 1),
+            "outcome": outcome,
+        })
+        return self._span_cm.__exit__(exc_type, exc, tb)
+
+
+def llm_call(node: str, llm: Any, **attributes: Any) -> _LLMCall:
+    """Time one LLM request for metrics, open its ``llm.invoke`` trace span and
+    record its token/payload usage; ``attributes`` go on both the span and the
+    usage entry."""
+    return _LLMCall(node, llm, attributes)
+
@@ -0,0 +1,125 @@
+"""
+Spatial and name index over POIs.
+
+Node 3's de-duplication and the QA density check used to compare every POI
+with every other one. ``PoiIndex`` buckets points into a lat/lon grid (cell
+size chosen from the query radius, one grid per group such as the itinerary
+day) and keys normalized names by their full text and their substrings, so a
+radius query or a name-overlap query only looks at nearby candidates.
+Distances are still exact haversine; the index only prunes pairs.
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180
+
+
+def parse_lon_lat(coord: Any) -> Optional[Tuple[float, float]]:
+    try:
+        return float(coord[0]), float(coord[1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def distance_meters(coord_a, coord_b) -> float:
+    """Haversine distance in meters; ``inf`` when either coordinate is malformed."""
+    first, second = parse_lon_lat(coord_a), parse_lon_lat(coord_b)
+    if first is None or second is None:
+        return float("inf")
+    lon1, lat1 = first
+    lon2, lat2 = second
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _group_key(group: Any) -> Hashable:
+    # Groups come from GeoJSON properties; an unhashable value (a list from a
+    # malformed ``day``) still only matches an equal value.
+    try:
+        hash(group)
+    except TypeError:
+        return repr(group)
+    return group
+
+
+def _substrings(text: str, min_length: int) -> Set[str]:
+    return {
+        text[start:end]
+        for start in range(len(text))
+        for end in range(start + min_length, len(text) + 1)
+    }
+
+
+class PoiIndex:
+    """Grid-bucketed points plus a normalized-name index; items are referenced by insertion order."""
+
+    def __init__(self, cell_meters: float, min_substring_length: int = 2) -> None:
+        self.cell_degrees = max(cell_meters, 1.0) / METERS_PER_DEGREE
+        self.min_substring_length = min_substring_length
+        self._coords: List[Optional[Tuple[float, float]]] = []
+        self._cells: Dict[Tuple[Hashable, int, int], List[int]] = defaultdict(list)
+        self._names: Dict[str, List[int]] = defaultdict(list)
+        self._name_parts: Dict[str, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def add(self, coord: Any, *, group: Hashable = None, name: str = "") -> int:
+        """Index a POI; ``name`` should already be normalized by the caller."""
+        index = len(self._coords)
+        point = parse_lon_lat(coord)
+        self._coords.append(point)
+        if point is not None:
+            self._cells[(_group_key(group), *self._cell(*point))].append(index)
+        if name:
+            self._names[name].append(index)
+            if len(name) >= self.min_substring_length:
+                for part in _substrings(name, self.min_substring_length):
+                    self._name_parts[part].append(index)
+        return index
+
+    def within(self, coord: Any, radius_meters: float, *, group: Hashable = None) -> List[Tuple[int, float]]:
+        """``(index, distance)`` of points in ``group`` strictly closer than ``radius_meters``, by index."""
+        point = parse_lon_lat(coord)
+        if point is None:
+            return []
+        lon, lat = point
+        lat_span = radius_meters / METERS_PER_DEGREE
+        # A degree of longitude shrinks with latitude; widen the scan at the
+        # query's most poleward edge so no neighbour cell is missed.
+        edge_lat = min(89.0, abs(lat) + lat_span)
+        lon_span = min(180.0, lat_span / max(math.cos(math.radians(edge_lat)), 1e-6))
+        lat_low, lon_low = self._cell(lon - lon_span, lat - lat_span)
+        lat_high, lon_high = self._cell(lon + lon_span, lat + lat_span)
+        group = _group_key(group)
+        matches = []
+        for lat_cell in range(lat_low, lat_high + 1):
+            for lon_cell in range(lon_low, lon_high + 1):
+                for index in self._cells.get((group, lat_cell, lon_cell), ()):
+                    distance = distance_meters(point, self._coords[index])
+                    if distance < radius_meters:
+                        matches.append((index, distance))
+        matches.sort()
+        return matches
+
+    def name_overlaps(self, name: str) -> List[int]:
+        """Indexed POIs whose name equals ``name`` or, when both are at least
+        ``min_substring_length`` long, contains it or is contained in it."""
+        if not name:
+            return []
+        found = set(self._names.get(name, ()))
+        if len(name) >= self.min_substring_length:
+            found.update(self._name_parts.get(name, ()))
+            for part in _substrings(name, self.min_substring_length):
+                found.update(self._names.get(part, ()))
+        return sorted(found)
@@ -0,0 +1,272 @@
+"""
+Opt-in per-run Python profiling.
+
+A profiled run is wrapped in ``profile_run(mode)`` and the resulting profile is
+written into the session directory:
+
+- ``cprofile``: deterministic ``cProfile`` capture, written as pstats
+  (``session_profile.prof``; open with ``python -m pstats`` or snakeviz).
+- ``sample``: a background thread samples the run's thread stacks every
+  ``RUN_PROFILE_SAMPLE_INTERVAL_MS`` and writes speedscope JSON
+  (``session_profile.speedscope.json``; open at https://www.speedscope.app).
+
+Work for one run hops threads (the ``asyncio.to_thread`` worker, then the
+LangGraph executor for parallel branches), so the active capture lives in a
+context variable and each thread joins it through ``profile_thread()``. Both
+``asyncio.to_thread`` and LangGraph copy the context into their workers. With
+no capture active ``profile_thread()`` returns a shared no-op context, so an
+unprofiled run pays one context lookup per node.
+"""
+
+import cProfile
+import contextvars
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .artifact_writer import atomic_write_bytes, atomic_write_json
+
+
+PSTATS_FILE = "session_profile.prof"
+SPEEDSCOPE_FILE = "session_profile.speedscope.json"
+PROFILE_FILES = (PSTATS_FILE, SPEEDSCOPE_FILE)
+PROFILE_MODES = ("cprofile", "sample")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.1, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+SAMPLE_INTERVAL_SECONDS = _env_float("RUN_PROFILE_SAMPLE_INTERVAL_MS", 5.0) / 1000
+MAX_STACK_DEPTH = 128
+
+
+def parse_profile_mode(value: Optional[str]) -> Optional[str]:
+    """Map a request flag/header value to a profile mode; ``None`` means off."""
+    text = (value or "").strip().lower()
+    if text in {"", "0", "false", "no", "off", "none"}:
+        return None
+    if text in {"1", "true", "yes", "on", "cprofile"}:
+        return "cprofile"
+    if text in {"sample", "sampling", "speedscope"}:
+        return "sample"
+    raise ValueError(f"未知的 profile 模式: {value}（可选 cprofile / sample）")
+
+
+class _CProfileCapture:
+    """One ``cProfile.Profile`` per participating thread, merged on write."""
+
+    filename = PSTATS_FILE
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._threads: Dict[int, cProfile.Profile] = {}
+        self._finished: List[cProfile.Profile] = []
+
+    @contextmanager
+    def attach(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._threads:
+                owner = False
+            else:
+                owner = True
+                profiler = self._threads[ident] = cProfile.Profile()
+        if not owner:
+            yield
+            return
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one cProfile per interpreter; the profiler
+            # already enabled elsewhere sees this thread too.
+            with self._lock:
+                del self._threads[ident]
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                del self._threads[ident]
+                self._finished.append(profiler)
+
+    def stop(self) -> None:
+        pass
+
+    def write(self, session_dir: str) -> Optional[str]:
+        with self._lock:
+            profiles = list(self._finished)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        path = os.path.join(session_dir, self.filename)
+        atomic_write_bytes(path, marshal.dumps(stats.stats))
+        return path
+
+
+Frame = Tuple[str, str, int]
+
+
+class _SamplingCapture:
+    """Periodic stack samples of the run's threads, exported as speedscope JSON."""
+
+    filename = SPEEDSCOPE_FILE
+
+    def __init__(self, name: str, interval: float = SAMPLE_INTERVAL_SECONDS) -> None:
+        self.name = name
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}  # ident -> attach depth
+        self._thread_names: Dict[int, str] = {}
+        self._frames: Dict[Frame, int] = {}
+        self._samples: Dict[int, List[Tuple[List[int], float]]] = {}
+        self._started = time.perf_counter()
+        self._stopped: Optional[float] = None
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="run-profile-sampler", daemon=True)
+        self._sampler.start()
+
+    @contextmanager
+    def attach(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+            self._thread_names.setdefault(ident, threading.current_thread().name)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if not self._threads[ident]:
+                    del self._threads[ident]
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            with self._lock:
+                idents = set(self._threads)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in idents:
+                    frame = frames.get(ident)
+                    stack: List[int] = []
+                    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                        stack.append(self._frame_index(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        stack.reverse()
+                        self._samples.setdefault(ident, []).append((stack, weight))
+
+    def stop(self) -> None:
+        if self._stopped is None:
+            self._stop.set()
+            self._sampler.join()
+            self._stopped = time.perf_counter()
+
+    def write(self, session_dir: str) -> Optional[str]:
+        self.stop()
+        with self._lock:
+            samples = {ident: list(items) for ident, items in self._samples.items()}
+            frames = sorted(self._frames.items(), key=lambda item: item[1])
+            thread_names = dict(self._thread_names)
+        if not samples:
+            return None
+        end_value = round((self._stopped - self._started) * 1000, 3)
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "maplayout",
+            "activeProfileIndex": 0,
+            "shared": {
+                "frames": [{"name": name, "file": filename, "line": line} for (name, filename, line), _ in frames]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread_names.get(ident, str(ident)),
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end_value,
+                    "samples": [stack for stack, _ in items],
+                    "weights": [round(weight, 3) for _, weight in items],
+                }
+                for ident, items in sorted(samples.items(), key=lambda item: -len(item[1]))
+            ],
+        }
+        path = os.path.join(session_dir, self.filename)
+        atomic_write_json(path, document, pretty=False)
+        return path
+
+
+_active: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("maplayout_profile", default=None)
+_NOOP = nullcontext()
+
+
+@contextmanager
+def profile_run(mode: Optional[str], name: str = "run") -> Iterator[Optional[Any]]:
+    """Profile the calling thread, and threads joining via ``profile_thread()``,
+    for the duration of the block; yields the capture or ``None`` when off."""
+    if mode is None:
+        yield None
+        return
+    capture = _CProfileCapture() if mode == "cprofile" else _SamplingCapture(name)
+    token = _active.set(capture)
+    try:
+        with capture.attach():
+            yield capture
+    finally:
+        _active.reset(token)
+        capture.stop()
+
+
+def profile_thread():
+    """Join the active run profile from the current thread, if any."""
+    capture = _active.get()
+    return capture.attach() if capture is not None else _NOOP
+
+
+def thread_profiled(func: Callable) -> Callable:
+    """Wrap a graph node so the executor thread running it joins the run profile."""
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with profile_thread():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def write_profile(capture: Optional[Any], session_dir: Optional[str]) -> Optional[str]:
+    """Write ``capture`` into ``session_dir``; failures are reported, not raised."""
+    if capture is None or not session_dir:
+        return None
+    try:
+        return capture.write(session_dir)
+    except OSError as exc:
+        print(f"⚠️ 性能分析文件写入失败: {exc}")
+        return None
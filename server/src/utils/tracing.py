@@ -0,0 +1,221 @@
+"""
+Structured trace spans for agent runs.
+
+A traced run records nested spans (run -> node -> LLM call / JSON repair /
+geocode / image generation / artifact write) and exports them per session to
+``session_trace.json`` next to ``session_manifest.json``, using the OTLP/JSON
+``resourceSpans`` layout so the file can be loaded by OpenTelemetry tooling.
+
+Tracing is off unless ``RUN_TRACING`` is enabled. The active trace lives in a
+context variable; when no trace is active ``span()`` returns a shared no-op
+object, so instrumented code pays one context lookup and nothing else.
+"""
+
+import contextvars
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .artifact_writer import atomic_write_json
+
+
+TRACE_FILE = "session_trace.json"
+SERVICE_NAME = "maplayout-agent"
+SCOPE_NAME = "maplayout.tracing"
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+def tracing_enabled() -> bool:
+    value = os.getenv("RUN_TRACING", "false").strip().lower()
+    return value in {"1", "true", "yes", "on"}
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "message")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.status = STATUS_OK
+        self.message = ""
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def set_llm_response(self, response: Any) -> None:
+        """Record token usage from a LangChain chat response, when the provider reports it."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.set(
+            **{
+                "llm.input_tokens": usage.get("input_tokens"),
+                "llm.output_tokens": usage.get("output_tokens"),
+                "llm.response_chars": len(getattr(response, "content", "") or ""),
+            }
+        )
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.message = f"{type(exc).__name__}: {exc}"[:500]
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is inactive."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def set_llm_response(self, response: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects the spans of one run; safe to use from the graph's worker threads."""
+
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.trace_id = secrets.token_hex(16)
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+
+    def start(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        return Span(name, parent.span_id if parent else None, attributes)
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        with self._lock:
+            self._spans.append(span)
+
+    def export(self) -> Dict[str, Any]:
+        """OTLP/JSON document for the finished spans."""
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span.start_ns)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": SERVICE_NAME, "session.id": self.session_id}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": SCOPE_NAME},
+                            "spans": [self._export_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _export_span(self, span: Span) -> Dict[str, Any]:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": span.status},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        if span.message:
+            data["status"]["message"] = span.message
+        return data
+
+    def write(self, session_dir: str) -> str:
+        path = os.path.join(session_dir, TRACE_FILE)
+        atomic_write_json(path, self.export())
+        return path
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+_active: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("maplayout_trace", default=None)
+
+
+class _ActiveSpan:
+    __slots__ = ("_tracer", "_parent", "_name", "_attributes", "_span", "_token")
+
+    def __init__(self, tracer: Tracer, parent: Span, name: str, attributes: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._parent = parent
+        self._name = name
+        self._attributes = attributes
+
+    def __enter__(self) -> Span:
+        self._span = self._tracer.start(self._name, self._parent, self._attributes)
+        self._token = _active.set((self._tracer, self._span))
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _active.reset(self._token)
+        if exc is not None:
+            self._span.record_error(exc)
+        self._tracer.finish(self._span)
+        return False
+
+
+def span(name: str, **attributes: Any):
+    """Child span of the current span, or a no-op when no trace is active."""
+    active = _active.get()
+    if active is None:
+        return _NOOP_SPAN
+    tracer, parent = active
+    return _ActiveSpan(tracer, parent, name, attributes)
+
+
+@contextmanager
+def start_trace(session_id: str, **attributes: Any) -> Iterator[Optional[Tracer]]:
+    """Open the root ``run`` span when ``RUN_TRACING`` is on; yields the tracer or ``None``."""
+    if not tracing_enabled():
+        yield None
+        return
+    tracer = Tracer(session_id)
+    root = tracer.start("run", None, {"session.id": session_id, **attributes})
+    token = _active.set((tracer, root))
+    try:
+        yield tracer
+    except BaseException as exc:
+        root.record_error(exc)
+        raise
+    finally:
+        _active.reset(token)
+        tracer.finish(root)
@@ -0,0 +1,98 @@
+"""
+Content-addressed storage for uploaded reference images.
+
+Uploads are streamed to a temp file in fixed-size chunks while being hashed,
+capped at a maximum size, and then renamed to ``<sha256><ext>``. Uploading the
+same image again reuses the existing file, so the file name (and the hash it
+carries) is a stable handle for caches keyed on image content.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+
+from .artifact_writer import apply_default_file_mode
+
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _max_upload_bytes() -> int:
+    try:
+        return max(1, int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024))))
+    except ValueError:
+        return 20 * 1024 * 1024
+
+
+UPLOAD_MAX_BYTES = _max_upload_bytes()
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredImage:
+    filename: str
+    sha256: str
+    size: int
+    deduplicated: bool
+
+
+def image_extension(filename: str | None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext):
+        return ".png"
+    return ext
+
+
+def _commit(tmp_path: str, target: str) -> bool:
+    """Move the temp file into place; returns True if identical content already existed."""
+    if os.path.exists(target):
+        os.unlink(tmp_path)
+        return True
+    os.replace(tmp_path, target)
+    return False
+
+
+async def store_upload(
+    file: UploadFile,
+    directory: str,
+    *,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_BYTES,
+) -> StoredImage:
+    """Stream ``file`` into ``directory`` under its content hash."""
+    os.makedirs(directory, exist_ok=True)
+    ext = image_extension(file.filename)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            apply_default_file_mode(f.fileno())
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"图片超过大小限制 {max_bytes} 字节")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(lambda: (f.flush(), os.fsync(f.fileno())))
+        sha256 = digest.hexdigest()
+        filename = f"{sha256}{ext}"
+        deduplicated = await asyncio.to_thread(_commit, tmp_path, os.path.join(directory, filename))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return StoredImage(filename=filename, sha256=sha256, size=size, deduplicated=deduplicated)
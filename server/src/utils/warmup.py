@@ -0,0 +1,94 @@
+"""
+Background warm-up of heavy modules.
+
+``app.py`` only imports what it needs to accept requests. LangChain, LangGraph,
+the OpenAI client, PIL and the node modules are imported on first use, so a
+worker starts serving in a fraction of the old import time. At startup
+``start_warmup()`` imports them in a daemon thread so the first real run does
+not pay for them either; ``GET /ready`` reports when that has finished.
+"""
+
+import importlib
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+# (module, required): a required module that fails to import keeps the worker
+# unready; optional ones (e.g. the checkpoint backend) are only reported.
+WARMUP_MODULES: Tuple[Tuple[str, bool], ...] = (
+    ("src.multi_modal_agent", True),  # langchain_openai, langgraph and every node
+    ("langgraph.checkpoint.sqlite", False),
+    ("PIL.Image", True),
+)
+
+
+def warmup_enabled() -> bool:
+    value = os.getenv("APP_WARMUP", "true").strip().lower()
+    return value not in {"0", "false", "no", "off"}
+
+
+class _Warmup:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state = "pending"
+        self._started_at: Optional[str] = None
+        self._finished_at: Optional[str] = None
+        self._duration_ms: Optional[float] = None
+        self._modules: Dict[str, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._state != "pending":
+                return
+            if not warmup_enabled():
+                self._state = "disabled"
+                return
+            self._state = "running"
+            self._started_at = datetime.now().isoformat()
+            self._thread = threading.Thread(target=self._run, name="app-warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        run_start = time.perf_counter()
+        failed = False
+        for name, required in WARMUP_MODULES:
+            start = time.perf_counter()
+            entry: Dict[str, Any] = {"required": required}
+            try:
+                importlib.import_module(name)
+            except Exception as exc:
+                entry["error"] = str(exc)
+                failed = failed or required
+                print(f"⚠️ 预热导入失败 {name}: {exc}")
+            entry["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                self._modules[name] = entry
+        with self._lock:
+            self._duration_ms = round((time.perf_counter() - run_start) * 1000, 1)
+            self._finished_at = datetime.now().isoformat()
+            self._state = "failed" if failed else "ready"
+        print(f"🔥 预热完成: {self._state}，耗时 {self._duration_ms} ms")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.status()["ready"]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._state in {"ready", "disabled"},
+                "state": self._state,
+                "started_at": self._started_at,
+                "finished_at": self._finished_at,
+                "duration_ms": self._duration_ms,
+                "modules": dict(self._modules),
+            }
+
+
+warmup = _Warmup()
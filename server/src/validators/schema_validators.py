@@ -1,12 +1,19 @@
-from typing import Any, Dict, List, Type
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
 
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
-from ..schemas.geo_schema import GeoFeatureCollection
+from ..schemas.geo_schema import GeoFeatureCollection, GeoFeatureCollectionDict
 from ..schemas.style_schema import StyleSpec
 from ..schemas.visual_schema import VisualStructure
 
 
+@lru_cache(maxsize=None)
+def _adapter(schema: Any) -> TypeAdapter:
+    """Compiled validator for ``schema``, built once per process."""
+    return TypeAdapter(schema)
+
+
 def _format_errors(exc: ValidationError) -> List[str]:
     return [
         f"{'.'.join(str(part) for part in error.get('loc', []))}: {error.get('msg')}"
@@ -14,7 +21,20 @@ def _format_errors(exc: ValidationError) -> List[str]:
     ]
 
 
-def _validate(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+def _validate(model: Type[BaseModel], data: Dict[str, Any], verdict_schema: Optional[Any] = None) -> Dict[str, Any]:
+    """Validate ``data`` against ``model``.
+
+    With ``verdict_schema`` (a plain-dict mirror of ``model``) valid input is
+    only checked, without constructing the model, and the report carries no
+    ``parsed``. Invalid input is re-validated against ``model`` so the error
+    list is the same either way.
+    """
+    if verdict_schema is not None:
+        try:
+            _adapter(verdict_schema).validate_python(data)
+            return {"valid": True, "errors": [], "warnings": []}
+        except ValidationError:
+            pass
     try:
         parsed = model.model_validate(data)
     except ValidationError as exc:
@@ -39,8 +59,9 @@ def validate_visual_structure(data: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
-def validate_geojson(data: Dict[str, Any]) -> Dict[str, Any]:
-    return _validate(GeoFeatureCollection, data)
+def validate_geojson(data: Dict[str, Any], verdict_only: bool = False) -> Dict[str, Any]:
+    """GeoJSON schema report; ``verdict_only`` skips building the model tree."""
+    return _validate(GeoFeatureCollection, data, GeoFeatureCollectionDict if verdict_only else None)
 
 
 def validate_style_spec(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -3,7 +3,7 @@
 import React, { useEffect, useMemo, useRef, useState } from 'react';
 import { ImageIcon, MoreVerticalIcon, PaperclipIcon, SendIcon, SparklesIcon, XIcon } from 'lucide-react';
 import { Button } from '@/components/ui/button';
-import { API_BASE_URL, buildFileUrl, submitVlmReviewRevision } from '@/lib/api';
+import { API_BASE_URL, buildFileUrl, loadRunSnapshot, resolveEventPayload, submitVlmReviewRevision } from '@/lib/api';
 import {
   useAgentMap,
   type AgentRunEvent,
@@ -246,8 +246,30 @@ const AgentInteractionPanel: React.FC<AgentInteractionPanelProps> = ({
         eventSourceRef.current = null;
         fn();
       };
+      // Payload references are fetched asynchronously; keep events in stream order.
+      let pending = Promise.resolve();
       const handleEvent = (event: MessageEvent) => {
-        const parsed = JSON.parse(event.data);
+        pending = pending
+          .then(async () => {
+            if (settled) return;
+            const parsed = JSON.parse(event.data);
+            if (parsed.type === 'stream_reset') return applyReset(parsed);
+            applyEvent(await resolveEventPayload(parsed));
+          })
+          .catch((error) => finish(() => reject(error)));
+      };
+      // Events we missed fell out of the server buffer: drop the partial timeline and reload from the run snapshot.
+      const applyReset = async (parsed: any) => {
+        clearAgentEvents();
+        const snapshot = await loadRunSnapshot(parsed);
+        if (!snapshot.done) return;
+        if (snapshot.error) {
+          applyEvent({ type: 'workflow_error', run_id: runId, payload: { error: snapshot.error, result: snapshot.result } });
+        } else {
+          applyEvent({ type: 'workflow_completed', run_id: runId, payload: snapshot.result || {} });
+        }
+      };
+      const applyEvent = (parsed: any) => {
         appendAgentEvent(parsed);
         const payload = parsed.payload || {};
         if (parsed.node_id === 'visual' && payload.visual_structure) setVisualStructure(payload.visual_structure);
@@ -275,8 +297,12 @@ const AgentInteractionPanel: React.FC<AgentInteractionPanelProps> = ({
         'artifact_saved',
         'workflow_completed',
         'workflow_error',
+        'stream_reset',
       ].forEach((eventName) => source.addEventListener(eventName, handleEvent));
-      source.onerror = () => finish(() => reject(new Error('Agent event stream disconnected')));
+      source.onerror = () => {
+        // While CONNECTING the browser retries with Last-Event-ID and the server replays missed events.
+        if (source.readyState === EventSource.CLOSED) finish(() => reject(new Error('Agent event stream disconnected')));
+      };
     });
   };
 
@@ -159,3 +159,32 @@ export const submitVlmReviewRevision = async (
     warnings,
   };
 };
+
+// Run 事件中较大的载荷（GeoJSON、style_code 等）以 { $ref } 引用下发，内容按哈希寻址，可直接走浏览器缓存
+export type EventPayloadRef = { $ref: string; bytes?: number; kind?: string };
+
+const isEventPayloadRef = (value: unknown): value is EventPayloadRef =>
+  !!value && typeof value === 'object' && typeof (value as EventPayloadRef).$ref === 'string';
+
+export const resolveEventPayload = async <T extends { payload?: Record<string, any> }>(event: T): Promise<T> => {
+  const payload = event.payload;
+  if (!payload || !Object.values(payload).some(isEventPayloadRef)) return event;
+  const entries = await Promise.all(
+    Object.entries(payload).map(async ([key, value]) => {
+      if (!isEventPayloadRef(value)) return [key, value] as const;
+      const res = await fetch(buildApiUrl(value.$ref), { cache: 'force-cache' });
+      if (!res.ok) throw new Error(`Failed to load event payload "${key}"`);
+      return [key, await res.json()] as const;
+    }),
+  );
+  return { ...event, payload: Object.fromEntries(entries) };
+};
+
+// 服务端缓冲区已丢弃 Last-Event-ID 之后的部分事件时会先发 stream_reset，客户端据此拉取 run 快照做全量恢复
+export type RunSnapshot = { run_id: string; done: boolean; result: Record<string, any> | null; error: string | null };
+
+export const loadRunSnapshot = async (resetEvent: { payload?: Record<string, any> }): Promise<RunSnapshot> => {
+  const res = await fetch(buildApiUrl(resetEvent.payload?.snapshot), { cache: 'no-store' });
+  if (!res.ok) throw new Error('Failed to reload run snapshot');
+  return res.json();
+};